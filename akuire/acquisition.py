@@ -1,16 +1,27 @@
 import dataclasses
-from typing import List
+from typing import TYPE_CHECKING, List
 
 import numpy as np
 
-from akuire.events import ManagerEvent
+from akuire.events import BarrierEvent, ManagerEvent
 from akuire.events.data_event import DataEvent, ImageDataEvent
+from akuire.storage import FrameStore
+
+if TYPE_CHECKING:
+    from akuire.tracing import EventSpan
 
 
 @dataclasses.dataclass
 class PairedEvent:
-    manager: str
+    manager: str | None
+    """The device of the manager that handles the event, None for events handled by the engine itself (e.g. barriers)"""
     event: ManagerEvent
+    span: "EventSpan | None" = dataclasses.field(default=None, compare=False, repr=False)
+    """The timings of the event, if it is traced (see `akuire.tracing.Tracer`)"""
+
+    @property
+    def is_barrier(self) -> bool:
+        return isinstance(self.event, BarrierEvent)
 
 
 @dataclasses.dataclass
@@ -32,6 +43,16 @@ class Acquisition:
     events: List[ManagerEvent]
     context: dict = dataclasses.field(default_factory=dict)
 
+    def expected_frames(self) -> int | None:
+        """The number of frames the acquisition is expected to produce, None if unknown"""
+        total = 0
+        for event in self.events:
+            frames = event.expected_frames()
+            if frames is None:
+                return None
+            total += frames
+        return total
+
 
 @dataclasses.dataclass
 class AcquisitionResult:
@@ -42,6 +63,8 @@ class AcquisitionResult:
 
     Attributes:
         collected_events (List[DataEvent]): List of DataEvents that were collected during the acquisition
+        store (FrameStore, optional): The store the frames were streamed into, if any. The data of the
+            collected ImageDataEvents are then views into the store.
 
 
 
@@ -50,13 +73,18 @@ class AcquisitionResult:
     """
 
     collected_events: List[DataEvent]
+    store: FrameStore | None = None
 
     def to_z_stack(self):
         """Stack the collected ImageDataEvents into a single Z-stack
 
         This method stacks the collected ImageDataEvents into a single Z-stack. It will raise a ValueError if none of the
-        collected events are ImageDataEvents.
+        collected events are ImageDataEvents. If the frames were streamed into a store, the
+        (lazily loaded) array of the store is returned instead.
         """
+        if self.store is not None:
+            return self.store.to_array()
+
         try:
             return np.stack(
                 [
@@ -67,7 +95,6 @@ class AcquisitionResult:
                 axis=0,
             )
         except ValueError as e:
-            print(self.collected_events)
             raise ValueError(
                 "Not all collected events are ImageDataEvents, cannot stack. Check the collected events."
             ) from e
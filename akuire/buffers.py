@@ -0,0 +1,184 @@
+import asyncio
+import dataclasses
+from collections import deque
+from multiprocessing.shared_memory import SharedMemory
+from typing import Literal
+
+import numpy as np
+
+
+@dataclasses.dataclass(eq=False)
+class FrameSlot:
+    """A reference counted frame of a FrameRingBuffer
+
+    The data of the slot is a view into the preallocated frames of the buffer.
+    The slot is recycled as soon as every holder released it, after which the data
+    will be overwritten by following frames. Slots that were allocated because the
+    buffer was exhausted (see `FrameRingBuffer.overflow`) have no index and own their data.
+    """
+
+    buffer: "FrameRingBuffer | None"
+    index: int | None
+    data: np.ndarray
+    refcount: int = 1
+
+    @property
+    def released(self) -> bool:
+        return self.refcount == 0
+
+    def retain(self) -> "FrameSlot":
+        """Add a holder to the slot, which needs to release it again"""
+        if self.refcount == 0:
+            raise RuntimeError("Cannot retain a slot that was already released")
+        self.refcount += 1
+        return self
+
+    def release(self):
+        """Release the slot, recycling it once every holder released it"""
+        if self.refcount == 0:
+            raise RuntimeError("Slot was already released")
+        self.refcount -= 1
+        if self.refcount == 0 and self.buffer is not None:
+            self.buffer._recycle(self.index)
+
+
+class FrameRingBuffer:
+    """A preallocated, fixed-capacity ring of frames
+
+    Managers can claim a slot of the buffer, write the frame into its data
+    (e.g. with `np.copyto` or an `out=` argument) and attach the slot to the
+    ImageDataEvent they yield. This avoids allocating a new array for every frame
+    and keeps the resident memory flat during long acquisitions.
+
+    Slots are reference counted and recycled once released by every holder,
+    see ImageDataEvent.release and ImageDataEvent.detach.
+
+    Args:
+        shape (tuple[int, ...]): The shape of a single frame.
+        dtype (np.dtype, optional): The dtype of the frames. Defaults to np.float64.
+        capacity (int, optional): The number of preallocated frames. Defaults to 16.
+        overflow ("allocate" | "wait", optional): What to do when every slot is held:
+            allocate a standalone frame, or wait until a slot is released. Defaults to "allocate".
+    """
+
+    def __init__(
+        self,
+        shape: tuple[int, ...],
+        dtype: np.dtype = np.float64,
+        capacity: int = 16,
+        overflow: Literal["allocate", "wait"] = "allocate",
+    ):
+        assert capacity > 0, "The capacity must be positive"
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self.overflow = overflow
+        self.frames = self._allocate()
+        self.overflows = 0
+        self._free = deque(range(capacity))
+        self._waiters: deque[asyncio.Future] = deque()
+
+    def _allocate(self) -> np.ndarray:
+        return np.empty((self.capacity, *self.shape), dtype=self.dtype)
+
+    @property
+    def available(self) -> int:
+        """The number of slots that are free to be claimed"""
+        return len(self._free)
+
+    def try_claim(self) -> FrameSlot | None:
+        """Claim a free slot, returning None if every slot is held"""
+        if not self._free:
+            return None
+        index = self._free.popleft()
+        return FrameSlot(buffer=self, index=index, data=self.frames[index])
+
+    async def claim(self) -> FrameSlot:
+        """Claim a free slot
+
+        If every slot is held, either allocates a standalone frame or waits until
+        a slot is released, depending on the overflow policy of the buffer.
+        """
+        slot = self.try_claim()
+        while slot is None:
+            if self.overflow == "allocate":
+                self.overflows += 1
+                return FrameSlot(
+                    buffer=None,
+                    index=None,
+                    data=np.empty(self.shape, dtype=self.dtype),
+                )
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            slot = self.try_claim()
+
+        return slot
+
+    def _recycle(self, index: int):
+        self._free.append(index)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+
+class SharedFrameRingBuffer(FrameRingBuffer):
+    """A FrameRingBuffer whose frames live in shared memory
+
+    Other processes can attach to the frames by the name of the buffer (see
+    `attach_frames`) and write into the slots that were claimed for them, so
+    frames do not need to be pickled between processes. The shared memory is
+    freed once the buffer is closed.
+
+    Args:
+        shape (tuple[int, ...]): The shape of a single frame.
+        dtype (np.dtype, optional): The dtype of the frames. Defaults to np.float64.
+        capacity (int, optional): The number of preallocated frames. Defaults to 16.
+        overflow ("allocate" | "wait", optional): What to do when every slot is held. Defaults to "allocate".
+    """
+
+    def _allocate(self) -> np.ndarray:
+        size = max(self.capacity * int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        self.shared_memory = SharedMemory(create=True, size=size)
+        return np.ndarray(
+            (self.capacity, *self.shape), dtype=self.dtype, buffer=self.shared_memory.buf
+        )
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def close(self):
+        """Free the shared memory
+
+        Frames that are still referenced stay readable in this process until they
+        are garbage collected, but can no longer be attached to.
+        """
+        self.frames = None
+        try:
+            self.shared_memory.close()
+        except BufferError:
+            # Views of the frames are still alive, the mapping goes with them
+            pass
+        self.shared_memory.unlink()
+
+
+def attach_frames(
+    name: str, shape: tuple[int, ...], dtype: np.dtype, capacity: int
+) -> tuple[SharedMemory, np.ndarray]:
+    """Attach to the frames of a SharedFrameRingBuffer, e.g. from a worker process
+
+    Returns:
+        tuple[SharedMemory, np.ndarray]: The shared memory, which needs to be kept
+            alive as long as the frames are used, and the frames.
+    """
+    shared_memory = SharedMemory(name=name)
+    frames = np.ndarray((capacity, *shape), dtype=np.dtype(dtype), buffer=shared_memory.buf)
+    return shared_memory, frames
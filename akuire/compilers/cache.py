@@ -0,0 +1,86 @@
+import dataclasses
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+from akuire.acquisition import Acquisition, PairedEvent
+from akuire.compilers.default import RoutingTable, compile_events
+from akuire.config import SystemConfig
+
+AcquisitionShape = tuple[tuple[type, str | None], ...]
+
+
+def acquisition_shape(x: Acquisition) -> AcquisitionShape:
+    """The event-class/device "shape" of an acquisition
+
+    Two acquisitions with the same shape only differ in their parameters
+    (positions, exposure times, number of steps, ...) and are routed
+    to the same managers.
+    """
+    return tuple((event.__class__, event.device) for event in x.events)
+
+
+@dataclasses.dataclass
+class PlanCache:
+    """A bounded LRU cache of compiled routing decisions
+
+    The plan cache stores the routing decisions (which manager accepts which
+    event, and which events need to be transpiled) for every acquisition shape
+    it has seen. Compiling an acquisition of a known shape reuses these decisions
+    and only rebinds the parameters of the new events, without challenging the
+    managers again.
+
+    The cache is invalidated whenever the managers of the system config change.
+    Systems with managers whose challenge depends on their state (see
+    `BaseManager.dynamic_challenge`, e.g. the sequence mode of a camera) are
+    compiled without the cache.
+
+    Attributes:
+        maxsize (int): The maximum number of acquisition shapes to keep.
+        hits (int): Number of compilations that reused a cached routing table.
+        misses (int): Number of compilations that had to challenge the managers.
+    """
+
+    maxsize: int = 128
+    hits: int = 0
+    misses: int = 0
+    tables: OrderedDict = dataclasses.field(default_factory=OrderedDict, repr=False)
+    fingerprint: tuple | None = dataclasses.field(default=None, repr=False)
+
+    def routing_for(self, x: Acquisition, config: SystemConfig) -> RoutingTable:
+        """Get the (possibly empty) routing table for the shape of the acquisition"""
+        fingerprint = config.fingerprint()
+        if fingerprint != self.fingerprint:
+            self.clear()
+            self.fingerprint = fingerprint
+
+        key = acquisition_shape(x)
+        table = self.tables.get(key)
+        if table is not None:
+            self.tables.move_to_end(key)
+            self.hits += 1
+            return table
+
+        self.misses += 1
+        table = {}
+        if self.maxsize > 0:
+            self.tables[key] = table
+            while len(self.tables) > self.maxsize:
+                self.tables.popitem(last=False)
+
+        return table
+
+    def compile(
+        self,
+        x: Acquisition,
+        config: SystemConfig,
+        compiler: Callable[..., Iterable[Iterable[PairedEvent]]] = compile_events,
+    ) -> Iterable[Iterable[PairedEvent]]:
+        """Compile the acquisition, reusing the cached routing decisions"""
+        if config.has_dynamic_routes():
+            return compiler(x, config)
+
+        return compiler(x, config, routing=self.routing_for(x, config))
+
+    def clear(self):
+        """Drop all cached routing tables"""
+        self.tables.clear()
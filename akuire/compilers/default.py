@@ -1,28 +1,35 @@
-from functools import reduce
+from typing import Iterator
 
 from akuire.acquisition import Acquisition, PairedEvent
 from akuire.config import SystemConfig
 from akuire.errors import AtomicException, ManagerError
-from akuire.events import ManagerEvent
+from akuire.events import BarrierEvent, ManagerEvent
 
+RoutingTable = dict[tuple[type, str | None], str | None]
+"""Maps an (event class, assigned device) pair to the device of the manager that accepts it,
+or to None if events of that shape have to be transpiled further."""
 
-def recurse_transpile_until_accepted(
-    current_event: ManagerEvent, config: SystemConfig
-) -> list[PairedEvent]:
 
-    set_keys = []
+def route_event(current_event: ManagerEvent, config: SystemConfig) -> str | None:
+    """Find the manager that accepts the event
+
+    Looks up the managers accepting the event in the routing table of the config
+    and returns the device name of the manager that accepted it, or None if no
+    manager accepted it and the event needs to be transpiled.
+
+    """
+    set_keys = config.route(current_event)
 
-    for manager in config.managers:
-        if current_event.device and current_event.device != manager.device:
-            continue
+    if current_event.device:
+        if current_event.device in set_keys:
+            return current_event.device
 
-        if manager.challenge(current_event):
-            set_keys.append(manager.device)
-        else:
-            if current_event.device:
-                raise ManagerError(
-                    f"Event {current_event} cannot be handled by assigned manager {current_event.device}."
-                )
+        if config.has_manager(current_event.device):
+            raise ManagerError(
+                f"Event {current_event} cannot be handled by assigned manager {current_event.device}."
+            )
+
+        return None
 
     if len(set_keys) > 1:
         raise ManagerError(
@@ -31,31 +38,79 @@ def recurse_transpile_until_accepted(
             + ". Please assign the event to a specific manager."
         )
     elif len(set_keys) == 1:
-        return [PairedEvent(manager=set_keys[0], event=current_event)]
+        return set_keys[0]
     else:
-        return reduce(
-            lambda x, y: x + y,
-            [
-                recurse_transpile_until_accepted(event, config)
-                for event in current_event.transpile()
-            ],
-            [],
-        )
+        return None
 
 
-def compile_events(x: Acquisition, config: SystemConfig) -> list[list[PairedEvent]]:
+def recurse_transpile_until_accepted(
+    current_event: ManagerEvent,
+    config: SystemConfig,
+    routing: RoutingTable | None = None,
+) -> Iterator[PairedEvent]:
+    """Lazily transpile the event until every resulting event is accepted by a manager
 
-    manager_queue = []
+    Events are transpiled depth first and only when the next paired event is requested,
+    so events that expand into many events (e.g. long time series) never materialize
+    the whole expansion.
+    """
 
-    for event in x.events:
-        try:
-            parsable_events = recurse_transpile_until_accepted(event, config)
-            print(parsable_events)
+    if isinstance(current_event, BarrierEvent):
+        yield PairedEvent(manager=None, event=current_event)
+        return
+
+    key = (current_event.__class__, current_event.device)
+
+    if routing is not None and key in routing:
+        accepted_by = routing[key]
+    else:
+        accepted_by = route_event(current_event, config)
+        if routing is not None:
+            routing[key] = accepted_by
 
-            manager_queue.append(parsable_events)
-        except AtomicException as e:
-            raise AtomicException(
-                f"Event {event} cannot be transpiled to an event that can be handled by any Manager."
-            ) from e
+    if accepted_by is not None:
+        yield PairedEvent(manager=accepted_by, event=current_event)
+    else:
+        for event in current_event.transpile():
+            yield from recurse_transpile_until_accepted(event, config, routing)
+
+
+def compile_event(
+    event: ManagerEvent, config: SystemConfig, routing: RoutingTable | None = None
+) -> Iterator[PairedEvent]:
+    try:
+        yield from recurse_transpile_until_accepted(event, config, routing)
+    except AtomicException as e:
+        raise AtomicException(
+            f"Event {event} cannot be transpiled to an event that can be handled by any Manager."
+        ) from e
+
+
+def compile_events(
+    x: Acquisition, config: SystemConfig, routing: RoutingTable | None = None
+) -> Iterator[Iterator[PairedEvent]]:
+    """Compile an acquisition into streams of events that the managers can handle
 
-    return manager_queue
+    Compilation is lazy: the acquisition is only transpiled as far as the engine
+    has executed it, so the plan needs constant memory regardless of how many
+    events the acquisition expands into. As a consequence, events that cannot be
+    handled by any manager are only detected when the engine reaches them.
+
+    Args:
+        x (Acquisition): The acquisition to compile.
+        config (SystemConfig): The system that should execute the acquisition.
+        routing (RoutingTable, optional): Routing decisions that are reused, and filled
+            in, while compiling. Passing the same table for acquisitions of the same shape
+            skips challenging the managers again. Ignored if the routes of the system
+            are dynamic (see `SystemConfig.has_dynamic_routes`). Defaults to None.
+
+    Returns:
+        Iterator[Iterator[PairedEvent]]: One stream of paired events per event in the acquisition.
+    """
+
+    config.ensure_index()
+    if config.has_dynamic_routes():
+        routing = None
+
+    for event in x.events:
+        yield compile_event(event, config, routing)
@@ -1,6 +1,7 @@
 from typing import AsyncGenerator
 
 from akuire.acquisition import AcquisitionResult
+from akuire.events.data_event import ImageDataEvent
 
 
 async def arun(generator: AsyncGenerator) -> AcquisitionResult:
@@ -8,6 +9,8 @@ async def arun(generator: AsyncGenerator) -> AcquisitionResult:
     collected = []
 
     async for i in generator:
+        if isinstance(i, ImageDataEvent):
+            i.detach()
         collected.append(i)
 
     return AcquisitionResult(collected_events=collected)
@@ -1,85 +1,170 @@
 import asyncio
+import dataclasses
+from collections import deque
+from contextlib import aclosing
 from typing import (
     AsyncGenerator,
     AsyncIterable,
     AsyncIterator,
     Awaitable,
     Callable,
-    Collection,
+    Literal,
     TypeVar,
 )
 
-from akuire.events.data_event import UncollectedBufferEvent, ZipEvent
+from akuire.errors import SkewError
+from akuire.events.data_event import DataEvent, UncollectedBufferEvent, ZipEvent
+from akuire.scheduling import consumed_leases, consuming, prioritized
 
 _T = TypeVar("_T")
 
 
-async def _await_next(iterator: AsyncIterator[_T]) -> _T:
-    return await iterator.__anext__()
+_EXHAUSTED = object()
 
 
-def _as_task(iterator: AsyncIterator[_T]) -> asyncio.Task[_T]:
-    return asyncio.create_task(_await_next(iterator))
+@dataclasses.dataclass
+class _Failed:
+    exception: BaseException
 
 
-async def amerge(*iterators: Collection[AsyncIterator[_T]]) -> AsyncIterable[_T]:
-    next_tasks = {iterator: _as_task(iterator) for iterator in iterators}
-    while next_tasks:
-        done, _ = await asyncio.wait(
-            next_tasks.values(), return_when=asyncio.FIRST_COMPLETED
-        )
-        for task in done:
-            iterator = next(it for it, t in next_tasks.items() if t == task)
-
+async def _pump(
+    index: int,
+    iterator: AsyncIterator[_T],
+    queue: asyncio.Queue,
+    window: asyncio.Semaphore,
+):
+    outcome: object = _EXHAUSTED
+    try:
+        while True:
             try:
-                yield task.result()
+                value = await anext(iterator)
             except StopAsyncIteration:
-                del next_tasks[iterator]
-            except Exception:
-                for t in next_tasks.values():
-                    t.cancel()
-
-                await asyncio.gather(*next_tasks.values(), return_exceptions=True)
-
-                raise task.exception()
-            else:
-                next_tasks[iterator] = _as_task(iterator)
-
-
-async def _amerge(*iterators: Collection[AsyncIterator[_T]]) -> AsyncIterable[_T]:
-    next_tasks = {iterator: _as_task(iterator) for iterator in iterators}
-    while next_tasks:
-        done, _ = await asyncio.wait(
-            next_tasks.values(), return_when=asyncio.FIRST_COMPLETED
+                break
+            await window.acquire()
+            # The leases of the acquisition streams the pump consumes, for the consumer
+            await queue.put((index, value, consumed_leases.get()))
+    except BaseException as e:
+        # Cancellations and other BaseExceptions are re-raised once they are signalled
+        outcome = _Failed(e)
+        raise
+    finally:
+        # The queue is unbounded, so the consumer is always told the pump is done
+        queue.put_nowait((index, outcome, frozenset()))
+
+
+async def _amerge(
+    *iterators: AsyncIterator[_T], buffer_size: int = 1
+) -> AsyncIterable[tuple[int, _T]]:
+    """Merge the iterators, yielding the index of the iterator with every value
+
+    Every iterator is consumed by its own pump task, feeding a shared queue, so
+    the overhead per value does not depend on the number of iterators. A pump
+    reads at most buffer_size values ahead of the consumer. If an iterator fails,
+    the others are cancelled and the exception is raised.
+
+    While a value is yielded, the consumer consumes the acquisition streams of the
+    pump it came from, see `akuire.scheduling.consumed_leases`.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    windows = [asyncio.Semaphore(buffer_size) for _ in iterators]
+    pumps = [
+        asyncio.create_task(_pump(index, iterator, queue, windows[index]))
+        for index, iterator in enumerate(iterators)
+    ]
+    running = len(pumps)
+
+    try:
+        while running:
+            index, value, leases = await queue.get()
+            if value is _EXHAUSTED:
+                running -= 1
+                continue
+            if isinstance(value, _Failed):
+                raise value.exception
+
+            windows[index].release()
+            with consuming(leases):
+                yield index, value
+    finally:
+        for pump in pumps:
+            pump.cancel()
+        await asyncio.gather(*pumps, return_exceptions=True)
+
+
+async def amerge(
+    *iterators: AsyncIterator[_T], buffer_size: int = 1
+) -> AsyncIterable[_T]:
+    """Merge the iterators, yielding their values as they are produced
+
+    See `_amerge` for the buffering and failure semantics.
+    """
+    async with aclosing(_amerge(*iterators, buffer_size=buffer_size)) as merged:
+        async for _, value in merged:
+            yield value
+
+
+def _pairable(heads: list[DataEvent], tolerance: float) -> bool:
+    timestamps = [head.timestamp for head in heads]
+    return max(timestamps) - min(timestamps) <= tolerance
+
+
+async def azip(
+    *generators: AsyncIterator[DataEvent],
+    max_skew: int | None = None,
+    on_skew: Literal["raise", "drop_oldest"] = "raise",
+    tolerance: float | None = None,
+    device: str = "zip",
+) -> AsyncIterable[ZipEvent | UncollectedBufferEvent]:
+    """Zip the streams, yielding a ZipEvent for every set of matching values
+
+    By default the n-th values of every stream are zipped. With a tolerance (in
+    seconds), values are zipped if their timestamps are within the tolerance
+    instead. Values that have no match within the tolerance in every other stream
+    (e.g. a frame one of the cameras dropped) are discarded.
+
+    The values that were not zipped yet are buffered per stream, at most max_skew
+    of them. If a stream runs further ahead than that (e.g. because one camera is
+    faster than the other), a SkewError is raised, or the oldest value of the
+    stream is discarded with the "drop_oldest" policy.
+
+    The values that are left over when a stream ends are yielded in an
+    UncollectedBufferEvent.
+
+    Args:
+        max_skew (int, optional): The number of values a stream may be ahead. Defaults to unbounded.
+        on_skew ("raise" | "drop_oldest", optional): What to do if a stream is too far ahead. Defaults to "raise".
+        tolerance (float, optional): Zip by timestamp within this tolerance. Defaults to zipping by position.
+        device (str, optional): The device of the yielded events. Defaults to "zip".
+    """
+    buffers: list[deque[DataEvent]] = [deque() for _ in generators]
+
+    async with aclosing(_amerge(*generators)) as merged:
+        async for index, value in merged:
+            buffer = buffers[index]
+            if max_skew is not None and len(buffer) >= max_skew:
+                if on_skew == "raise":
+                    raise SkewError(
+                        f"Stream {index} is more than {max_skew} values ahead of the streams it is zipped with"
+                    )
+                buffer.popleft()
+            buffer.append(value)
+
+            while all(buffers):
+                heads = [buffer[0] for buffer in buffers]
+                if tolerance is None or _pairable(heads, tolerance):
+                    yield ZipEvent(
+                        events=[buffer.popleft() for buffer in buffers], device=device
+                    )
+                    continue
+
+                # The oldest head cannot be matched anymore, as the other streams are past it
+                oldest = min(range(len(heads)), key=lambda i: heads[i].timestamp)
+                buffers[oldest].popleft()
+
+    if any(buffers):
+        yield UncollectedBufferEvent(
+            buffer=[list(buffer) for buffer in buffers], device=device
         )
-        for task in done:
-            iterator = next(it for it, t in next_tasks.items() if t == task)
-            index = iterators.index(iterator)
-            try:
-                yield index, task.result()
-            except StopAsyncIteration:
-                del next_tasks[iterator]
-            except Exception:
-                pass
-            else:
-                next_tasks[iterator] = _as_task(iterator)
-
-
-async def azip(*generators):
-
-    collected_values = [None for i in generators]
-    buffer = [[] for i in generators]
-
-    async for i in _amerge(*generators):
-        index, value = i
-        buffer[index].append(value)
-
-        if all(len(i) > 0 for i in buffer):
-            collected_values = [i.pop(0) for i in buffer]
-            yield ZipEvent(collected_values)
-
-    if any(len(i) > 0 for i in buffer):
-        yield UncollectedBufferEvent(collected_values)
 
 
 async def azip_longest(*generators):
@@ -115,29 +200,85 @@ async def auntil(
             break
 
 
-async def ainterupting(
-    generator: AsyncGenerator[object, None],
-    interrupter: AsyncGenerator[object, None],
-    condition: Callable[[object], Awaitable[bool]],
-    restarts: int = None,
-):
+Source = AsyncIterator[_T] | Callable[[], AsyncIterator[_T]]
+"""An async iterator, or a factory creating a fresh one"""
+
+
+def _iterate(source: Source) -> AsyncIterator[_T]:
+    if hasattr(source, "__anext__"):
+        return source
+    return source()
 
-    broken = False
-    async for i in generator:
-        if await condition(i):
-            broken = True
-            break
-            yield i
-        else:
-            yield i
 
-    if broken:
-        async for i in interrupter:
-            yield i
+async def _aclose(iterator: AsyncIterator):
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
 
-    if restarts is not None:
-        if restarts == 0:
+
+async def ainterupting(
+    generator: Source,
+    interrupter: Source,
+    condition: Callable[[object], Awaitable[bool]],
+    restarts: int | float | None = None,
+    priority: int = 1,
+):
+    """Run the generator until the condition trips on one of its values, then run the interrupter
+
+    The value the condition tripped on is not yielded. The values of the generator
+    are pulled one at a time, once the condition and the consumer are done with the
+    previous value, so no further value (e.g. the next frame) is acquired once the
+    condition tripped.
+
+    The acquisitions of the interrupter are started in a priority lane (see
+    `akuire.scheduling.priority_lane`), so they are scheduled ahead of concurrent
+    acquisitions with a lower priority on the same devices.
+
+    After the interrupter finished, the generator is started again, up to restarts
+    times (math.inf to restart indefinitely). Restarts run in a loop, so they do
+    not grow the stack. As a closed generator cannot be resumed, restarting
+    needs the generator and interrupter to be given as factories, which are
+    called for every run.
+
+    Args:
+        generator (Source): The generator (factory) to run.
+        interrupter (Source): The generator (factory) to run when the condition trips.
+        condition (Callable[[object], Awaitable[bool]]): The condition to check every value of the generator with.
+        restarts (int | float, optional): How often to restart the generator after an interrupt.
+            Defaults to None, i.e. never.
+        priority (int, optional): The minimum priority of the acquisitions of the interrupter. Defaults to 1.
+    """
+    if restarts and not (callable(generator) and callable(interrupter)):
+        raise ValueError("Restarting requires the generator and interrupter as factories")
+
+    runs = 0
+    while True:
+        stream = _iterate(generator)
+        tripped = False
+        try:
+            async for value in stream:
+                if await condition(value):
+                    tripped = True
+                    break
+                yield value
+        finally:
+            await _aclose(stream)
+
+        if not tripped:
             return
 
-        async for i in ainterupting(generator, interrupter, condition, restarts - 1):
-            yield i
+        interrupting = _iterate(interrupter)
+        try:
+            while True:
+                with prioritized(priority):
+                    try:
+                        value = await anext(interrupting)
+                    except StopAsyncIteration:
+                        break
+                yield value
+        finally:
+            await _aclose(interrupting)
+
+        if restarts is None or runs >= restarts:
+            return
+        runs += 1
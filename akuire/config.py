@@ -1,6 +1,15 @@
 import dataclasses
 
-from akuire.managers.base import Manager
+from akuire.events.manager_event import ManagerEvent
+from akuire.managers.base import BaseManager, Manager
+
+
+def uses_typed_challenge(manager: Manager) -> bool:
+    """Whether the manager relies on the annotation based challenge of the BaseManager"""
+    return (
+        isinstance(manager, BaseManager)
+        and type(manager).challenge is BaseManager.challenge
+    )
 
 
 @dataclasses.dataclass
@@ -10,11 +19,113 @@ class SystemConfig:
     A system is composed of multiple managers. This class holds the configuration for the system.
     , in the form of a dictionary of managers.
 
-
+    To keep dispatching cheap for systems with many managers, the config indexes
+    its managers by device name and keeps a routing table from event classes to
+    the devices of the managers accepting them. The index is built on construction
+    and rebuilt whenever the managers change (see `ensure_index`).
 
     """
 
     managers: list[Manager]
+    _index_fingerprint: tuple | None = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _managers_by_device: dict[str, Manager] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _routes: dict[type, list[str]] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _typed_managers: list[BaseManager] = dataclasses.field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+    _challenged_managers: list[Manager] = dataclasses.field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self.build_index()
+
+    def build_index(self):
+        """(Re)build the device index and the routing table of the managers
+
+        Managers that use the annotation based challenge of the BaseManager are
+        routed through their (class level) typed challengers, including subclasses
+        of the accepted event types. Managers with a custom challenge method are
+        challenged for every event, as their decision may depend on the event or on
+        their state (e.g. the sequence mode of a camera).
+        """
+        self._index_fingerprint = self.fingerprint()
+        self._managers_by_device = {}
+        self._routes = {}
+        self._typed_managers = []
+        self._challenged_managers = []
+
+        for manager in self.managers:
+            self._managers_by_device.setdefault(manager.device, manager)
+
+            if uses_typed_challenge(manager):
+                self._typed_managers.append(manager)
+            else:
+                self._challenged_managers.append(manager)
+
+        for manager in self._typed_managers:
+            for event_type in manager.typed_challengers:
+                if event_type not in self._routes:
+                    self._routes[event_type] = self._route_type(event_type)
+
+    def ensure_index(self):
+        """Rebuild the index if the managers have changed since it was built"""
+        if self.fingerprint() != self._index_fingerprint:
+            self.build_index()
+
+    def _route_type(self, event_type: type[ManagerEvent]) -> list[str]:
+        return [
+            manager.device
+            for manager in self._typed_managers
+            if manager.accepts_event_type(event_type)
+        ]
+
+    def route(self, event: ManagerEvent) -> list[str]:
+        """Get the devices of all managers that accept the event
+
+        Args:
+            event (ManagerEvent): The event to route.
+
+        Returns:
+            list[str]: The devices of the managers that accept the event.
+        """
+        event_type = event.__class__
+
+        routes = self._routes.get(event_type)
+        if routes is None:
+            routes = self._route_type(event_type)
+            self._routes[event_type] = routes
+
+        challenged = [
+            manager.device
+            for manager in self._challenged_managers
+            if manager.challenge(event)
+        ]
+
+        return routes + challenged
+
+    def has_dynamic_routes(self) -> bool:
+        """Whether the challenge of a manager depends on its state (see `BaseManager.dynamic_challenge`)
+
+        The routes of such systems cannot be reused between events of the same shape
+        (see `akuire.compilers.cache.PlanCache`).
+        """
+        self.ensure_index()
+        return any(
+            getattr(manager, "dynamic_challenge", False)
+            for manager in self._challenged_managers
+        )
+
+    def has_manager(self, device_name: str) -> bool:
+        """Check if the system has a manager with the given name."""
+        self.ensure_index()
+        return device_name in self._managers_by_device
 
     def get_manager(self, device_name: str) -> Manager:
         """Get a manager by name.
@@ -26,7 +137,23 @@ class SystemConfig:
             Manager: The manager with the given name.
 
         """
-        for manager in self.managers:
-            if manager.device == device_name:
-                return manager
-        raise ValueError(f"Manager {device_name} not found")
+        manager = self._managers_by_device.get(device_name)
+        if manager is None or manager.device != device_name:
+            self.build_index()
+            manager = self._managers_by_device.get(device_name)
+
+        if manager is None:
+            raise ValueError(f"Manager {device_name} not found")
+
+        return manager
+
+    def fingerprint(self) -> tuple:
+        """A cheap fingerprint of the managers of the system
+
+        The fingerprint changes whenever a manager is added, removed, replaced or renamed,
+        and is used to invalidate everything that was derived from the managers.
+
+        Returns:
+            tuple: The identity and device name of every manager.
+        """
+        return tuple((id(manager), manager.device) for manager in self.managers)
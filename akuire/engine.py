@@ -1,6 +1,9 @@
 import asyncio
 import dataclasses
 import sys
+import time
+from concurrent.futures import Executor
+from contextlib import aclosing
 from functools import reduce
 from typing import (
     Any,
@@ -8,6 +11,7 @@ from typing import (
     Awaitable,
     Callable,
     Generator,
+    Iterable,
     List,
     Protocol,
     Type,
@@ -18,18 +22,30 @@ import numpy as np
 from koil import unkoil, unkoil_gen
 from koil.composition.base import KoiledModel
 
-from akuire.acquisition import Acquisition, AcquisitionResult
+from akuire.acquisition import Acquisition, AcquisitionResult, PairedEvent
+from akuire.compilers.cache import PlanCache
 from akuire.compilers.default import compile_events
 from akuire.config import SystemConfig
 from akuire.events import (
     DataEvent,
+    ImageDataEvent,
     ManagerEvent,
 )
+from akuire.execution import apipelined, aserial
+from akuire.hooks import Hook, HookDispatcher, HookStats
+from akuire.scheduling import (
+    DeviceScheduler,
+    Lease,
+    consumed_leases,
+    consuming,
+    priority_lane,
+)
+from akuire.storage import FrameStore, PreallocatedFrameStore
+from akuire.streaming import BoundedEventQueue, OverflowPolicy, StreamStats
+from akuire.tracing import Tracer
 from akuire.vars import set_current_engine
 from pydantic import Field
 
-Hook = Callable[[DataEvent], Awaitable[None]]
-
 
 class AcquisitionEngine(KoiledModel):
     """Acquisition engine that orchestrates the acquisition of data from multiple devices.
@@ -41,10 +57,41 @@ class AcquisitionEngine(KoiledModel):
     """
 
     system_config: SystemConfig
-    compiler: Callable[[Acquisition, SystemConfig], List[ManagerEvent]] = compile_events
-    _lock: asyncio.Lock | None = None
+    compiler: Callable[..., Iterable[Iterable[PairedEvent]]] = compile_events
+    plan_cache: PlanCache | None = Field(default_factory=PlanCache)
+    """Caches the routing decisions per acquisition shape. When set, the compiler is called with
+    an additional `routing` keyword argument. Set to None to disable the cache."""
+    scheduler: DeviceScheduler | None = Field(default_factory=DeviceScheduler)
+    """Arbitrates the devices between acquisitions that run concurrently, see
+    `akuire.scheduling.DeviceScheduler`. Set to None to let their events interleave freely."""
     check_event_type: bool = True
+    pipelined: bool = False
+    """Execute events on different devices concurrently, see `akuire.execution.apipelined`"""
+    pipeline_depth: int = 8
+    """The number of events that are executed ahead of the consumer in pipelined mode"""
+    max_batch_size: int = 64
+    """The maximum number of events a manager computes in one batch in serial mode, see
+    `akuire.execution.aserial`. Pipelined mode does not batch"""
     subscribers: List[Hook] = Field(default_factory=list)
+    hook_queue_size: int = 16
+    """The size of the queue of every hook, see `akuire.hooks.HookDispatcher`"""
+    hook_executor: Executor | None = None
+    """The executor to run sync hooks in, e.g. a ProcessPoolExecutor for CPU bound hooks.
+    Defaults to a thread pool per stream"""
+    hook_stats: dict[Any, HookStats] = Field(default_factory=dict)
+    """The latencies of the hooks, per hook (see `akuire.hooks.hook_key`)"""
+    buffer_size: int | None = None
+    """Decouple the managers from the consumer of the stream through a bounded queue of this size,
+    with the subscribers notified on their own task. None to run the managers, subscribers and
+    consumer in lockstep. See `akuire.streaming.BoundedEventQueue`"""
+    buffer_policy: OverflowPolicy = "block"
+    """What to do when a buffer is full, see `akuire.streaming.BoundedEventQueue`"""
+    stream_stats: StreamStats = Field(default_factory=StreamStats)
+    """Counters of the events that passed through the buffers of the streams"""
+    subscriber_stats: StreamStats = Field(default_factory=StreamStats)
+    """Counters of the events that passed through the buffers of the subscribers"""
+    tracer: Tracer | None = None
+    """Records the timings of the (sampled) paired events, see `akuire.tracing.Tracer`"""
 
     def add_subscriber(self, hook: Hook):
         self.subscribers.append(hook)
@@ -56,32 +103,210 @@ class AcquisitionEngine(KoiledModel):
         for i in unkoil_gen(self.acquire_stream, x):
             yield i
 
-    async def acquire_stream(self, x: Acquisition) -> AsyncGenerator[DataEvent, None]:
-        events_queue = self.compiler(x, self.system_config)
+    def compile(self, x: Acquisition) -> Iterable[Iterable[PairedEvent]]:
+        """Compile the acquisition into (lazy) streams of paired events
+
+        Uses the plan cache if one is set, so that acquisitions of the same
+        shape reuse the routing decisions of previous compilations.
+        """
+        if self.plan_cache is None:
+            return self.compiler(x, self.system_config)
+
+        return self.plan_cache.compile(x, self.system_config, self.compiler)
+
+    def _check_event_type(self, paired_event: PairedEvent, event: Any):
+        if self.check_event_type and not isinstance(event, DataEvent):
+            raise TypeError(
+                f"Event {event} is not a DataEvent. Only DataEvents are allowed in the stream. Inspect the event and manager that produced it. {paired_event.manager} produced {event.__class__}"
+            )
+
+    def _dispatcher(self, hooks: list[Hook], **kwargs) -> HookDispatcher:
+        return HookDispatcher(
+            hooks,
+            executor=self.hook_executor,
+            stats=self.hook_stats,
+            tracer=self.tracer,
+            **kwargs,
+        )
+
+    async def _emit(
+        self,
+        paired_event: PairedEvent,
+        event: DataEvent,
+        subscribers: HookDispatcher,
+        hooks: HookDispatcher | None,
+    ):
+        await subscribers.dispatch(event, paired_event.span)
+        self._check_event_type(paired_event, event)
+        if hooks is not None:
+            await hooks.dispatch(event, paired_event.span)
+
+    async def _abuffered(
+        self,
+        stream: AsyncGenerator[tuple[PairedEvent, DataEvent], None],
+        subscribers: HookDispatcher,
+        hooks: HookDispatcher | None = None,
+    ) -> AsyncGenerator[DataEvent, None]:
+        """Run the stream on its own task, producing into a bounded queue
+
+        Neither the consumer nor the subscribers and hooks (which are dispatched to
+        from the task) hold up the managers, unless the "block" policy is used and a
+        queue is full. A failing subscriber or hook is raised in the consumer.
+        """
+        events = BoundedEventQueue(
+            self.buffer_size, self.buffer_policy, stats=self.stream_stats
+        )
+
+        async def produce():
+            try:
+                async with aclosing(stream) as produced:
+                    async for paired_event, event in produced:
+                        await self._emit(paired_event, event, subscribers, hooks)
+                        await events.put(event)
+            except Exception as e:
+                await events.close(e)
+            else:
+                await events.close()
+
+        producer = asyncio.create_task(produce())
+
         try:
-            for paired_events in events_queue:
-                for paired_event in paired_events:
-                    manager = self.system_config.get_manager(paired_event.manager)
-
-                    async for event in manager.compute_event(paired_event.event):
-                        for i in self.subscribers:
-                            await i(event)
-
-                        if self.check_event_type and not isinstance(event, DataEvent):
-                            raise TypeError(
-                                f"Event {event} is not a DataEvent. Only DataEvents are allowed in the stream. Inspect the event and manager that produced it. {paired_event.manager} produced {event.__class__}"
-                            )
+            async for event in events:
+                yield event
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+            events.discard()
+
+    async def _astream(
+        self,
+        x: Acquisition,
+        hooks: HookDispatcher | None = None,
+        priority: int = 0,
+        deadline: float | None = None,
+    ) -> AsyncGenerator[DataEvent, None]:
+        """Stream the acquisition, holding its devices through a lease of the scheduler
+
+        Acquisitions started by the consumer of the stream (or by its hooks and
+        subscribers) may borrow the devices of the lease, and acquisitions started
+        in a priority lane get at least its priority, see `akuire.scheduling`.
+        """
+        if self.scheduler is None:
+            async with aclosing(self._aexecute(x, hooks, None)) as stream:
+                async for event in stream:
+                    yield event
+            return
+
+        lane = priority_lane.get()
+        lease = self.scheduler.open(
+            priority=max(priority, lane) if lane is not None else priority,
+            deadline=time.monotonic() + deadline if deadline is not None else None,
+            consumes=consumed_leases.get(),
+        )
+        leases = frozenset({lease})
+        # The tasks the execution starts inherit the lease, while the consumer gets
+        # it at every yield, as it may request the events from different tasks
+        with consuming(leases):
+            async with aclosing(self._aexecute(x, hooks, lease)) as stream:
+                async for event in stream:
+                    with consuming(leases):
+                        yield event
+
+    async def _aexecute(
+        self,
+        x: Acquisition,
+        hooks: HookDispatcher | None,
+        lease: Lease | None,
+    ) -> AsyncGenerator[DataEvent, None]:
+        events_queue = self.compile(x)
+        if self.pipelined:
+            stream = apipelined(
+                events_queue,
+                self.system_config,
+                tracer=self.tracer,
+                lease=lease,
+                depth=self.pipeline_depth,
+            )
+        else:
+            stream = aserial(
+                events_queue,
+                self.system_config,
+                tracer=self.tracer,
+                lease=lease,
+                max_batch_size=self.max_batch_size,
+            )
+
+        if self.buffer_size is not None:
+            subscribers = self._dispatcher(
+                self.subscribers,
+                maxsize=self.buffer_size,
+                policy=self.buffer_policy,
+                queue_stats=self.subscriber_stats,
+            )
+            async with subscribers:
+                async with aclosing(
+                    self._abuffered(stream, subscribers, hooks)
+                ) as buffered:
+                    async for event in buffered:
                         yield event
+            return
 
-        except Exception as e:
-            print(events_queue)
-            raise e
+        subscribers = self._dispatcher(
+            self.subscribers,
+            maxsize=self.hook_queue_size,
+            queue_stats=self.subscriber_stats,
+        )
+        async with subscribers:
+            async with aclosing(stream) as produced:
+                async for paired_event, event in produced:
+                    await self._emit(paired_event, event, subscribers, hooks)
+                    yield event
+
+    async def acquire_stream(
+        self, x: Acquisition, priority: int = 0, deadline: float | None = None
+    ) -> AsyncGenerator[DataEvent, None]:
+        """Acquire the acquisition, streaming the produced events
+
+        Args:
+            x (Acquisition): The acquisition to run.
+            priority (int, optional): The priority of the acquisition on the devices it
+                shares with concurrent acquisitions (see `scheduler`). Defaults to 0.
+            deadline (float, optional): The time (in seconds from now) the acquisition
+                should be done in, for the "deadline" scheduling policy.
+        """
+        async with aclosing(
+            self._astream(x, priority=priority, deadline=deadline)
+        ) as stream:
+            async for event in stream:
+                yield event
 
     async def acquire(
         self,
         x: Acquisition | ManagerEvent | list[ManagerEvent],
         hooks: list[Hook] | None = None,
+        store: FrameStore | None = None,
+        priority: int = 0,
+        deadline: float | None = None,
     ) -> AcquisitionResult:
+        """Acquire the acquisition and collect the produced events
+
+        Args:
+            x (Acquisition | ManagerEvent | list[ManagerEvent]): The acquisition to run.
+            hooks (list[Hook], optional): Hooks that are called for every produced event,
+                concurrently to each other (see `akuire.hooks.HookDispatcher`). Their failure
+                is raised by the acquisition.
+            store (FrameStore, optional): A store to stream the frames into (e.g. a
+                MemmapFrameStore to acquire datasets bigger than the memory). Defaults
+                to keeping the frames in memory, preallocating the stack (in chunks of
+                at most 256 MiB) if the number of frames is known up front.
+            priority (int, optional): The priority of the acquisition on the devices it
+                shares with concurrent acquisitions (see `scheduler`). Defaults to 0.
+            deadline (float, optional): The time (in seconds from now) the acquisition
+                should be done in, for the "deadline" scheduling policy.
+
+        Returns:
+            AcquisitionResult: The collected events.
+        """
         if isinstance(x, ManagerEvent):
             x = Acquisition(events=[x])
         elif isinstance(x, list):
@@ -92,16 +317,36 @@ class AcquisitionEngine(KoiledModel):
         collected_events = []
         hooks = hooks or []
 
-        async for event in self.acquire_stream(x):
-            collected_events.append(event)
-            for hook in hooks:
-                await hook(event)
+        if store is None:
+            expected_frames = x.expected_frames()
+            if expected_frames:
+                store = PreallocatedFrameStore(expected_frames)
+
+        try:
+            async with self._dispatcher(
+                hooks, maxsize=self.hook_queue_size
+            ) as dispatcher:
+                async with aclosing(
+                    self._astream(x, dispatcher, priority=priority, deadline=deadline)
+                ) as stream:
+                    async for event in stream:
+                        if isinstance(event, ImageDataEvent):
+                            if store is not None:
+                                store.append(event)
+                            else:
+                                # The result outlives the stream, so it cannot hold on to ring buffer slots
+                                event.detach()
+
+                        collected_events.append(event)
+        finally:
+            if store is not None:
+                store.close()
 
-        return AcquisitionResult(collected_events)
+        return AcquisitionResult(collected_events, store=store)
 
     async def __aenter__(self) -> "AcquisitionEngine":
-        self._lock = asyncio.Lock()
         set_current_engine(self)
+        self.system_config.build_index()
 
         for manager in self.system_config.managers:
             await manager.__aenter__()
@@ -109,7 +354,6 @@ class AcquisitionEngine(KoiledModel):
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
-        self._lock = None
         set_current_engine(None)
 
         for manager in self.system_config.managers:
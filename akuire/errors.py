@@ -4,3 +4,7 @@ class AtomicException(Exception):
 
 class ManagerError(Exception):
     pass
+
+
+class SkewError(Exception):
+    """A stream ran too far ahead of the streams it is zipped with"""
@@ -9,6 +9,7 @@ from .manager_event import (
     AcquireFrameEvent,
     AcquireTSeriesEvent,
     AcquireZStackEvent,
+    BarrierEvent,
     DelayEvent,
     DeviceChangeEvent,
     ManagerEvent,
@@ -33,6 +34,7 @@ __all__ = [
     "AcquireFrameEvent",
     "AcquireTSeriesEvent",
     "DelayEvent",
+    "BarrierEvent",
     "UncollectedBufferEvent",
     "ZipEvent",
     "MoveZEvent",
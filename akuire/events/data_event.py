@@ -1,8 +1,12 @@
 import dataclasses
 import time
+from typing import TYPE_CHECKING
 
 import numpy as np
 
+if TYPE_CHECKING:
+    from akuire.buffers import FrameSlot
+
 
 @dataclasses.dataclass(kw_only=True)
 class DataEvent:
@@ -63,6 +67,34 @@ class UncollectedBufferEvent(ComposedEvent):
 class ImageDataEvent(DataEvent):
     data: np.ndarray
     """Data should be 5 Dimensional c,t,z,y,x"""
+    slot: "FrameSlot | None" = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+    """The FrameRingBuffer slot backing the data, if the manager used one"""
+
+    def retain(self) -> "ImageDataEvent":
+        """Keep the backing slot alive until released again (no-op without a slot)"""
+        if self.slot is not None:
+            self.slot.retain()
+        return self
+
+    def release(self):
+        """Release the backing slot, after which the data may be overwritten
+
+        Consumers of an acquisition stream should release frames they are done with,
+        or detach them if they want to keep the data.
+        """
+        if self.slot is not None:
+            self.slot.release()
+            if self.slot.released:
+                self.slot = None
+
+    def detach(self) -> "ImageDataEvent":
+        """Copy the data out of the backing slot and release it"""
+        if self.slot is not None and self.slot.buffer is not None:
+            self.data = self.data.copy()
+        self.release()
+        return self
 
 
 @dataclasses.dataclass(kw_only=True)
@@ -1,6 +1,5 @@
 import dataclasses
-from functools import reduce
-from operator import add
+from typing import ClassVar, Iterable, Iterator
 
 from akuire.errors import AtomicException
 
@@ -8,8 +7,19 @@ from akuire.errors import AtomicException
 @dataclasses.dataclass(kw_only=True)
 class ManagerEvent:
     device: str | None = None
+    frames_per_event: ClassVar[int | None] = None
+    """The number of frames events of this type produce, None if unknown"""
 
-    def transpile(self) -> list["ManagerEvent"]:
+    def expected_frames(self) -> int | None:
+        """The number of frames this event is expected to produce, None if unknown"""
+        return self.frames_per_event
+
+    def transpile(self) -> Iterable["ManagerEvent"]:
+        """Transpile the event into events that are more likely to be handled by a manager
+
+        Transpiling should be lazy (i.e. a generator) for events that expand into many
+        events, so that the acquisition can start before the whole plan is built.
+        """
         raise AtomicException(
             f"{self.__class__.__name__} even is atomic and cannot be transpiled."
         )
@@ -17,23 +27,37 @@ class ManagerEvent:
 
 @dataclasses.dataclass(kw_only=True)
 class DelayEvent(ManagerEvent):
+    frames_per_event = 0
     timeout: float
 
 
+@dataclasses.dataclass(kw_only=True)
+class BarrierEvent(ManagerEvent):
+    """Orders the execution of the events around it
+
+    A barrier is not handled by any manager, but by the engine itself. When executing
+    an acquisition in pipelined mode, no event after the barrier starts before every
+    event before the barrier has finished.
+    """
+
+    frames_per_event = 0
+
+
 @dataclasses.dataclass(kw_only=True)
 class DeviceChangeEvent(ManagerEvent):
+    frames_per_event = 0
     device: str
     state: bool
 
 
 @dataclasses.dataclass(kw_only=True)
 class ArmEvent(ManagerEvent):
-    pass
+    frames_per_event = 0
 
 
 @dataclasses.dataclass(kw_only=True)
 class DisarmEvent(ManagerEvent):
-    pass
+    frames_per_event = 0
 
 
 @dataclasses.dataclass(kw_only=True)
@@ -43,11 +67,13 @@ class LiveCameraEvent(ManagerEvent):
 
 @dataclasses.dataclass(kw_only=True)
 class AcquireFrameEvent(ManagerEvent):
+    frames_per_event = 1
     exposure_time: float = dataclasses.field(default=0.1)
 
 
 @dataclasses.dataclass(kw_only=True)
 class MoveZEvent(ManagerEvent):
+    frames_per_event = 0
     step: int
     speed: int = 1000
 
@@ -58,22 +84,18 @@ class AcquireZStackEvent(ManagerEvent):
     z_steps: int
     item_exposure_time: float
 
-    def transpile(self) -> list[ManagerEvent]:
-        print("Transpiling z stack")
+    def expected_frames(self) -> int | None:
+        return self.z_steps
 
-        z_stack_events = []
+    def transpile(self) -> Iterator[ManagerEvent]:
 
-        z_stack_events.append(ArmEvent())
+        yield ArmEvent()
 
         for i in range(self.z_steps):
-            z_stack_events += [
-                AcquireFrameEvent(exposure_time=self.item_exposure_time),
-                MoveZEvent(step=i * self.z_step),
-            ]
+            yield AcquireFrameEvent(exposure_time=self.item_exposure_time)
+            yield MoveZEvent(step=i * self.z_step)
 
-        z_stack_events.append(DisarmEvent())
-
-        return z_stack_events
+        yield DisarmEvent()
 
 
 @dataclasses.dataclass(kw_only=True)
@@ -82,25 +104,23 @@ class AcquireTSeriesEvent(ManagerEvent):
     interval: float = 10
     item_exposure_time: float = 100
 
-    def transpile(self) -> list[ManagerEvent]:
-        print("Transpiling z stack")
-        t_series_events = []
+    def expected_frames(self) -> int | None:
+        return int(self.t_steps)
 
-        t_series_events.append(ArmEvent())
+    def transpile(self) -> Iterator[ManagerEvent]:
 
-        for i in range(self.t_steps):
-            t_series_events += [
-                AcquireFrameEvent(exposure_time=self.item_exposure_time),
-                DelayEvent(timeout=self.interval),
-            ]
+        yield ArmEvent()
 
-        t_series_events.append(DisarmEvent())
+        for i in range(self.t_steps):
+            yield AcquireFrameEvent(exposure_time=self.item_exposure_time)
+            yield DelayEvent(timeout=self.interval)
 
-        return t_series_events
+        yield DisarmEvent()
 
 
 @dataclasses.dataclass(kw_only=True)
 class MoveEvent(ManagerEvent):
+    frames_per_event = 0
     x: float | None = None
     y: float | None = None
     z: float | None = None
@@ -112,27 +132,31 @@ class MoveEvent(ManagerEvent):
 
 @dataclasses.dataclass(kw_only=True)
 class MoveXEvent(ManagerEvent):
+    frames_per_event = 0
     step: int
     speed: int = 10000
 
 
 @dataclasses.dataclass(kw_only=True)
 class GetXEvent(ManagerEvent):
-    pass
+    frames_per_event = 0
 
 
 @dataclasses.dataclass(kw_only=True)
 class SetLightIntensityEvent(ManagerEvent):
+    frames_per_event = 0
     intensity: float
 
 
 @dataclasses.dataclass(kw_only=True)
 class SetLaserStateEvent(ManagerEvent):
+    frames_per_event = 0
     on: bool
 
 
 @dataclasses.dataclass(kw_only=True)
 class MoveYEvent(ManagerEvent):
+    frames_per_event = 0
     step: int
     speed: int = 10000
     pass
@@ -0,0 +1,381 @@
+import asyncio
+import dataclasses
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncGenerator, Iterable
+
+from akuire.acquisition import PairedEvent
+from akuire.config import SystemConfig
+from akuire.events import DataEvent
+from akuire.managers.base import Manager
+from akuire.scheduling import Lease
+from akuire.tracing import Tracer
+
+EventsQueue = Iterable[Iterable[PairedEvent]]
+
+
+def _batches(manager: Manager, paired_event: PairedEvent) -> bool:
+    batches_event = getattr(manager, "batches_event", None)
+    return batches_event is not None and batches_event(paired_event.event)
+
+
+def _trace(
+    paired_events: Iterable[PairedEvent], tracer: Tracer | None
+) -> Iterable[PairedEvent]:
+    return tracer.trace(paired_events) if tracer is not None else paired_events
+
+
+async def _compute(
+    manager: Manager, paired_event: PairedEvent, tracer: Tracer | None
+) -> AsyncGenerator[DataEvent, None]:
+    span = paired_event.span
+    if tracer is None or span is None:
+        async with aclosing(manager.compute_event(paired_event.event)) as stream:
+            async for event in stream:
+                yield event
+        return
+
+    # Only the time spent in the manager counts, not the time the stream is suspended
+    span.started_at = time.perf_counter()
+    error = None
+    try:
+        async with aclosing(manager.compute_event(paired_event.event)) as stream:
+            while True:
+                start = time.perf_counter()
+                try:
+                    event = await anext(stream)
+                except StopAsyncIteration:
+                    break
+                finally:
+                    span.manager_time += time.perf_counter() - start
+
+                span.observe(event)
+                yield event
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        tracer.finish(span, error)
+
+
+async def _compute_batch(
+    manager: Manager, batch: list[PairedEvent], tracer: Tracer | None
+) -> AsyncGenerator[tuple[PairedEvent, DataEvent], None]:
+    paired_by_event = {id(paired_event.event): paired_event for paired_event in batch}
+    events = [paired_event.event for paired_event in batch]
+    spans = [paired_event.span for paired_event in batch if paired_event.span]
+
+    if tracer is None or not spans:
+        async with aclosing(manager.compute_batch(events)) as stream:
+            async for event, data_event in stream:
+                yield paired_by_event[id(event)], data_event
+        return
+
+    # The time spent in the manager is accounted to the event whose data it produced
+    started_at = time.perf_counter()
+    for span in spans:
+        span.started_at = started_at
+    error = None
+    try:
+        async with aclosing(manager.compute_batch(events)) as stream:
+            while True:
+                start = time.perf_counter()
+                try:
+                    event, data_event = await anext(stream)
+                except StopAsyncIteration:
+                    break
+
+                paired_event = paired_by_event[id(event)]
+                if paired_event.span is not None:
+                    paired_event.span.manager_time += time.perf_counter() - start
+                    paired_event.span.observe(data_event)
+                yield paired_event, data_event
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        for span in spans:
+            tracer.finish(span, error)
+
+
+async def _held(
+    stream: AsyncGenerator, lease: Lease | None, device: str | None
+) -> AsyncGenerator:
+    """Hold the device while the stream computes a paired event
+
+    The device is held until the paired event is fully computed, so no other
+    acquisition is computed on it in between the events it yields. While the
+    stream is suspended at a yield, the acquisitions that its consumer (e.g. a hook
+    or the consumer of the acquisition) starts may borrow the device, see
+    `akuire.scheduling.consumed_leases`, and the stream resumes once they are done.
+    """
+    async with aclosing(stream):
+        if lease is None or device is None:
+            async for item in stream:
+                yield item
+            return
+
+        async with lease.hold({device}):
+            while True:
+                try:
+                    item = await anext(stream)
+                except StopAsyncIteration:
+                    return
+                lease.suspend({device})
+                yield item
+                await lease.resume({device})
+
+
+def _computed(
+    manager: Manager,
+    paired_event: PairedEvent,
+    tracer: Tracer | None,
+    lease: Lease | None,
+) -> AsyncGenerator[DataEvent, None]:
+    return _held(_compute(manager, paired_event, tracer), lease, paired_event.manager)
+
+
+def _computed_batch(
+    manager: Manager,
+    batch: list[PairedEvent],
+    tracer: Tracer | None,
+    lease: Lease | None,
+) -> AsyncGenerator[tuple[PairedEvent, DataEvent], None]:
+    return _held(_compute_batch(manager, batch, tracer), lease, batch[0].manager)
+
+
+async def aserial(
+    events_queue: EventsQueue,
+    config: SystemConfig,
+    tracer: Tracer | None = None,
+    lease: Lease | None = None,
+    max_batch_size: int = 64,
+) -> AsyncGenerator[tuple[PairedEvent, DataEvent], None]:
+    """Execute the compiled events one after another
+
+    Every event is fully computed by its manager before the next one is started.
+
+    Managers can opt into computing consecutive events at once, e.g. to coalesce
+    commands into fewer requests, by implementing `batches_event(event) -> bool` and
+    `compute_batch(events)`, which yields tuples of the event and a data event it
+    produced. Consecutive events that the same manager batches are collected and
+    computed together, at most `max_batch_size` at once, so that long runs of
+    batchable events (e.g. the moves of a big grid) are neither collected in full
+    before the first one is sent nor held up behind each other.
+
+    If a tracer is given, the (sampled) paired events are traced, see `akuire.tracing.Tracer`.
+
+    If a lease is given, the device of every paired event is held while its manager
+    computes it, and lent to the acquisitions of the consumer while a data event is
+    handed on, see `akuire.scheduling.DeviceScheduler`. The events are still compiled lazily.
+
+    Args:
+        max_batch_size (int, optional): The maximum number of events computed in one batch. Defaults to 64.
+
+    Yields:
+        tuple[PairedEvent, DataEvent]: The paired event and a data event it produced.
+    """
+    batch: list[PairedEvent] = []
+    batch_manager: Manager | None = None
+
+    for paired_events in events_queue:
+        for paired_event in _trace(paired_events, tracer):
+            if paired_event.is_barrier:
+                # Serial execution is always ordered, but a pending batch completes first
+                if batch:
+                    async for item in _computed_batch(
+                        batch_manager, batch, tracer, lease
+                    ):
+                        yield item
+                    batch = []
+                continue
+
+            manager = config.get_manager(paired_event.manager)
+
+            if batch and manager is not batch_manager:
+                async for item in _computed_batch(batch_manager, batch, tracer, lease):
+                    yield item
+                batch = []
+
+            if _batches(manager, paired_event):
+                batch.append(paired_event)
+                batch_manager = manager
+                if len(batch) >= max_batch_size:
+                    async for item in _computed_batch(
+                        batch_manager, batch, tracer, lease
+                    ):
+                        yield item
+                    batch = []
+                continue
+
+            if batch:
+                async for item in _computed_batch(batch_manager, batch, tracer, lease):
+                    yield item
+                batch = []
+
+            async with aclosing(
+                _computed(manager, paired_event, tracer, lease)
+            ) as stream:
+                async for event in stream:
+                    yield paired_event, event
+
+    if batch:
+        async for item in _computed_batch(batch_manager, batch, tracer, lease):
+            yield item
+
+
+_DONE = object()
+
+
+@dataclasses.dataclass
+class _ChainFailed:
+    exception: BaseException
+
+
+async def _run_chain(
+    paired_events: list[PairedEvent],
+    config: SystemConfig,
+    queue: asyncio.Queue,
+    predecessors: list[asyncio.Task],
+    tracer: Tracer | None = None,
+    lease: Lease | None = None,
+) -> bool:
+    if predecessors:
+        results = await asyncio.gather(*predecessors)
+        if not all(results):
+            # A predecessor failed, the failure is raised when the consumer reaches it
+            await queue.put(_DONE)
+            return False
+
+    try:
+        for paired_event in paired_events:
+            manager = config.get_manager(paired_event.manager)
+
+            async with aclosing(
+                _computed(manager, paired_event, tracer, lease)
+            ) as stream:
+                async for event in stream:
+                    await queue.put((paired_event, event))
+    except Exception as e:
+        await queue.put(_ChainFailed(e))
+        return False
+
+    await queue.put(_DONE)
+    return True
+
+
+async def _run_barrier(predecessors: list[asyncio.Task]) -> bool:
+    results = await asyncio.gather(*predecessors)
+    return all(results)
+
+
+async def apipelined(
+    events_queue: EventsQueue,
+    config: SystemConfig,
+    tracer: Tracer | None = None,
+    lease: Lease | None = None,
+    depth: int = 8,
+    chain_buffer_size: int = 16,
+) -> AsyncGenerator[tuple[PairedEvent, DataEvent], None]:
+    """Execute the compiled events concurrently where they do not depend on each other
+
+    Every list of paired events (i.e. one event of the acquisition and everything
+    it was transpiled into) forms a chain that is executed in order, as its events
+    depend on each other (e.g. moving the z stage before taking the next frame of
+    a z-stack). Chains run concurrently unless they share a device, in which case
+    the later chain waits for the earlier one, or they are separated by a
+    BarrierEvent.
+
+    As the devices of a chain need to be known before it is scheduled, every chain
+    is materialized when it is started. Prefer serial execution for events that
+    expand into very long chains.
+
+    The produced data events are buffered and yielded in the order of the
+    acquisition, so the output is the same as in serial execution. At most `depth`
+    chains run ahead of the one that is consumed, and every chain buffers at most
+    `chain_buffer_size` data events, so a slow consumer holds up the devices instead
+    of letting the buffered frames grow without bound.
+
+    If a tracer is given, the (sampled) paired events are traced, see `akuire.tracing.Tracer`.
+    The queue wait of an event then includes the time its chain waited for its predecessors.
+
+    If a lease is given, the device of every paired event is held while its manager
+    computes it, see `akuire.scheduling.DeviceScheduler`.
+
+    Events are never batched (see `aserial`): every paired event is computed on its
+    own, even by managers that implement `compute_batch`, as the events of a chain
+    are started as soon as their predecessors are done.
+
+    Args:
+        depth (int, optional): The number of chains that are started ahead of the one that is consumed. Defaults to 8.
+        chain_buffer_size (int, optional): The number of data events a chain buffers. Defaults to 16.
+
+    Yields:
+        tuple[PairedEvent, DataEvent]: The paired event and a data event it produced.
+    """
+    assert depth > 0, "The depth must be positive"
+    chains: deque[tuple[asyncio.Task, asyncio.Queue]] = deque()
+    running: set[asyncio.Task] = set()
+    tails: dict[str, asyncio.Task] = {}
+    since_fence: list[asyncio.Task] = []
+    fence: asyncio.Task | None = None
+    paired_events_queue = iter(events_queue)
+    exhausted = False
+
+    try:
+        while True:
+            while not exhausted and len(chains) < depth:
+                paired_events = next(paired_events_queue, None)
+                if paired_events is None:
+                    exhausted = True
+                    break
+
+                paired_events = list(_trace(paired_events, tracer))
+
+                if any(paired_event.is_barrier for paired_event in paired_events):
+                    if fence is not None:
+                        since_fence.append(fence)
+                    fence = asyncio.create_task(_run_barrier(since_fence))
+                    since_fence = []
+                    tails = {}
+                    continue
+
+                devices = {paired_event.manager for paired_event in paired_events}
+                predecessors = [tails[device] for device in devices if device in tails]
+                if fence is not None:
+                    predecessors.append(fence)
+
+                queue = asyncio.Queue(maxsize=chain_buffer_size)
+                task = asyncio.create_task(
+                    _run_chain(
+                        paired_events, config, queue, predecessors, tracer, lease
+                    )
+                )
+                running.add(task)
+                task.add_done_callback(running.discard)
+                chains.append((task, queue))
+                since_fence.append(task)
+                for device in devices:
+                    tails[device] = task
+
+            if not chains:
+                break
+
+            task, queue = chains.popleft()
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _ChainFailed):
+                    raise item.exception
+
+                yield item
+
+    finally:
+        pending = list(running)
+        if fence is not None and not fence.done():
+            pending.append(fence)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,255 @@
+import asyncio
+import copy
+import dataclasses
+import inspect
+import math
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+from akuire.events import DataEvent, ImageDataEvent
+from akuire.scheduling import Lease, consumed_leases, consuming
+from akuire.streaming import BoundedEventQueue, OverflowPolicy, StreamStats
+from akuire.tracing import EventSpan, Tracer
+
+Hook = Callable[[DataEvent], Awaitable[None] | None]
+
+
+@dataclasses.dataclass
+class HookStats:
+    """Latencies (in seconds) of the calls of a hook"""
+
+    name: str = ""
+    """The name of the hook, for display"""
+    calls: int = 0
+    errors: int = 0
+    total: float = 0
+    min: float = math.inf
+    max: float = 0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0
+
+    def record(self, latency: float):
+        self.calls += 1
+        self.total += latency
+        self.min = min(self.min, latency)
+        self.max = max(self.max, latency)
+
+
+def hook_name(hook: Hook) -> str:
+    return getattr(hook, "__qualname__", None) or repr(hook)
+
+
+def hook_key(hook: Hook) -> Hook | int:
+    """The key of the stats of a hook
+
+    Hooks are told apart by identity (or equality, e.g. for bound methods), not by
+    name, as lambdas and partials share their names. Unhashable hooks are keyed by id.
+    """
+    try:
+        hash(hook)
+    except TypeError:
+        return id(hook)
+    return hook
+
+
+def is_async_hook(hook: Hook) -> bool:
+    return inspect.iscoroutinefunction(hook) or inspect.iscoroutinefunction(
+        getattr(hook, "__call__", None)
+    )
+
+
+@dataclasses.dataclass
+class _Dispatched:
+    event: DataEvent
+    span: EventSpan | None = None
+    leases: frozenset[Lease] = frozenset()
+    """The leases consumed where the event was dispatched, for the acquisitions of the hooks"""
+
+    def release(self):
+        if isinstance(self.event, ImageDataEvent):
+            self.event.release()
+
+
+@dataclasses.dataclass
+class _HookRunner:
+    hook: Hook
+    stats: HookStats
+    queue: BoundedEventQueue
+    task: asyncio.Task | None = None
+
+
+class HookDispatcher:
+    """Dispatches the events of a stream to hooks concurrently
+
+    Every hook gets its own bounded queue and task, so the hooks run concurrently
+    and a slow hook does not hold up the others (only the dispatching, once its
+    queue is full and the "block" policy is used). Async hooks run on the event
+    loop, sync hooks (e.g. CPU bound analysis) in an executor: a thread pool by
+    default, or the given executor (e.g. a ProcessPoolExecutor, in which case the
+    hooks and events need to be picklable).
+
+    The hooks receive their own shallow copy of the event, which retains the ring
+    buffer slot of the frame until every hook is done with it, so the consumer of
+    the stream may store or release the event meanwhile.
+
+    If a hook fails, no more hooks are called and the failure is raised by the
+    next `dispatch` or by `close`. The latency of every hook is recorded in `stats`,
+    and in the span of the event if it was dispatched with one.
+
+    Args:
+        hooks (list[Hook]): The hooks to dispatch to.
+        maxsize (int, optional): The size of the queue of every hook. Defaults to 16.
+        policy (OverflowPolicy, optional): What to do when the queue of a hook is full. Defaults to "block".
+        executor (Executor, optional): The executor for sync hooks. Defaults to a thread pool.
+        stats (dict[Hook | int, HookStats], optional): The latency stats to update per hook
+            (see `hook_key`), e.g. to accumulate them over multiple dispatchers. Defaults to new stats.
+        queue_stats (StreamStats, optional): The counters to update for the queues of the hooks.
+        tracer (Tracer, optional): The tracer to record the latencies of traced events in.
+    """
+
+    def __init__(
+        self,
+        hooks: list[Hook],
+        maxsize: int = 16,
+        policy: OverflowPolicy = "block",
+        executor: Executor | None = None,
+        stats: dict[Hook | int, HookStats] | None = None,
+        queue_stats: StreamStats | None = None,
+        tracer: Tracer | None = None,
+    ):
+        self.hooks = list(hooks)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.executor = executor
+        self.stats = stats if stats is not None else {}
+        self.queue_stats = queue_stats if queue_stats is not None else StreamStats()
+        self.tracer = tracer
+        self._own_executor: Executor | None = None
+        self._runners: list[_HookRunner] = []
+        self._failure: Exception | None = None
+
+    async def __aenter__(self) -> "HookDispatcher":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            await self.close()
+        else:
+            await self.cancel()
+
+    def start(self):
+        sync_hooks = [hook for hook in self.hooks if not is_async_hook(hook)]
+        if sync_hooks and self.executor is None:
+            self._own_executor = ThreadPoolExecutor(
+                max_workers=len(sync_hooks), thread_name_prefix="akuire-hook"
+            )
+
+        for hook in self.hooks:
+            runner = _HookRunner(
+                hook=hook,
+                stats=self.stats.setdefault(
+                    hook_key(hook), HookStats(name=hook_name(hook))
+                ),
+                queue=BoundedEventQueue(
+                    self.maxsize, self.policy, stats=self.queue_stats
+                ),
+            )
+            runner.task = asyncio.create_task(self._run(runner))
+            self._runners.append(runner)
+
+    async def _call(self, hook: Hook, event: DataEvent):
+        if is_async_hook(hook):
+            await hook(event)
+            return
+
+        executor = self.executor or self._own_executor
+        if isinstance(executor, ProcessPoolExecutor) and isinstance(
+            event, ImageDataEvent
+        ):
+            # Slots cannot cross process boundaries, the data is pickled anyway
+            event = copy.copy(event)
+            event.slot = None
+
+        result = await asyncio.get_running_loop().run_in_executor(
+            executor, hook, event
+        )
+        if inspect.isawaitable(result):
+            await result
+
+    async def _run(self, runner: _HookRunner):
+        async for item in runner.queue:
+            try:
+                if self._failure is None:
+                    start = time.perf_counter()
+                    with consuming(item.leases):
+                        await self._call(runner.hook, item.event)
+                    latency = time.perf_counter() - start
+                    runner.stats.record(latency)
+                    if item.span is not None and self.tracer is not None:
+                        self.tracer.record_hook(item.span, latency)
+            except Exception as e:
+                # Keep draining, so the dispatching is never blocked by a failed hook
+                runner.stats.errors += 1
+                if self._failure is None:
+                    self._failure = e
+            finally:
+                item.release()
+
+    def raise_failure(self):
+        """Raise the failure of a hook, if there was one"""
+        if self._failure is not None:
+            failure, self._failure = self._failure, None
+            raise failure
+
+    async def dispatch(self, event: DataEvent, span: EventSpan | None = None):
+        """Queue the event for every hook
+
+        Args:
+            event (DataEvent): The event.
+            span (EventSpan, optional): The span of the paired event that produced it, if traced.
+        """
+        self.raise_failure()
+        if not self._runners:
+            return
+
+        if isinstance(event, ImageDataEvent):
+            # The hooks share their own view of the event, retaining the frame once per hook
+            event = copy.copy(event)
+            for _ in self._runners:
+                event.retain()
+
+        item = _Dispatched(event, span, consumed_leases.get())
+        for runner in self._runners:
+            await runner.queue.put(item)
+
+    def _shutdown(self):
+        if self._own_executor is not None:
+            self._own_executor.shutdown(wait=False)
+            self._own_executor = None
+
+    async def close(self):
+        """Wait until every hook processed its events, raising the failure of a hook"""
+        try:
+            for runner in self._runners:
+                await runner.queue.close()
+            await asyncio.gather(*(runner.task for runner in self._runners))
+        finally:
+            self._runners = []
+            self._shutdown()
+        self.raise_failure()
+
+    async def cancel(self):
+        """Stop the hooks, discarding the events they did not process yet"""
+        for runner in self._runners:
+            runner.task.cancel()
+        await asyncio.gather(
+            *(runner.task for runner in self._runners), return_exceptions=True
+        )
+        for runner in self._runners:
+            runner.queue.discard()
+        self._runners = []
+        self._shutdown()
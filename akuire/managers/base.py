@@ -2,6 +2,7 @@ import dataclasses
 from typing import (
     AsyncContextManager,
     AsyncGenerator,
+    ClassVar,
     Protocol,
     get_args,
     runtime_checkable,
@@ -38,10 +39,70 @@ class Manager(Protocol):
         ...
 
 
+def infer_typed_challengers(compute_event) -> frozenset[type[ManagerEvent]]:
+    """Infer the accepted event types from the annotations of a compute_event method
+
+    The event argument can be annotated with a single ManagerEvent subclass
+    or a union of ManagerEvent subclasses.
+
+    Returns:
+        frozenset[type[ManagerEvent]]: The accepted event types.
+    """
+    try:
+        signature = inspect.signature(compute_event, eval_str=True)
+    except NameError:
+        signature = inspect.signature(compute_event)
+
+    typed_challengers = frozenset()
+
+    for key, value in signature.parameters.items():
+        annotation = value.annotation
+        if annotation is inspect.Parameter.empty:
+            continue
+        try:
+            if issubclass(annotation, ManagerEvent):
+                typed_challengers = frozenset([annotation])
+        except TypeError:
+            union_types = []
+            for i in get_args(annotation):
+                if isinstance(i, type) and issubclass(i, ManagerEvent):
+                    union_types.append(i)
+                else:
+                    raise TypeError(
+                        f"Annotation {i} is not a subclass of ManagerEvent nor a union of ManagerEvent subclasses"
+                    )
+
+            typed_challengers = frozenset(union_types)
+
+    return typed_challengers
+
+
 @dataclasses.dataclass
 class BaseManager:
     device: str = "default"
-    __typed_challengers = None
+    typed_challengers: ClassVar[frozenset[type[ManagerEvent]]] = frozenset()
+    """The event types this manager accepts, inferred once per class from compute_event"""
+    _accepted_event_types: ClassVar[dict[type, bool]] = {}
+    dynamic_challenge: ClassVar[bool] = False
+    """Whether a custom challenge depends on the state of the manager, not only the event
+
+    The routes of such managers are not reused between acquisitions of the same
+    shape (see `akuire.compilers.cache.PlanCache`).
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        if "compute_event" in cls.__dict__:
+            try:
+                cls.typed_challengers = infer_typed_challengers(cls.compute_event)
+            except TypeError:
+                if cls.challenge is BaseManager.challenge:
+                    raise
+                # The manager decides on its own which events it accepts
+                cls.typed_challengers = frozenset()
+
+        cls._accepted_event_types = {}
 
     async def __aenter__(self) -> AsyncContextManager["BaseManager"]:
         pass
@@ -59,6 +120,22 @@ class BaseManager:
             "compute_event method must be implemented in the subclass"
         )
 
+    @classmethod
+    def accepts_event_type(cls, event_type: type[ManagerEvent]) -> bool:
+        """Check if the manager accepts events of the given type
+
+        An event type is accepted if it, or any of its base classes, is one of the
+        typed challengers of the manager. The result is memoized per manager class.
+        """
+        try:
+            return cls._accepted_event_types[event_type]
+        except KeyError:
+            accepted = any(
+                klass in cls.typed_challengers for klass in event_type.__mro__
+            )
+            cls._accepted_event_types[event_type] = accepted
+            return accepted
+
     def challenge(self, event: ManagerEvent) -> bool:
         """Check if the manager can handle the event
 
@@ -70,25 +147,4 @@ class BaseManager:
 
 
         """
-        if self.__typed_challengers is None:
-            for key, value in inspect.signature(self.compute_event).parameters.items():
-                annotation = value.annotation
-                try:
-                    if issubclass(annotation, ManagerEvent):
-                        self.__typed_challengers = [annotation]
-                except TypeError:
-                    union_types = []
-                    for i in get_args(annotation):
-                        if issubclass(i, ManagerEvent):
-                            union_types.append(i)
-                        else:
-                            raise TypeError(
-                                f"Annotation {i} is not a subclass of ManagerEvent nor a union of ManagerEvent subclasses"
-                            )
-
-                    self.__typed_challengers = union_types
-
-        if event.__class__ in self.__typed_challengers:
-            return True
-
-        return False
+        return self.accepts_event_type(event.__class__)
@@ -0,0 +1,194 @@
+import asyncio
+import dataclasses
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, AsyncGenerator, Iterable
+
+import numpy as np
+
+from akuire.buffers import FrameSlot, SharedFrameRingBuffer, attach_frames
+
+_worker_manager: Any = None
+_worker_frames: dict[str, tuple[SharedMemory, np.ndarray]] = {}
+
+
+def _init_worker(manager: Any):
+    global _worker_manager
+    _worker_manager = manager
+    # Forked workers inherit the random state, and would all draw the same noise
+    np.random.seed()
+
+
+def _render(method: str, kwargs: dict) -> np.ndarray:
+    return getattr(_worker_manager, method)(**kwargs)
+
+
+def _render_into(
+    method: str,
+    kwargs: dict,
+    name: str,
+    shape: tuple[int, ...],
+    dtype: str,
+    capacity: int,
+    index: int,
+):
+    frames = _worker_frames.get(name)
+    if frames is None:
+        frames = _worker_frames[name] = attach_frames(name, shape, dtype, capacity)
+
+    np.copyto(frames[1][index], _render(method, kwargs), casting="unsafe")
+
+
+@dataclasses.dataclass
+class ProcessOffloadMixin:
+    """Synthesizes the frames of a manager in a pool of worker processes
+
+    CPU heavy frame synthesis (e.g. of the virtual microscopes) holds the GIL,
+    so running it in a thread still blocks the event loop and every other manager.
+    Managers mixing this in synthesize their frames with `offload_frame` and
+    `offload_frames`, which call a method of the manager in a worker process. The
+    workers write the frames into a SharedFrameRingBuffer, so they are not pickled
+    on their way back. If the ring is exhausted (e.g. because the consumer holds on
+    to the frames) the frames are pickled instead.
+
+    Every worker holds a copy of the manager, taken when the pool is started (see
+    `start_offload`), so the method should only depend on state that does not
+    change during the acquisition, and receive everything else (e.g. the stage
+    position) as arguments. With the "fork" start method the copy is free, with
+    "spawn" the manager is pickled once per worker.
+
+    With offload_workers set to 0 the frames are synthesized in a thread instead.
+    """
+
+    offload_workers: int = 0
+    """The number of worker processes, 0 to synthesize the frames in a thread"""
+    prefetch_depth: int = 2
+    """The number of frames of a sequence that are synthesized ahead"""
+    offload_buffer_size: int = 16
+    """The number of frames in shared memory"""
+
+    def frame_spec(self) -> tuple[tuple[int, ...], np.dtype]:
+        """The shape and dtype of the frames the manager synthesizes"""
+        raise NotImplementedError("frame_spec must be implemented in the subclass")
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.pop("_offload_pool", None)
+        state.pop("_offload_buffer", None)
+        return state
+
+    def start_offload(self):
+        """Start the worker processes and allocate the shared frames"""
+        if self.offload_workers <= 0 or getattr(self, "_offload_pool", None):
+            return
+
+        shape, dtype = self.frame_spec()
+        self._offload_buffer = SharedFrameRingBuffer(
+            shape,
+            dtype,
+            capacity=max(self.offload_buffer_size, self.prefetch_depth + 1),
+        )
+        self._offload_pool = ProcessPoolExecutor(
+            max_workers=self.offload_workers,
+            initializer=_init_worker,
+            initargs=(self,),
+        )
+
+    async def stop_offload(self):
+        """Stop the worker processes and free the shared frames
+
+        The workers are joined in a thread, so the event loop keeps running while
+        they finish the frames they are synthesizing.
+        """
+        pool = getattr(self, "_offload_pool", None)
+        if pool is None:
+            return
+
+        buffer = self._offload_buffer
+        self._offload_pool = None
+        self._offload_buffer = None
+        await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+        buffer.close()
+
+    def _submit(
+        self, method: str, kwargs: dict
+    ) -> tuple[asyncio.Future, FrameSlot | None]:
+        loop = asyncio.get_running_loop()
+        pool = getattr(self, "_offload_pool", None)
+        if pool is None:
+            thread = asyncio.to_thread(getattr(self, method), **kwargs)
+            return asyncio.ensure_future(thread), None
+
+        buffer = self._offload_buffer
+        slot = buffer.try_claim()
+        if slot is None:
+            buffer.overflows += 1
+            return loop.run_in_executor(pool, _render, method, kwargs), None
+
+        future = loop.run_in_executor(
+            pool,
+            _render_into,
+            method,
+            kwargs,
+            buffer.name,
+            buffer.shape,
+            buffer.dtype.str,
+            buffer.capacity,
+            slot.index,
+        )
+        return future, slot
+
+    async def _result(
+        self, future: asyncio.Future, slot: FrameSlot | None
+    ) -> FrameSlot:
+        try:
+            data = await future
+        except BaseException:
+            if slot is not None:
+                slot.release()
+            raise
+
+        if slot is None:
+            return FrameSlot(buffer=None, index=None, data=data)
+        return slot
+
+    async def offload_frame(self, method: str, **kwargs) -> FrameSlot:
+        """Synthesize a frame by calling the method with the arguments in a worker
+
+        Returns:
+            FrameSlot: The slot holding the frame, to be attached to the ImageDataEvent.
+        """
+        return await self._result(*self._submit(method, kwargs))
+
+    async def offload_frames(
+        self, method: str, calls: Iterable[dict]
+    ) -> AsyncGenerator[FrameSlot, None]:
+        """Synthesize a sequence of frames, calling the method once per arguments
+
+        Up to prefetch_depth frames are synthesized ahead of the one that is
+        yielded, spread over the workers. Without workers the frames are
+        synthesized one after another, as the method is not assumed to be thread-safe.
+
+        Yields:
+            FrameSlot: The slots holding the frames, in order.
+        """
+        depth = self.prefetch_depth if getattr(self, "_offload_pool", None) else 0
+        pending: deque[tuple[asyncio.Future, FrameSlot | None]] = deque()
+        try:
+            for kwargs in calls:
+                pending.append(self._submit(method, kwargs))
+                if len(pending) > depth:
+                    yield await self._result(*pending.popleft())
+
+            while pending:
+                yield await self._result(*pending.popleft())
+        finally:
+            # A running synthesis cannot be cancelled, its slot is only free once it finished
+            for future, slot in pending:
+                try:
+                    await future
+                except Exception:
+                    pass
+                if slot is not None:
+                    slot.release()
@@ -1,7 +1,10 @@
 import asyncio
+import contextlib
 import dataclasses
 import io
-from typing import AsyncGenerator
+import math
+import time
+from typing import AsyncGenerator, AsyncIterator
 from urllib.parse import urlencode
 
 import aiohttp
@@ -9,6 +12,8 @@ import numpy as np
 import PIL.Image
 import urllib3
 
+from akuire.buffers import FrameRingBuffer
+from akuire.errors import ManagerError
 from akuire.events import (
     AcquireFrameEvent,
     AcquireZStackEvent,
@@ -24,6 +29,31 @@ from akuire.events import (
 from akuire.events.manager_event import SetLightIntensityEvent
 from akuire.managers.base import Manager
 
+RAW_CONTENT_TYPE = "application/octet-stream"
+RAW_ACCEPT = f"{RAW_CONTENT_TYPE}, image/png;q=0.9, image/tiff;q=0.8"
+FRAME_DTYPE_HEADER = "X-Frame-Dtype"
+FRAME_SHAPE_HEADER = "X-Frame-Shape"
+
+
+@dataclasses.dataclass
+class EndpointStats:
+    """Round-trip latencies (in seconds) of the requests to an endpoint"""
+
+    count: int = 0
+    total: float = 0
+    min: float = math.inf
+    max: float = 0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def record(self, latency: float):
+        self.count += 1
+        self.total += latency
+        self.min = min(self.min, latency)
+        self.max = max(self.max, latency)
+
 
 @dataclasses.dataclass
 class OpenUC2RestManager(Manager):
@@ -32,8 +62,14 @@ class OpenUC2RestManager(Manager):
     This manager is used to control the OpenUC2 REST API.
     It can be used to control the LED matrix, the positioner and the camera.
 
+    The manager owns a single pooled aiohttp session for its lifetime (between
+    __aenter__ and __aexit__), so connections are kept alive and reused between
+    events instead of paying the TCP and TLS setup for every request. The round
+    trip latency of every endpoint is recorded in `stats`.
+
     """
 
+    device: str = "openuc2"
     exposition_time_is_sleep: bool = False
     endpoint: str = "https://192.168.137.1:8002/"
     png_snap_endpoint: str = "RecordingController/snapNumpyToFastAPI/"
@@ -42,97 +78,312 @@ class OpenUC2RestManager(Manager):
     ssl: bool = False
     stage = "ESP32Stage"
 
+    concurrent_axes: bool = False
+    """Move the X and Y axis concurrently instead of one after another."""
+    batch_commands: bool = False
+    """Coalesce consecutive moves and intensity changes, see `compute_batch`."""
+    raw_transfer: bool = True
+    """Negotiate the transfer of raw frames with the server, falling back to PNG or TIFF."""
+    chunk_size: int = 1 << 20
+    """The size (in bytes) of the chunks raw frames are streamed in."""
+    frame_buffer: FrameRingBuffer | None = None
+    """If set, raw frames of matching shape and dtype are written into slots of this buffer"""
+    connection_limit: int = 10
+    """The maximum number of open connections of the pool."""
+    connection_limit_per_host: int = 4
+    """The maximum number of open connections to the server."""
+    keepalive_timeout: float = 30
+    """How long (in seconds) idle connections are kept alive."""
+    request_timeout: float | None = 30
+    """The total timeout (in seconds) of a request, None for no timeout."""
+    connect_timeout: float | None = 5
+    """The timeout (in seconds) for establishing a connection, None for no timeout."""
+    stats: dict[str, EndpointStats] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _session: aiohttp.ClientSession | None = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def get_device_name(self) -> str:
+        return self.device
+
+    async def __aenter__(self) -> "OpenUC2RestManager":
+        self._session = self._create_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.connection_limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ssl=self.ssl,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=self.request_timeout, connect=self.connect_timeout
+            ),
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The pooled session, created on first use if the manager was not entered"""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    @contextlib.asynccontextmanager
+    async def request(
+        self,
+        endpoint: str,
+        query: str | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Request an endpoint of the server, recording the round trip latency
+
+        Args:
+            endpoint (str): The endpoint, relative to the server endpoint.
+            query (str, optional): The encoded query string. Defaults to None.
+            headers (dict[str, str], optional): Additional request headers. Defaults to None.
+
+        Yields:
+            aiohttp.ClientResponse: The response, whose body needs to be read within the context.
+        """
+        url = self.endpoint + endpoint
+        if query:
+            url += "?" + query
+
+        start = time.perf_counter()
+        async with self.session.get(url, ssl=self.ssl, headers=headers) as response:
+            yield response
+        self.stats.setdefault(endpoint, EndpointStats()).record(
+            time.perf_counter() - start
+        )
+
+    async def get(self, endpoint: str, query: str | None = None) -> bytes:
+        """Request an endpoint of the server and return the body of the response
+
+        Args:
+            endpoint (str): The endpoint, relative to the server endpoint.
+            query (str, optional): The encoded query string. Defaults to None.
+
+        Returns:
+            bytes: The body of the response.
+        """
+        async with self.request(endpoint, query) as response:
+            return await response.read()
+
+    async def snap(self) -> ImageDataEvent:
+        """Snap a frame
+
+        If `raw_transfer` is set, the raw frame is requested through content
+        negotiation. A server that supports it responds with the raw bytes of the
+        frame and its dtype and shape in the X-Frame-Dtype and X-Frame-Shape headers,
+        and the bytes are streamed straight into the frame. Otherwise (including
+        responses missing one of the headers) the encoded (PNG or TIFF) image of the
+        response is decoded.
+        """
+        headers = {"Accept": RAW_ACCEPT} if self.raw_transfer else None
+
+        async with self.request(self.png_snap_endpoint, headers=headers) as response:
+            if (
+                response.content_type == RAW_CONTENT_TYPE
+                and FRAME_SHAPE_HEADER in response.headers
+                and FRAME_DTYPE_HEADER in response.headers
+            ):
+                return await self._read_raw_frame(response)
+
+            # Bytes array to image
+            image = PIL.Image.open(io.BytesIO(await response.read()))
+            # to numpy array
+            image = np.array(image)
+            x = np.reshape(image, (1, 1, 1, *image.shape))
+            return ImageDataEvent(data=x, device=self.device)
+
+    async def _read_raw_frame(self, response: aiohttp.ClientResponse) -> ImageDataEvent:
+        dtype = np.dtype(response.headers[FRAME_DTYPE_HEADER])
+        shape = tuple(
+            int(size) for size in response.headers[FRAME_SHAPE_HEADER].split(",")
+        )
+        data_shape = (1, 1, 1, *shape)
+
+        slot = None
+        if (
+            self.frame_buffer is not None
+            and self.frame_buffer.shape == data_shape
+            and self.frame_buffer.dtype == dtype
+        ):
+            slot = await self.frame_buffer.claim()
+            data = slot.data
+        else:
+            data = np.empty(data_shape, dtype=dtype)
+
+        target = memoryview(data).cast("B")
+        offset = 0
+        try:
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                end = offset + len(chunk)
+                if end > target.nbytes:
+                    raise ManagerError(
+                        f"Received more than the {target.nbytes} bytes of a {dtype} frame of shape {shape}"
+                    )
+                target[offset:end] = chunk
+                offset = end
+
+            if offset != target.nbytes:
+                raise ManagerError(
+                    f"Received {offset} of the {target.nbytes} bytes of a {dtype} frame of shape {shape}"
+                )
+        except BaseException:
+            if slot is not None:
+                slot.release()
+            raise
+
+        return ImageDataEvent(data=data, slot=slot, device=self.device)
+
     async def compute_event(
         self, event: AcquireFrameEvent | ZChangeEvent | MoveXEvent | MoveYEvent
     ) -> AsyncGenerator[DataEvent, None]:
 
         if isinstance(event, AcquireFrameEvent):
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    self.endpoint + self.png_snap_endpoint,
-                    ssl=self.ssl,
-                ) as response:
-                    # Download the file
-                    # Convert the response to a PIL image
-                    bytes_array = await response.read()
-
-                    # Bytes array to image
-                    image = PIL.Image.open(io.BytesIO(bytes_array))
-                    # to numpy array
-                    image = np.array(image)
-                    x = np.reshape(image, (1, 1, 1, *image.shape))
-                    print(x)
-                    yield ImageDataEvent(data=x, device=self.device)
+            yield await self.snap()
 
         if isinstance(event, SetLightIntensityEvent):
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    self.endpoint
-                    + self.set_intensity_endpoint
-                    + "?intensity="
-                    + str(int(event.intensity * 255)),
-                    ssl=self.ssl,
-                ) as response:
-                    # Download the file
-                    t = await response.read()
-                    print(t)
+            await self.get(
+                self.set_intensity_endpoint,
+                "intensity=" + str(int(event.intensity * 255)),
+            )
 
         if isinstance(event, MoveEvent):
-            async with aiohttp.ClientSession() as session:
-
-                if event.x is not None:
-                    querystring = urlencode(
-                        [
-                            ("positionerName", self.stage),
-                            ("axis", "X"),
-                            ("dist", event.x),
-                            ("speed", event.speed),
-                            ("isBlocking", True),
-                            ("isAbsolute", True),
-                        ]
-                    )
+            await self.move(x=event.x, y=event.y, speed=event.speed)
+            yield HasMovedEvent(x=event.x, y=event.y, device=self.device)
 
-                    url = (
-                        self.endpoint + self.set_positioner_endpoint + "?" + querystring
-                    )
+        if isinstance(event, MoveXEvent):
+            await self.move(x=event.step, speed=event.speed)
+            yield HasMovedEvent(x=event.step, device=self.device)
 
-                    print(url)
-
-                    async with session.get(
-                        url,
-                        ssl=self.ssl,
-                    ) as response:
-                        # Download the file
-                        t = await response.read()
-                        print(t)
-
-                if event.y is not None:
-                    querystring = urlencode(
-                        [
-                            ("positionerName", self.stage),
-                            ("axis", "Y"),
-                            ("dist", event.y),
-                            ("speed", event.speed),
-                            ("isBlocking", True),
-                            ("isAbsolute", True),
-                        ]
-                    )
+        if isinstance(event, MoveYEvent):
+            await self.move(y=event.step, speed=event.speed)
+            yield HasMovedEvent(y=event.step, device=self.device)
 
-                    url = (
-                        self.endpoint + self.set_positioner_endpoint + "?" + querystring
-                    )
+    async def move_axis(self, axis: str, dist: float, speed: float):
+        querystring = urlencode(
+            [
+                ("positionerName", self.stage),
+                ("axis", axis),
+                ("dist", dist),
+                ("speed", speed),
+                ("isBlocking", True),
+                ("isAbsolute", True),
+            ]
+        )
+
+        await self.get(self.set_positioner_endpoint, querystring)
+
+    async def move(
+        self, x: float | None = None, y: float | None = None, speed: float = 10000
+    ):
+        """Move the stage to the absolute position
+
+        The axes are moved one after another, or concurrently if `concurrent_axes`
+        is set, in which case a diagonal move only costs a single round trip.
+        """
+        moves = [
+            self.move_axis(axis, dist, speed)
+            for axis, dist in (("X", x), ("Y", y))
+            if dist is not None
+        ]
 
-                    print(url)
+        if self.concurrent_axes:
+            await asyncio.gather(*moves)
+        else:
+            for move in moves:
+                await move
 
-                    async with session.get(
-                        url,
-                        ssl=self.ssl,
-                    ) as response:
-                        # Download the file
-                        t = await response.read()
-                        print(t)
+    def batches_event(self, event: ManagerEvent) -> bool:
+        """Whether the event can be coalesced with its neighbours by `compute_batch`"""
+        return self.batch_commands and isinstance(
+            event, (MoveEvent, MoveXEvent, MoveYEvent, SetLightIntensityEvent)
+        )
 
-                yield HasMovedEvent(x=event.x, y=event.y, device=self.device)
+    async def compute_batch(
+        self, events: list[MoveEvent | MoveXEvent | MoveYEvent | SetLightIntensityEvent]
+    ) -> AsyncGenerator[tuple[ManagerEvent, DataEvent], None]:
+        """Compute a sequence of stage moves and light intensity changes at once
+
+        As the stage moves to absolute positions, and no frame is taken within the
+        sequence, only the last target of every axis and the last intensity need to
+        be sent to the server: at most one request per axis and one for the light.
+        The server only moves a single axis per request.
+
+        Consecutive moves are only coalesced if they share their speed, so a change
+        of speed starts another round of requests. Every move still yields its own
+        HasMovedEvent (with the target of the move), once the stage reached the
+        position of its round.
+
+        Args:
+            events (list[ManagerEvent]): The consecutive events to compute (see `batches_event`).
+
+        Yields:
+            tuple[ManagerEvent, DataEvent]: The event and the data event it produced.
+        """
+        intensity = None
+        rounds: list[list[MoveEvent | MoveXEvent | MoveYEvent]] = []
+
+        for event in events:
+            if isinstance(event, SetLightIntensityEvent):
+                intensity = event.intensity
+            elif rounds and rounds[-1][-1].speed == event.speed:
+                rounds[-1].append(event)
+            else:
+                rounds.append([event])
+
+        # Light and stage are independent of each other
+        light = None
+        if intensity is not None:
+            light = asyncio.ensure_future(
+                self.get(
+                    self.set_intensity_endpoint,
+                    "intensity=" + str(int(intensity * 255)),
+                )
+            )
+
+        try:
+            for moves in rounds:
+                x = y = None
+                for event in moves:
+                    if isinstance(event, MoveEvent):
+                        x = event.x if event.x is not None else x
+                        y = event.y if event.y is not None else y
+                    elif isinstance(event, MoveXEvent):
+                        x = event.step
+                    elif isinstance(event, MoveYEvent):
+                        y = event.step
+
+                await self.move(x=x, y=y, speed=moves[-1].speed)
+
+                for event in moves:
+                    yield event, self._has_moved(event)
+
+            if light is not None:
+                await light
+        finally:
+            if light is not None:
+                light.cancel()
+                await asyncio.gather(light, return_exceptions=True)
+
+    def _has_moved(self, event: MoveEvent | MoveXEvent | MoveYEvent) -> HasMovedEvent:
+        if isinstance(event, MoveEvent):
+            return HasMovedEvent(x=event.x, y=event.y, device=self.device)
+        if isinstance(event, MoveXEvent):
+            return HasMovedEvent(x=event.step, device=self.device)
+        return HasMovedEvent(y=event.step, device=self.device)
 
     def challenge(self, event: ManagerEvent) -> bool:
         if isinstance(event, AcquireFrameEvent):
@@ -31,7 +31,6 @@ class FaultyCamera(BaseManager):
     ) -> AsyncGenerator[DataEvent, None]:
 
         if isinstance(event, AcquireFrameEvent):
-            print("Acquiring frame")
             async with self.__lock:
                 raise FaultyCameraError("Camera is faulty")
 
@@ -4,6 +4,7 @@ from typing import AsyncGenerator
 
 import numpy as np
 
+from akuire.buffers import FrameRingBuffer
 from akuire.events import (
     AcquireFrameEvent,
     AcquireZStackEvent,
@@ -18,6 +19,11 @@ from akuire.managers.base import BaseManager
 @dataclasses.dataclass
 class NonSweepableCamera(BaseManager):
     exposition_time_is_sleep: bool = True
+    frame_buffer: FrameRingBuffer | None = None
+    """If set, frames are written into slots of this buffer instead of newly allocated arrays"""
+    _rng: np.random.Generator = dataclasses.field(
+        default_factory=np.random.default_rng, init=False, repr=False
+    )
     __lock = asyncio.Lock()
     __queue = asyncio.Queue()
 
@@ -27,19 +33,23 @@ class NonSweepableCamera(BaseManager):
 
         async with self.__lock:
             if isinstance(event, AcquireFrameEvent):
-                print("Acquiring frame")
                 if self.exposition_time_is_sleep:
                     await asyncio.sleep(event.exposure_time)
-                yield ImageDataEvent(
-                    data=np.random.rand(
-                        1,
-                        1,
-                        1,
-                        512,
-                        512,
-                    ),
-                    device=self.device,
-                )
+                if self.frame_buffer is None:
+                    yield ImageDataEvent(
+                        data=np.random.rand(
+                            1,
+                            1,
+                            1,
+                            512,
+                            512,
+                        ),
+                        device=self.device,
+                    )
+                else:
+                    slot = await self.frame_buffer.claim()
+                    self._rng.random(out=slot.data)
+                    yield ImageDataEvent(data=slot.data, slot=slot, device=self.device)
 
     def challenge(self, event: ManagerEvent) -> bool:
         return isinstance(event, AcquireFrameEvent)
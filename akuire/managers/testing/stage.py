@@ -21,7 +21,6 @@ class VirtualStageManager(BaseManager):
     async def compute_event(
         self, event: MoveXEvent | MoveYEvent | MoveEvent
     ) -> AsyncGenerator[DataEvent, None]:
-        print("Moving stage")
 
         yield HasMovedEvent(x=event.x, device=self.device)
 
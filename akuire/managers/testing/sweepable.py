@@ -4,6 +4,7 @@ from typing import AsyncGenerator
 
 import numpy as np
 
+from akuire.buffers import FrameRingBuffer
 from akuire.events import (
     AcquireFrameEvent,
     AcquireZStackEvent,
@@ -18,29 +19,40 @@ from akuire.managers.base import BaseManager
 
 @dataclasses.dataclass
 class SweepableCamera(BaseManager):
+    frame_buffer: FrameRingBuffer | None = None
+    """If set, frames are written into slots of this buffer instead of newly allocated arrays"""
+    _rng: np.random.Generator = dataclasses.field(
+        default_factory=np.random.default_rng, init=False, repr=False
+    )
+
+    async def produce_frame(self, shape: tuple[int, ...]) -> ImageDataEvent:
+        if self.frame_buffer is None:
+            return ImageDataEvent(data=self._rng.random(shape), device=self.device)
+
+        if self.frame_buffer.shape != tuple(shape):
+            raise ValueError(
+                f"The frame buffer of {self.device} holds frames of shape {self.frame_buffer.shape}, but a frame of shape {tuple(shape)} was requested"
+            )
+
+        slot = await self.frame_buffer.claim()
+        self._rng.random(out=slot.data)
+        return ImageDataEvent(data=slot.data, slot=slot, device=self.device)
 
     async def compute_event(
         self, event: AcquireFrameEvent | ZChangeEvent | AcquireZStackEvent
     ) -> AsyncGenerator[DataEvent, None]:
 
         if isinstance(event, AcquireFrameEvent):
-            print("Acquiring frame")
             await asyncio.sleep(event.exposure_time)
-            yield ImageDataEvent(
-                data=np.random.rand(1, 1, 1, 512, 512, 1), device=self.device
-            )
+            yield await self.produce_frame((1, 1, 1, 512, 512, 1))
 
         if isinstance(event, ZChangeEvent):
-            print("Changing z")
             yield HasMovedEvent(z=event.z, device=self.device)
 
         if isinstance(event, AcquireZStackEvent):
-            print("Streaming Z-Stack")
             for i in range(event.z_steps):
                 await asyncio.sleep(event.item_exposure_time)
-                yield ImageDataEvent(
-                    data=np.random.rand(1, 1, 1, 512, 512), device=self.device
-                )
+                yield await self.produce_frame((1, 1, 1, 512, 512))
 
     def challenge(self, event: ManagerEvent) -> bool:
         if isinstance(event, AcquireFrameEvent):
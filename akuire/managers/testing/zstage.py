@@ -22,7 +22,6 @@ class ZStageManager(BaseManager):
     async def compute_event(
         self, event: ZChangeEvent
     ) -> AsyncGenerator[DataEvent, None]:
-        print("Changed Z")
         yield HasMovedEvent(z=event.z, device=self.device)
 
     def challenge(self, event: ManagerEvent) -> bool:
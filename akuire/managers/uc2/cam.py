@@ -1,7 +1,8 @@
 import asyncio
 import dataclasses
 import io
-from typing import AsyncContextManager, AsyncGenerator
+from contextlib import aclosing
+from typing import AsyncContextManager, AsyncGenerator, ClassVar
 import typing
 from urllib.parse import urlencode
 
@@ -14,14 +15,19 @@ from akuire.events import (
     AcquireFrameEvent,
     DataEvent,
     ImageDataEvent,
+    ManagerEvent,
 )
+from akuire.errors import ManagerError
 from akuire.events.manager_event import (
+    AcquireTSeriesEvent,
+    AcquireZStackEvent,
     ArmEvent,
     DisarmEvent,
     SetLightIntensityEvent,
     LiveCameraEvent,
 )
 from akuire.managers.base import BaseManager
+from akuire.managers.uc2.grabber import FrameGrabber
 import gxipy as gx
 
 
@@ -35,14 +41,84 @@ class DahengImagingManager(BaseManager):
     """
 
     exposition_time_is_sleep: bool = False
+    grab_timeout: int = 1000
+    """How long (in ms) to wait for a frame of the camera."""
+    queue_size: int = 64
+    """The number of frames that are buffered between the grabber thread and the acquisition."""
+    sequence_mode: bool = False
+    """Accept AcquireTSeriesEvents natively, grabbing a free running sequence at the frame
+    rate of their interval. Otherwise they are transpiled into single frames."""
+    trigger_source: str | None = None
+    """The trigger line (e.g. "LINE0") of hardware triggered z-stacks. If set in sequence mode,
+    AcquireZStackEvents are accepted natively and a frame is grabbed per trigger, so the z
+    stage (or its controller) has to trigger the camera on every step."""
 
     _gx_manager: gx.DeviceManager | None = None
     _is_armed: bool = False
+    _is_color: bool = False
     _cam: typing.Any | None = None
 
     async def __aenter__(self) -> AsyncContextManager[BaseManager]:
         self._gx_manager = gx.DeviceManager()
         self._cam = self._gx_manager.open_device_by_index(1)
+        # mono sensors have no bayer filter, their frames don't need to be converted
+        self._is_color = self._cam.PixelColorFilter.is_implemented() is True
+
+    def grab_image(self) -> np.ndarray | None:
+        """Grab the next frame of the data stream (blocking), or None on a timeout"""
+        raw_image = self._cam.data_stream[0].get_image(timeout=self.grab_timeout)
+        if raw_image is None:
+            return None
+
+        if self._is_color:
+            raw_image = raw_image.convert("RGB")
+        # Get the numpy array
+        return np.array(raw_image.get_numpy_array())
+
+    def configure_sequence(self, event: AcquireTSeriesEvent | AcquireZStackEvent):
+        """Configure the trigger, frame rate and exposure of the camera for a sequence"""
+        if isinstance(event, AcquireZStackEvent):
+            if self.trigger_source is None:
+                raise ManagerError(
+                    f"Camera {self.device} needs a trigger_source to acquire z-stacks"
+                )
+            self._cam.TriggerMode.set(gx.GxSwitchEntry.ON)
+            self._cam.TriggerSource.set(
+                getattr(gx.GxTriggerSourceEntry, self.trigger_source.upper())
+            )
+        else:
+            self._cam.TriggerMode.set(gx.GxSwitchEntry.OFF)
+            self._cam.AcquisitionFrameRateMode.set(gx.GxSwitchEntry.ON)
+            self._cam.AcquisitionFrameRate.set(1 / event.interval)
+
+        # The exposure time of the camera is in µs
+        self._cam.ExposureTime.set(event.item_exposure_time * 1e6)
+
+    def reset_sequence(self):
+        """Return the camera to free running single frames"""
+        self._cam.TriggerMode.set(gx.GxSwitchEntry.OFF)
+        self._cam.AcquisitionFrameRateMode.set(gx.GxSwitchEntry.OFF)
+
+    async def acquire_sequence(self, n_frames: int | None) -> AsyncGenerator[np.ndarray, None]:
+        """Acquire a sequence of frames (e.g. triggered by hardware)
+
+        The frames are grabbed by a background thread into a bounded queue, so the
+        camera can run at its full frame rate while the frames are yielded.
+
+        Args:
+            n_frames (int | None): The number of frames to acquire, None to acquire until closed.
+
+        Yields:
+            np.ndarray: The acquired frames
+        """
+        async with FrameGrabber(
+            self.grab_image,
+            limit=n_frames,
+            maxsize=self.queue_size,
+            name=f"frame-grabber {self.device}",
+        ) as grabber:
+            async for frame in grabber.frames():
+                yield frame
 
     async def acquire_frame(self, event: AcquireFrameEvent) -> np.ndarray:
         """Acquire a frame from the camera
@@ -56,15 +132,21 @@ class DahengImagingManager(BaseManager):
             np.ndarray: The acquired frame
 
         """
-        raw_image = self._cam.data_stream[0].get_image()
-
-        convert_image = raw_image.convert("RGB")
-        # Get the numpy array
-        image = np.array(convert_image.get_numpy_array())
+        image = await asyncio.to_thread(self.grab_image)
+        if image is None:
+            raise ManagerError(
+                f"Camera {self.device} did not deliver a frame within {self.grab_timeout} ms"
+            )
         return image
 
     async def compute_event(
-        self, event: AcquireFrameEvent | ArmEvent | DisarmEvent | LiveCameraEvent
+        self,
+        event: (
+            AcquireFrameEvent
+            | ArmEvent
+            | DisarmEvent
+            | LiveCameraEvent
+        ),
     ) -> AsyncGenerator[DataEvent, None]:
         if isinstance(event, ArmEvent):
             self._is_armed = True
@@ -80,9 +162,36 @@ class DahengImagingManager(BaseManager):
             image = await self.acquire_frame(event)
             yield ImageDataEvent(data=image, device=self.device)
 
+        if isinstance(event, (AcquireTSeriesEvent, AcquireZStackEvent)):
+            assert self._gx_manager is not None
+            # In sequence mode, the camera is armed for the duration of the sequence if needed
+            self.configure_sequence(event)
+            arm_for_sequence = not self._is_armed
+            if arm_for_sequence:
+                self._cam.stream_on()
+            try:
+                async with aclosing(
+                    self.acquire_sequence(event.expected_frames())
+                ) as frames:
+                    async for image in frames:
+                        yield ImageDataEvent(data=image, device=self.device)
+            finally:
+                if arm_for_sequence:
+                    self._cam.stream_off()
+                self.reset_sequence()
+
         if isinstance(event, LiveCameraEvent):
             assert self._gx_manager is not None
             assert self._is_armed, "The camera must be armed before acquiring a frame"
-            while True:
-                image = await self.acquire_frame(event)
-                yield ImageDataEvent(data=image, device=self.device)
+            async with aclosing(self.acquire_sequence(None)) as frames:
+                async for image in frames:
+                    yield ImageDataEvent(data=image, device=self.device)
+
+    dynamic_challenge: ClassVar[bool] = True
+
+    def challenge(self, event: ManagerEvent) -> bool:
+        if isinstance(event, AcquireZStackEvent):
+            return self.sequence_mode and self.trigger_source is not None
+        if isinstance(event, AcquireTSeriesEvent):
+            return self.sequence_mode
+        return super().challenge(event)
@@ -0,0 +1,114 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import threading
+from typing import AsyncIterator, Callable
+
+import numpy as np
+
+_DONE = object()
+
+
+@dataclasses.dataclass
+class _GrabFailed:
+    exception: BaseException
+
+
+class FrameGrabber:
+    """Pulls frames from a blocking source on a background thread
+
+    The grabber thread calls `grab` in a loop and puts the frames into a bounded
+    asyncio.Queue, from which they are consumed with `frames` without ever
+    blocking the event loop. If the consumer falls behind, the grabber waits for
+    room in the queue (the camera buffers the frames in the meantime), so no
+    frame is dropped.
+
+    Args:
+        grab (Callable[[], np.ndarray | None]): Grabs the next frame, returning None on a timeout.
+        limit (int, optional): The number of frames to grab, None to grab until stopped. Defaults to None.
+        maxsize (int, optional): The size of the frame queue. Defaults to 64.
+        name (str, optional): The name of the grabber thread. Defaults to "frame-grabber".
+    """
+
+    def __init__(
+        self,
+        grab: Callable[[], np.ndarray | None],
+        limit: int | None = None,
+        maxsize: int = 64,
+        name: str = "frame-grabber",
+    ):
+        self.grab = grab
+        self.limit = limit
+        self.maxsize = maxsize
+        self.name = name
+        self.grabbed = 0
+        self.timeouts = 0
+        self.max_depth = 0
+        self._queue: asyncio.Queue | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    async def __aenter__(self) -> "FrameGrabber":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        """Stop grabbing, discarding the frames that were not consumed"""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    def _put(self, item) -> bool:
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if self._stopped.is_set():
+                    future.cancel()
+                    return False
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                if self.limit is not None and self.grabbed >= self.limit:
+                    break
+
+                frame = self.grab()
+                if frame is None:
+                    self.timeouts += 1
+                    continue
+
+                self.grabbed += 1
+                if not self._put(frame):
+                    return
+        except Exception as e:
+            self._put(_GrabFailed(e))
+            return
+
+        self._put(_DONE)
+
+    async def frames(self) -> AsyncIterator[np.ndarray]:
+        """Yield the grabbed frames until the limit is reached"""
+        while True:
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+            item = await self._queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _GrabFailed):
+                raise item.exception
+            yield item
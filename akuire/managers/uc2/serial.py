@@ -1,5 +1,5 @@
-from uc2rest import UC2Client
 import asyncio
+
 from uc2rest import UC2Client
 
 from akuire.events.data_event import FinishedEvent
@@ -11,13 +11,30 @@ from akuire.events.manager_event import (
     SetLightIntensityEvent,
 )
 from akuire.managers.base import BaseManager
+from akuire.managers.uc2.worker import (
+    SerialWorker,
+    acquire_port_worker,
+    release_port_worker,
+)
 
 
 class SerialUC2Manager(BaseManager):
+    """Manager for an UC2 board connected through a serial port
+
+    Every command for the board is executed on a dedicated I/O thread of the
+    port (see SerialWorker), which is shared by the managers of the port, so
+    commands never interleave on the port. With
+    `pipeline_commands`, commands that don't need to be waited for (setting the
+    light intensity) are sent without blocking and queued behind the previous ones.
+    """
+
     serialport: str = "/dev/ttyUSB0"
     baudrate: int = 115200
     n_leds: int = 64
+    pipeline_commands: bool = False
     _client: UC2Client | None = None
+    _worker: SerialWorker | None = None
+    _worker_port: str | None = None
 
     def setup_client(self):
         self._client = UC2Client(
@@ -27,16 +44,31 @@ class SerialUC2Manager(BaseManager):
             DEBUG=True,
         )
 
+    @property
+    def worker(self) -> SerialWorker:
+        if self._worker is None:
+            raise RuntimeError("The manager needs to be entered before it is used")
+        return self._worker
+
     async def __aenter__(self):
-        print("Entering")
-        await asyncio.to_thread(self.setup_client)
-        print("Entered")
+        self._worker_port = self.serialport
+        self._worker = acquire_port_worker(self._worker_port)
+        try:
+            await self._worker.call(self.setup_client)
+        except BaseException:
+            await self._release_worker()
+            raise
+
+    async def _release_worker(self):
+        self._worker = None
+        await release_port_worker(self._worker_port)
+        self._worker_port = None
 
     async def compute_event(
         self, event: MoveXEvent | MoveYEvent | MoveZEvent | SetLightIntensityEvent
     ):
         if isinstance(event, MoveXEvent):
-            await asyncio.to_thread(
+            await self.worker.call(
                 self._client.motor.move_x,
                 steps=event.step,
                 speed=event.speed,
@@ -46,7 +78,7 @@ class SerialUC2Manager(BaseManager):
             )
             yield FinishedEvent(device=self.device)
         if isinstance(event, MoveYEvent):
-            await asyncio.to_thread(
+            await self.worker.call(
                 self._client.motor.move_y,
                 steps=event.step,
                 speed=event.speed,
@@ -57,7 +89,7 @@ class SerialUC2Manager(BaseManager):
             yield FinishedEvent(device=self.device)
 
         if isinstance(event, MoveZEvent):
-            await asyncio.to_thread(
+            await self.worker.call(
                 self._client.motor.move_z,
                 steps=event.step,
                 speed=event.speed,
@@ -68,14 +100,24 @@ class SerialUC2Manager(BaseManager):
             yield FinishedEvent(device=self.device)
 
         if isinstance(event, SetLightIntensityEvent):
-            await asyncio.to_thread(
-                self._client.laser.set_laser,
-                channel=1,
-                value=event.intensity,
-                is_blocking=True,
-            )
+            if self.pipeline_commands:
+                self.worker.send(
+                    self._client.laser.set_laser,
+                    channel=1,
+                    value=event.intensity,
+                    is_blocking=False,
+                )
+            else:
+                await self.worker.call(
+                    self._client.laser.set_laser,
+                    channel=1,
+                    value=event.intensity,
+                    is_blocking=True,
+                )
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
-        print("Exiting")
-        await asyncio.to_thread(self._client.close)
-        print("Exited")
+        try:
+            await self.worker.drain()
+            await self.worker.call(self._client.close)
+        finally:
+            await self._release_worker()
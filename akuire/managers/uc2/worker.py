@@ -0,0 +1,157 @@
+import asyncio
+import queue
+import threading
+from typing import Any, Callable
+
+
+def _resolve(worker: "SerialWorker", future: asyncio.Future, result, exception):
+    worker.completed += 1
+    if future.done():
+        # The caller stopped waiting (e.g. it was cancelled)
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+class SerialWorker:
+    """A dedicated I/O thread that executes the commands for a serial port
+
+    Commands are queued and executed one after another on the thread, so they
+    never interleave on the port, and the event loop awaits their results through
+    futures. Unlike asyncio.to_thread, the commands do not compete with everything
+    else for the default executor, keeping the command latency predictable.
+
+    Commands that don't need to be waited for can be pipelined with `send`: they are
+    queued behind the previous commands, and their failure is raised by the next
+    `call` (or `drain`).
+
+    The depth of the queue (queued and running commands) is tracked in `depth`,
+    and its high-water mark in `max_depth`.
+
+    Args:
+        name (str, optional): The name of the thread. Defaults to "serial-io".
+    """
+
+    def __init__(self, name: str = "serial-io"):
+        self.name = name
+        self.submitted = 0
+        self.completed = 0
+        self.max_depth = 0
+        self._commands: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._pipelined: set[asyncio.Future] = set()
+
+    @property
+    def depth(self) -> int:
+        """The number of commands that were submitted but have not completed yet"""
+        return self.submitted - self.completed
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            command = self._commands.get()
+            if command is None:
+                return
+
+            loop, future, func, args, kwargs = command
+            result, exception = None, None
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                exception = e
+
+            loop.call_soon_threadsafe(_resolve, self, future, result, exception)
+
+    def submit(self, func: Callable, *args, **kwargs) -> asyncio.Future:
+        """Queue the command, returning a future for its result"""
+        if self._thread is None:
+            raise RuntimeError(f"The serial worker {self.name} is not running")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        self._commands.put((loop, future, func, args, kwargs))
+        return future
+
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Execute the command on the I/O thread and wait for its result"""
+        self.raise_failure()
+        return await self.submit(func, *args, **kwargs)
+
+    def send(self, func: Callable, *args, **kwargs) -> None:
+        """Queue the command without waiting for it"""
+        self.raise_failure()
+        self._pipelined.add(self.submit(func, *args, **kwargs))
+
+    def raise_failure(self):
+        """Raise the first failure of the pipelined commands that completed, if there was one"""
+        failure = None
+        for future in [future for future in self._pipelined if future.done()]:
+            self._pipelined.discard(future)
+            if not future.cancelled() and future.exception() is not None:
+                failure = failure or future.exception()
+
+        if failure is not None:
+            raise failure
+
+    async def drain(self):
+        """Wait until every pipelined command has completed"""
+        if self._pipelined:
+            await asyncio.wait(list(self._pipelined))
+        self.raise_failure()
+
+    async def stop(self):
+        """Complete the queued commands and stop the thread"""
+        if self._thread is None:
+            return
+
+        try:
+            await self.drain()
+        finally:
+            self._commands.put(None)
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+
+_port_workers: dict[str, SerialWorker] = {}
+_port_users: dict[str, int] = {}
+
+
+def acquire_port_worker(port: str) -> SerialWorker:
+    """Get the worker of the serial port, starting it for its first user
+
+    Managers that talk to the same port share its worker, so their commands
+    never interleave on the port either.
+    """
+    worker = _port_workers.get(port)
+    if worker is None:
+        worker = SerialWorker(name=f"serial-io {port}")
+        worker.start()
+        _port_workers[port] = worker
+        _port_users[port] = 0
+
+    _port_users[port] += 1
+    return worker
+
+
+async def release_port_worker(port: str):
+    """Release the worker of the serial port, stopping it once its last user released it"""
+    _port_users[port] -= 1
+    if _port_users[port] > 0:
+        return
+
+    # Unregistered before it is stopped, so a new user starts a fresh worker
+    worker = _port_workers.pop(port)
+    del _port_users[port]
+    await worker.stop()
@@ -0,0 +1,150 @@
+"""Synthetic phantoms for the virtual microscopes
+
+Drawing the branching tree phantom (and convolving it) is expensive, so phantoms
+are cached process-wide per size, and can optionally be persisted as .npy files
+that are memory-mapped on the next start. Cached phantoms are shared between
+managers and therefore read-only.
+"""
+
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from scipy.signal import convolve2d
+
+# Use the line function from skimage
+from skimage.draw import line
+
+PHANTOM_CACHE_DIR = os.environ.get("AKUIRE_PHANTOM_CACHE")
+"""Directory to persist phantoms to, if set (e.g. through the AKUIRE_PHANTOM_CACHE environment variable)"""
+
+_phantoms: dict[tuple, np.ndarray] = {}
+_phantoms_lock = threading.Lock()
+
+
+def createBranchingTree(width=5000, height=5000, lineWidth=3):
+    # A local random state keeps the phantom reproducible without reseeding the global one
+    random = np.random.RandomState(0)
+
+    # Create a blank white image
+    image = np.ones((height, width), dtype=np.uint8) * 255
+
+    # Function to draw a line (blood vessel) on the image
+    def draw_vessel(start, end, image):
+        rr, cc = line(start[0], start[1], end[0], end[1])
+        try:
+            image[rr, cc] = 0  # Draw a black line
+        except:
+            end = 0
+            return
+
+    # Recursive function to draw a tree-like structure
+    def draw_tree(start, angle, length, depth, image, reducer, max_angle=40):
+        if depth == 0:
+            return
+
+        # Calculate the end point of the branch
+        end = (
+            int(start[0] + length * np.sin(np.radians(angle))),
+            int(start[1] + length * np.cos(np.radians(angle))),
+        )
+
+        # Draw the branch
+        draw_vessel(start, end, image)
+
+        # change the angle slightly to add some randomness
+        angle += random.uniform(-10, 10)
+
+        # Recursively draw the next level of branches
+        new_length = length * reducer  # Reduce the length for the next level
+        new_depth = depth - 1
+        draw_tree(
+            end,
+            angle - max_angle * random.uniform(-1, 1),
+            new_length,
+            new_depth,
+            image,
+            reducer,
+        )
+        draw_tree(
+            end,
+            angle + max_angle * random.uniform(-1, 1),
+            new_length,
+            new_depth,
+            image,
+            reducer,
+        )
+
+    # Starting point and parameters
+    start_point = (height - 1, width // 2)
+    initial_angle = -90  # Start by pointing upwards
+    initial_length = np.max((width, height)) * 0.15  # Length of the first branch
+    depth = 7  # Number of branching levels
+    reducer = 0.9
+    # Draw the tree structure
+    draw_tree(start_point, initial_angle, initial_length, depth, image, reducer)
+
+    # convolve image with rectangle
+    rectangle = np.ones((lineWidth, lineWidth))
+    image = convolve2d(image, rectangle, mode="same", boundary="fill", fillvalue=0)
+
+    return image
+
+
+def get_phantom(
+    width: int = 5000,
+    height: int = 5000,
+    lineWidth: int = 3,
+    normalized: bool = False,
+    cache_dir: str | Path | None = None,
+) -> np.ndarray:
+    """Get the (read-only) branching tree phantom of the given size
+
+    The phantom is only drawn once per process and size. If a cache directory
+    is given (or configured through PHANTOM_CACHE_DIR), it is also persisted as
+    an .npy file and memory-mapped, so following processes do not need to draw it.
+
+    Args:
+        width (int, optional): The width of the phantom. Defaults to 5000.
+        height (int, optional): The height of the phantom. Defaults to 5000.
+        lineWidth (int, optional): The width of the vessels. Defaults to 3.
+        normalized (bool, optional): Scale the phantom to a maximum of 1. Defaults to False.
+        cache_dir (str | Path, optional): Directory to persist the phantom to. Defaults to PHANTOM_CACHE_DIR.
+
+    Returns:
+        np.ndarray: The read-only phantom of shape (height, width).
+    """
+    key = (width, height, lineWidth, normalized)
+
+    with _phantoms_lock:
+        phantom = _phantoms.get(key)
+        if phantom is not None:
+            return phantom
+
+        cache_dir = cache_dir or PHANTOM_CACHE_DIR
+        path = None
+        if cache_dir is not None:
+            suffix = "_normalized" if normalized else ""
+            path = (
+                Path(cache_dir)
+                / f"branching_tree_{width}x{height}_{lineWidth}{suffix}.npy"
+            )
+
+        if path is not None and path.exists():
+            phantom = np.load(path, mmap_mode="r")
+        else:
+            phantom = createBranchingTree(
+                width=width, height=height, lineWidth=lineWidth
+            )
+            if normalized:
+                phantom /= np.max(phantom)
+
+            if path is not None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                np.save(path, phantom)
+                phantom = np.load(path, mmap_mode="r")
+
+        phantom.setflags(write=False)
+        _phantoms[key] = phantom
+        return phantom
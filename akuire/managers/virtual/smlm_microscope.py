@@ -1,15 +1,13 @@
 import asyncio
 import dataclasses
+from collections import OrderedDict
+from contextlib import aclosing
 from typing import AsyncGenerator
 
 import cv2
 import matplotlib.pyplot as plt
 import NanoImagingPack as nip
 import numpy as np
-from scipy.signal import convolve2d
-
-# Use the line function from skimage
-from skimage.draw import line
 
 from akuire.assets.utils import get_absolute_path
 from akuire.events import (
@@ -24,6 +22,9 @@ from akuire.events import (
 )
 from akuire.events.manager_event import AcquireTSeriesEvent, MoveZEvent
 from akuire.managers.base import Manager
+from akuire.managers.offload import ProcessOffloadMixin
+from akuire.managers.virtual.phantom import get_phantom
+from akuire.managers.virtual.rendering import render_emitters
 
 try:
     import NanoImagingPack as nip
@@ -108,10 +109,11 @@ class Position:
 
 
 @dataclasses.dataclass
-class SMLMMicroscope(BaseManager):
+class SMLMMicroscope(ProcessOffloadMixin, BaseManager):
     """A virtual SMLM microscope.
 
     This class simulates a virtual SMLM microscope. It generates images based on the current settings.
+    Set offload_workers to synthesize the frames in worker processes (see ProcessOffloadMixin).
 
 
     """
@@ -138,9 +140,49 @@ class SMLMMicroscope(BaseManager):
     intensity_std_dev: float = 0.01
     dz: float = 0
     image: np.ndarray = dataclasses.field(
-        default_factory=lambda: createBranchingTree(width=512, height=512)
+        # The field of view is cropped from a big tree, as it always was
+        default_factory=lambda: get_phantom(width=5000, height=5000)
+    )
+    max_cached_positions: int = 64
+    """The number of stage positions to keep the candidate emitter locations for."""
+    _candidate_locs: OrderedDict = dataclasses.field(
+        default_factory=OrderedDict, init=False, repr=False, compare=False
     )
 
+    def candidate_locations(
+        self, x_offset: int = 0, y_offset: int = 0
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Get the locations of all potential emitters within the field of view
+
+        The locations only depend on the phantom and the stage position, so they
+        are computed once per position and cached, leaving only the random subsample
+        to be drawn per frame.
+
+        Args:
+            x_offset (int, optional): The x offset of the stage. Defaults to 0.
+            y_offset (int, optional): The y offset of the stage. Defaults to 0.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The row and column coordinates of the emitters.
+        """
+        key = (id(self.image), int(x_offset), int(y_offset))
+        locs = self._candidate_locs.get(key)
+        if locs is not None:
+            self._candidate_locs.move_to_end(key)
+            return locs
+
+        # Adjust image based on offsets
+        image = np.roll(
+            np.roll(self.image, int(x_offset), axis=1), int(y_offset), axis=0
+        )
+        image = nip.extract(image, (self.sensor_width, self.sensor_height))
+        locs = np.nonzero(np.asarray(image) == 1)
+
+        self._candidate_locs[key] = locs
+        while len(self._candidate_locs) > self.max_cached_positions:
+            self._candidate_locs.popitem(last=False)
+        return locs
+
     def produce_smlm_frame(
         self,
         x_offset: int = 0,
@@ -149,13 +191,8 @@ class SMLMMicroscope(BaseManager):
         n_photons_std: int = 50,
     ):
         """Generate a frame based on the current settings."""
-        # add moise
-        image = self.image.copy()
-        # Adjust image based on offsets
-        image = np.roll(np.roll(image, int(x_offset), axis=1), int(y_offset), axis=0)
-        image = nip.extract(image, (self.sensor_width, self.sensor_height))
-
-        yc_array, xc_array = self.binary2locs(image, density=self.density)
+        all_locs = self.candidate_locations(x_offset, y_offset)
+        yc_array, xc_array = self.subsample_locs(all_locs, density=self.density)
         photon_array = np.random.normal(n_photons, n_photons_std, size=len(xc_array))
 
         wavelenght = self.wave_length
@@ -173,7 +210,7 @@ class SMLMMicroscope(BaseManager):
         readout_noise = self.readout_noise  # change to get it from microscope settings
         ADC_offset = self.ADC_offset  # change to get it from microscope settings
 
-        out = FromLoc2Image_MultiThreaded(
+        out = render_emitters(
             xc_array,
             yc_array,
             photon_array,
@@ -198,21 +235,56 @@ class SMLMMicroscope(BaseManager):
         Returns:
             tuple: A tuple containing two numpy arrays representing the x and y coordinates of the subset of locations.
         """
-        all_locs = np.nonzero(img == 1)
+        return self.subsample_locs(np.nonzero(img == 1), density)
+
+    def subsample_locs(self, all_locs: tuple[np.ndarray, np.ndarray], density: float):
+        """
+        Given the locations `all_locs` of all potential emitters and a `density` value, this function returns a random subset of them.
+        Parameters:
+            all_locs (tuple): A tuple of numpy arrays with the coordinates of the potential emitters.
+            density (float): The density of the subset of locations to be returned.
+        Returns:
+            tuple: A tuple containing two numpy arrays representing the x and y coordinates of the subset of locations.
+        """
         n_points = int(len(all_locs[0]) * density)
         selected_idx = np.random.choice(len(all_locs[0]), n_points, replace=False)
         filtered_locs = all_locs[0][selected_idx], all_locs[1][selected_idx]
         return filtered_locs
 
-    async def get_last(self) -> np.ndarray:
-        return await asyncio.to_thread(
-            self.produce_smlm_frame,
+    def frame_spec(self) -> tuple[tuple[int, ...], np.dtype]:
+        return (self.sensor_height, self.sensor_width), np.dtype(np.float64)
+
+    def frame_arguments(self) -> dict:
+        """The arguments of produce_smlm_frame for the current settings"""
+        return dict(
             x_offset=self.position.x,
             y_offset=self.position.y,
             n_photons=self.intensity,
             n_photons_std=self.intensity * self.intensity_std_dev,
         )
 
+    async def get_last(self) -> np.ndarray:
+        slot = await self.offload_frame("produce_smlm_frame", **self.frame_arguments())
+        if slot.buffer is None:
+            return slot.data
+        data = slot.data.copy()
+        slot.release()
+        return data
+
+    async def stream_frames(self, n: int) -> AsyncGenerator[ImageDataEvent, None]:
+        """Synthesize n frames at the current settings, prefetching them"""
+        calls = (self.frame_arguments() for _ in range(n))
+        async with aclosing(self.offload_frames("produce_smlm_frame", calls)) as slots:
+            async for slot in slots:
+                yield ImageDataEvent(data=slot.data, slot=slot, device=self.device)
+
+    async def __aenter__(self) -> "SMLMMicroscope":
+        self.start_offload()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop_offload()
+
     async def compute_event(
         self,
         event: (
@@ -225,27 +297,27 @@ class SMLMMicroscope(BaseManager):
         ),
     ) -> AsyncGenerator[DataEvent, None]:
         if isinstance(event, AcquireFrameEvent):
-            print("Acquiring frame")
-            yield ImageDataEvent(data=await self.get_last(), device=self.device)
+            slot = await self.offload_frame(
+                "produce_smlm_frame", **self.frame_arguments()
+            )
+            yield ImageDataEvent(data=slot.data, slot=slot, device=self.device)
 
         if isinstance(event, SetLightIntensityEvent):
-            print("Setting light intensity")
             self.intensity = event.intensity
 
         if isinstance(event, AcquireTSeriesEvent):
-            print("Acquiring Z-stack")
-            for z in range(event.t_steps):
-                yield ImageDataEvent(data=await self.get_last(), device=self.device)
+            async with aclosing(self.stream_frames(int(event.t_steps))) as frames:
+                async for frame in frames:
+                    yield frame
 
         if isinstance(event, AcquireZStackEvent):
-            print("Acquiring Z-stack")
-            z_stack = []
-            for z in event.z_steps:
-                self.position.z = z
-                yield ImageDataEvent(data=await self.get_last(), device=self.device)
+            # The frames do not depend on z, so the stack is prefetched like a series
+            async with aclosing(self.stream_frames(event.z_steps)) as frames:
+                async for frame in frames:
+                    yield frame
+            self.position.z = (event.z_steps - 1) * event.z_step
 
         if isinstance(event, MoveEvent):
-            print("Moving")
             if event.x:
                 self.position.x = event.x
             if event.y:
@@ -267,7 +339,8 @@ class Camera:
     sensor_width: int = 512
     pixel_size: float = 1.0
     image: np.ndarray = dataclasses.field(
-        default_factory=lambda: createBranchingTree(width=512, height=512)
+        # The field of view is cropped from a big tree, as it always was
+        default_factory=lambda: get_phantom(width=5000, height=5000)
     )
 
     def __post_init__(self):
@@ -278,72 +351,3 @@ class Camera:
     def setPropertyValue(self, propertyName, propertyValue):
         pass
 
-
-def createBranchingTree(width=5000, height=5000, lineWidth=3):
-    np.random.seed(0)  # Set a random seed for reproducibility
-    # Define the dimensions of the image
-    width, height = 5000, 5000
-
-    # Create a blank white image
-    image = np.ones((height, width), dtype=np.uint8) * 255
-
-    # Function to draw a line (blood vessel) on the image
-    def draw_vessel(start, end, image):
-        rr, cc = line(start[0], start[1], end[0], end[1])
-        try:
-            image[rr, cc] = 0  # Draw a black line
-        except:
-            end = 0
-            return
-
-    # Recursive function to draw a tree-like structure
-    def draw_tree(start, angle, length, depth, image, reducer, max_angle=40):
-        if depth == 0:
-            return
-
-        # Calculate the end point of the branch
-        end = (
-            int(start[0] + length * np.sin(np.radians(angle))),
-            int(start[1] + length * np.cos(np.radians(angle))),
-        )
-
-        # Draw the branch
-        draw_vessel(start, end, image)
-
-        # change the angle slightly to add some randomness
-        angle += np.random.uniform(-10, 10)
-
-        # Recursively draw the next level of branches
-        new_length = length * reducer  # Reduce the length for the next level
-        new_depth = depth - 1
-        draw_tree(
-            end,
-            angle - max_angle * np.random.uniform(-1, 1),
-            new_length,
-            new_depth,
-            image,
-            reducer,
-        )
-        draw_tree(
-            end,
-            angle + max_angle * np.random.uniform(-1, 1),
-            new_length,
-            new_depth,
-            image,
-            reducer,
-        )
-
-    # Starting point and parameters
-    start_point = (height - 1, width // 2)
-    initial_angle = -90  # Start by pointing upwards
-    initial_length = np.max((width, height)) * 0.15  # Length of the first branch
-    depth = 7  # Number of branching levels
-    reducer = 0.9
-    # Draw the tree structure
-    draw_tree(start_point, initial_angle, initial_length, depth, image, reducer)
-
-    # convolve image with rectangle
-    rectangle = np.ones((lineWidth, lineWidth))
-    image = convolve2d(image, rectangle, mode="same", boundary="fill", fillvalue=0)
-
-    return image
@@ -1,15 +1,14 @@
 import asyncio
 import dataclasses
-from typing import AsyncGenerator
+import threading
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncGenerator, Iterable
 
 import cv2
 import matplotlib.pyplot as plt
 import NanoImagingPack as nip
 import numpy as np
-from scipy.signal import convolve2d
-
-# Use the line function from skimage
-from skimage.draw import line
 
 from akuire.assets.utils import get_absolute_path
 from akuire.events import (
@@ -24,6 +23,8 @@ from akuire.events import (
     ZChangeEvent,
 )
 from akuire.managers.base import BaseManager, Manager
+from akuire.managers.offload import ProcessOffloadMixin
+from akuire.managers.virtual.phantom import get_phantom
 
 IS_NIP = True
 
@@ -31,36 +32,100 @@ IS_NIP = True
 FILE_PATH = get_absolute_path("big.jpg")
 
 
-class VirtualMicroscopeManager(BaseManager):
+class VirtualMicroscopeManager(ProcessOffloadMixin, BaseManager):
+    """A virtual widefield microscope
+
+    Set offload_workers to synthesize the frames in worker processes, so several
+    virtual microscopes in one engine run on their own cores (see ProcessOffloadMixin).
+    Without workers, the frames are synthesized in threads, which share the PSF bank
+    and frame buffer with the event loop under a lock.
+    """
 
-    def __init__(self, filePath=FILE_PATH):
+    def __init__(
+        self,
+        filePath=FILE_PATH,
+        psf_z_range: Iterable[float] | None = None,
+        offload_workers: int = 0,
+        prefetch_depth: int = 2,
+        offload_buffer_size: int = 16,
+    ):
         self.camera = Camera(self, filePath)
         self.positioner = Positioner(self)
         self.illuminator = Illuminator(self)
+        self.psf_z_range = psf_z_range
+        self.offload_workers = offload_workers
+        self.prefetch_depth = prefetch_depth
+        self.offload_buffer_size = offload_buffer_size
+
+    async def __aenter__(self):
+        if IS_NIP and self.psf_z_range is not None:
+            # fill the PSF bank upfront, so z-stacks never wait for a PSF
+            await asyncio.to_thread(
+                self.positioner.psf_bank.precompute, self.psf_z_range
+            )
+        # the workers start with a copy of the (filled) PSF bank
+        self.start_offload()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop_offload()
+
+    def frame_spec(self) -> tuple[tuple[int, ...], np.dtype]:
+        return (1, 1, 1, self.camera.SensorHeight, self.camera.SensorWidth), np.dtype(
+            np.uint16
+        )
+
+    def frame_arguments(self, z: float | None = None) -> dict:
+        """The arguments of render_frame for the current settings, optionally at another z"""
+        position = self.positioner.get_position()
+        return dict(
+            x_offset=position["X"],
+            y_offset=position["Y"],
+            light_intensity=self.illuminator.get_intensity(1),
+            z=position["Z"] if z is None else z,
+        )
+
+    def render_frame(
+        self, x_offset: float, y_offset: float, light_intensity: float, z: float
+    ) -> np.ndarray:
+        """Synthesize a frame, independent of the state of the positioner"""
+        entry = self.positioner.psf_bank.get(z) if IS_NIP else None
+        return self.camera.produce_frame(
+            x_offset=x_offset,
+            y_offset=y_offset,
+            light_intensity=light_intensity,
+            defocusOTF=entry[1] if entry is not None else None,
+        )
 
     async def compute_event(
         self, event: AcquireFrameEvent | ZChangeEvent
     ) -> AsyncGenerator[DataEvent, None]:
 
         if isinstance(event, AcquireFrameEvent):
-            print("Acquiring frame")
-            yield ImageDataEvent(data=self.camera.getLast(), device=self.device)
+            slot = await self.offload_frame("render_frame", **self.frame_arguments())
+            yield ImageDataEvent(data=slot.data, slot=slot, device=self.device)
 
         if isinstance(event, SetLightIntensityEvent):
-            print("Setting light intensity")
             self.illuminator.set_intensity(event.intensity)
 
+        if isinstance(event, AcquireTSeriesEvent):
+            calls = (self.frame_arguments() for _ in range(int(event.t_steps)))
+            async with aclosing(self.offload_frames("render_frame", calls)) as slots:
+                async for slot in slots:
+                    yield ImageDataEvent(data=slot.data, slot=slot, device=self.device)
+
         if isinstance(event, AcquireZStackEvent):
-            print("Acquiring Z-stack")
-            z_stack = []
-            for z in event.z_values:
-                self.positioner.move(z=z)
-                z_stack.append(self.camera.getLast())
-            yield ImageDataEvent(data=z_stack, device=self.device)
+            # One event per plane, as AcquireZStackEvent.expected_frames promises
+            z_values = [i * event.z_step for i in range(event.z_steps)]
+            calls = (self.frame_arguments(z=z) for z in z_values)
+            async with aclosing(self.offload_frames("render_frame", calls)) as slots:
+                async for slot in slots:
+                    yield ImageDataEvent(data=slot.data, slot=slot, device=self.device)
+            if z_values:
+                self.positioner.move(z=z_values[-1])
 
         if isinstance(event, MoveEvent):
-            print("Moving")
-            self.positioner.move(x=event.x, y=event.y, z=event.z, device=self.device)
+            self.positioner.move(x=event.x, y=event.y, z=event.z)
 
     def challenge(self, event: ManagerEvent) -> bool:
         return isinstance(
@@ -75,15 +140,27 @@ class VirtualMicroscopeManager(BaseManager):
         )
 
 
+def _window_indices(size: int, window: int, offset: int) -> slice | np.ndarray:
+    """The indices of the centred window of an axis that was rolled by offset
+
+    Returns a slice if the window does not wrap around the border of the axis.
+    """
+    start = (size // 2 - window // 2 - offset) % size
+    if start + window <= size:
+        return slice(start, start + window)
+    return np.arange(start, start + window) % size
+
+
 class Camera:
     def __init__(self, parent, filePath="simplant"):
         self._parent = parent
         if filePath == "simplant":
-            self.image = createBranchingTree(width=5000, height=5000)
+            # The phantom is shared between cameras, so it is normalized once when cached
+            self.image = get_phantom(width=5000, height=5000, normalized=True)
         else:
             self.image = np.mean(cv2.imread(filePath), axis=2)
+            self.image /= np.max(self.image)
 
-        self.image /= np.max(self.image)
         self.SensorWidth = 512  # self.image.shape[1]
         self.SensorHeight = 512  # self.image.shape[0]
         self.model = "VirtualCamera"
@@ -92,36 +169,85 @@ class Camera:
         self.frameNumber = 0
         # precompute noise so that we will save energy and trees
         self.noiseStack = np.random.randn(self.SensorHeight, self.SensorWidth, 100) * 2
+        # reusable buffer the frames are synthesized in, by one thread at a time
+        self._frame: np.ndarray | None = None
+        self._frame_lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_frame_lock"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._frame_lock = threading.Lock()
+
+    def window(self, x_offset=0, y_offset=0) -> np.ndarray:
+        """Get the sensor sized region of the image that is visible at the given offset
+
+        Equivalent to rolling the image by the offsets and extracting the centre
+        (as nip.extract does), but only reads the visible region. The image wraps
+        around its borders.
+        """
+        rows = _window_indices(self.image.shape[0], self.SensorHeight, int(y_offset))
+        columns = _window_indices(self.image.shape[1], self.SensorWidth, int(x_offset))
+
+        if isinstance(rows, slice) and isinstance(columns, slice):
+            return self.image[rows, columns]
+        if isinstance(rows, slice):
+            return self.image[rows][:, columns]
+        if isinstance(columns, slice):
+            return self.image[:, columns][rows]
+        return self.image[np.ix_(rows, columns)]
 
     def produce_frame(
-        self, x_offset=0, y_offset=0, light_intensity=1.0, defocusPSF=None
+        self,
+        x_offset=0,
+        y_offset=0,
+        light_intensity=1.0,
+        defocusPSF=None,
+        defocusOTF=None,
     ):
-        """Generate a frame based on the current settings."""
-        # add moise
-        image = self.image.copy()
-        # Adjust image based on offsets
-        image = np.roll(np.roll(image, int(x_offset), axis=1), int(y_offset), axis=0)
-        image = nip.extract(image, (self.SensorWidth, self.SensorHeight))
+        """Generate a frame based on the current settings.
+
+        The defocus is either applied by convolving with defocusPSF, or, much
+        cheaper, by multiplying with a precomputed defocusOTF (see PSFBank).
+        """
+        with self._frame_lock:
+            return self._produce_frame(
+                x_offset, y_offset, light_intensity, defocusPSF, defocusOTF
+            )
+
+    def _produce_frame(
+        self, x_offset, y_offset, light_intensity, defocusPSF, defocusOTF
+    ):
+        if self._frame is None:
+            self._frame = np.empty((self.SensorHeight, self.SensorWidth), np.float32)
+        image = self._frame
 
         # do all post-processing on cropped image
-        if IS_NIP and defocusPSF is not None and not defocusPSF.shape == ():
-            print("Defocus:" + str(defocusPSF.shape))
-            image = np.array(np.real(nip.convolve(image, defocusPSF)))
-        image = np.float32(image) / np.max(image) * np.float32(light_intensity)
+        if defocusOTF is not None:
+            image[...] = PSFBank.convolve(self.window(x_offset, y_offset), defocusOTF)
+        elif IS_NIP and defocusPSF is not None and not defocusPSF.shape == ():
+            image[...] = np.real(
+                nip.convolve(self.window(x_offset, y_offset), defocusPSF)
+            )
+        else:
+            np.copyto(image, self.window(x_offset, y_offset))
+
+        maximum = np.max(image)
+        image *= np.float32(light_intensity) / maximum if maximum > 0 else 0
+        # add noise
         image += self.noiseStack[:, :, np.random.randint(0, 100)]
 
         # Adjust illumination
-        image = image.astype(np.uint16)
-        print(image.shape)
-        reshaped = np.array(image).reshape(
-            (1, 1, 1, self.SensorHeight, self.SensorWidth)
-        )
-        print(reshaped.shape)
+        frame = image.astype(np.uint16)
+        reshaped = frame.reshape((1, 1, 1, self.SensorHeight, self.SensorWidth))
         return reshaped
 
     def getLast(self, returnFrameNumber=False):
         position = self._parent.positioner.get_position()
-        defocusPSF = np.squeeze(self._parent.positioner.get_psf())
+        defocusOTF = self._parent.positioner.get_otf()
         intensity = self._parent.illuminator.get_intensity(1)
         self.frameNumber += 1
         if returnFrameNumber:
@@ -130,7 +256,7 @@ class Camera:
                     x_offset=position["X"],
                     y_offset=position["Y"],
                     light_intensity=intensity,
-                    defocusPSF=defocusPSF,
+                    defocusOTF=defocusOTF,
                 ),
                 self.frameNumber,
             )
@@ -139,13 +265,106 @@ class Camera:
                 x_offset=position["X"],
                 y_offset=position["Y"],
                 light_intensity=intensity,
-                defocusPSF=defocusPSF,
+                defocusOTF=defocusOTF,
             )
 
     def setPropertyValue(self, propertyName, propertyValue):
         pass
 
 
+class PSFBank:
+    """A bounded LRU bank of defocus PSFs
+
+    Computing a PSF with NanoImagingPack is expensive, while z-stacks revisit the
+    same few z positions over and over. The bank computes the PSF once per
+    quantized defocus and keeps the real FFT of it (the OTF), so applying the
+    defocus to a frame is a single multiplication in Fourier space.
+
+    The bank is used from the event loop (when the stage moves) and from the
+    threads frames are synthesized in, so its lookups are serialized by a lock.
+
+    Args:
+        shape (tuple[int, int]): The shape of the frames the PSFs are applied to.
+        maxsize (int, optional): The number of PSFs to keep. Defaults to 64.
+        dz_step (float, optional): The step the defocus is quantized to. Defaults to 0.1.
+        pixelsize (tuple[float, float], optional): The pixel size of the PSF. Defaults to (100.0, 100.0).
+    """
+
+    def __init__(
+        self,
+        shape: tuple[int, int],
+        maxsize: int = 64,
+        dz_step: float = 0.1,
+        pixelsize: tuple[float, float] = (100.0, 100.0),
+    ):
+        self.shape = tuple(shape)
+        self.maxsize = maxsize
+        self.dz_step = dz_step
+        self.pixelsize = pixelsize
+        self.hits = 0
+        self.misses = 0
+        self._psfs: OrderedDict[int, tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def key(self, dz: float) -> int:
+        """The quantized defocus the PSF is cached under"""
+        return int(round(float(dz) / self.dz_step))
+
+    def compute_psf(self, dz: float) -> np.ndarray:
+        obj = nip.image(np.zeros(self.shape))
+        obj.pixelsize = self.pixelsize
+        paraAbber = nip.PSF_PARAMS()
+        # aber_map = nip.xx(obj.shape[-2:]).normalize(1)
+        paraAbber.aberration_types = [paraAbber.aberration_zernikes.spheric]
+        paraAbber.aberration_strength = [np.float32(dz) / 10]
+        return np.squeeze(np.asarray(nip.psf(obj, paraAbber)))
+
+    def get(self, dz: float) -> tuple[np.ndarray, np.ndarray] | None:
+        """Get the PSF and OTF for the defocus, or None if there is no defocus"""
+        key = self.key(dz)
+        if key == 0:
+            return None
+
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key: int) -> tuple[np.ndarray, np.ndarray]:
+        entry = self._psfs.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._psfs.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        psf = self.compute_psf(np.float32(key * self.dz_step))
+        otf = np.fft.rfft2(np.fft.ifftshift(psf))
+        entry = (psf, otf)
+
+        self._psfs[key] = entry
+        while len(self._psfs) > self.maxsize:
+            self._psfs.popitem(last=False)
+        return entry
+
+    def precompute(self, z_values: Iterable[float]):
+        """Compute the PSFs for all z values upfront"""
+        for z in z_values:
+            self.get(z)
+
+    @staticmethod
+    def convolve(image: np.ndarray, otf: np.ndarray) -> np.ndarray:
+        """Convolve the image with the PSF of the OTF (like nip.convolve)"""
+        return np.fft.irfft2(np.fft.rfft2(image) * otf, s=image.shape)
+
+
 class Positioner:
     def __init__(self, parent):
         self._parent = parent
@@ -154,10 +373,13 @@ class Positioner:
             self._parent.camera.SensorWidth,
             self._parent.camera.SensorHeight,
         )
+        self.psf_bank = PSFBank(
+            (self._parent.camera.SensorHeight, self._parent.camera.SensorWidth)
+        )
+        self.psf = None
+        self.otf = None
         if IS_NIP:
-            self.psf = self.compute_psf(dz=0)
-        else:
-            self.psf = None
+            self.compute_psf(dz=0)
 
     def move(self, x=None, y=None, z=None, a=None, is_absolute=True):
         if is_absolute:
@@ -186,24 +408,18 @@ class Positioner:
 
     def compute_psf(self, dz):
         dz = np.float32(dz)
-        print("Defocus:" + str(dz))
-        if IS_NIP and dz != 0:
-            obj = nip.image(np.zeros(self.mDimensions))
-            obj.pixelsize = (100.0, 100.0)
-            paraAbber = nip.PSF_PARAMS()
-            # aber_map = nip.xx(obj.shape[-2:]).normalize(1)
-            paraAbber.aberration_types = [paraAbber.aberration_zernikes.spheric]
-            paraAbber.aberration_strength = [np.float32(dz) / 10]
-            psf = nip.psf(obj, paraAbber)
-            self.psf = psf.copy()
-            del psf
-            del obj
+        entry = self.psf_bank.get(dz) if IS_NIP else None
+        if entry is not None:
+            self.psf, self.otf = entry
         else:
-            self.psf = None
+            self.psf, self.otf = None, None
 
     def get_psf(self):
         return self.psf
 
+    def get_otf(self):
+        return self.otf
+
 
 class Illuminator:
     def __init__(self, parent):
@@ -216,72 +432,3 @@ class Illuminator:
     def get_intensity(self, channel):
         return self.intensity
 
-
-def createBranchingTree(width=5000, height=5000, lineWidth=3):
-    np.random.seed(0)  # Set a random seed for reproducibility
-    # Define the dimensions of the image
-    width, height = 5000, 5000
-
-    # Create a blank white image
-    image = np.ones((height, width), dtype=np.uint8) * 255
-
-    # Function to draw a line (blood vessel) on the image
-    def draw_vessel(start, end, image):
-        rr, cc = line(start[0], start[1], end[0], end[1])
-        try:
-            image[rr, cc] = 0  # Draw a black line
-        except:
-            end = 0
-            return
-
-    # Recursive function to draw a tree-like structure
-    def draw_tree(start, angle, length, depth, image, reducer, max_angle=40):
-        if depth == 0:
-            return
-
-        # Calculate the end point of the branch
-        end = (
-            int(start[0] + length * np.sin(np.radians(angle))),
-            int(start[1] + length * np.cos(np.radians(angle))),
-        )
-
-        # Draw the branch
-        draw_vessel(start, end, image)
-
-        # change the angle slightly to add some randomness
-        angle += np.random.uniform(-10, 10)
-
-        # Recursively draw the next level of branches
-        new_length = length * reducer  # Reduce the length for the next level
-        new_depth = depth - 1
-        draw_tree(
-            end,
-            angle - max_angle * np.random.uniform(-1, 1),
-            new_length,
-            new_depth,
-            image,
-            reducer,
-        )
-        draw_tree(
-            end,
-            angle + max_angle * np.random.uniform(-1, 1),
-            new_length,
-            new_depth,
-            image,
-            reducer,
-        )
-
-    # Starting point and parameters
-    start_point = (height - 1, width // 2)
-    initial_angle = -90  # Start by pointing upwards
-    initial_length = np.max((width, height)) * 0.15  # Length of the first branch
-    depth = 7  # Number of branching levels
-    reducer = 0.9
-    # Draw the tree structure
-    draw_tree(start_point, initial_angle, initial_length, depth, image, reducer)
-
-    # convolve image with rectangle
-    rectangle = np.ones((lineWidth, lineWidth))
-    image = convolve2d(image, rectangle, mode="same", boundary="fill", fillvalue=0)
-
-    return image
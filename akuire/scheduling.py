@@ -0,0 +1,312 @@
+import asyncio
+import contextvars
+import dataclasses
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Literal
+
+SchedulingPolicy = Literal["priority", "fair_share", "deadline"]
+
+consumed_leases: contextvars.ContextVar[frozenset["Lease"]] = contextvars.ContextVar(
+    "consumed_leases", default=frozenset()
+)
+"""The leases of the acquisition streams that are consumed in the current context
+
+Acquisitions started in this context may borrow their devices (see `Lease.consumes`).
+Helpers that consume streams on other tasks (e.g. `akuire.composition.helpers.amerge`)
+propagate the leases of those streams to their consumer.
+"""
+
+
+priority_lane: contextvars.ContextVar[int | None] = contextvars.ContextVar(
+    "priority_lane", default=None
+)
+"""The minimum priority of the acquisitions started in the current context, if any
+
+Used to run follow up acquisitions (e.g. the interrupter of
+`akuire.composition.helpers.ainterupting`) ahead of the acquisitions they interrupt.
+"""
+
+
+@contextmanager
+def prioritized(priority: int) -> Iterator[None]:
+    """Start the acquisitions of the block with at least the given priority"""
+    token = priority_lane.set(priority)
+    try:
+        yield
+    finally:
+        priority_lane.reset(token)
+
+
+@contextmanager
+def consuming(leases: frozenset["Lease"]) -> Iterator[None]:
+    """Add the leases to the consumed leases of the current context for the block
+
+    Leases are removed by value rather than by resetting the context variable, as
+    the block may span the yields of a generator that is closed elsewhere.
+    """
+    added = leases - consumed_leases.get()
+    consumed_leases.set(consumed_leases.get() | added)
+    try:
+        yield
+    finally:
+        consumed_leases.set(consumed_leases.get() - added)
+
+
+@dataclasses.dataclass(eq=False)
+class Lease:
+    """The claim of an acquisition on the devices of a DeviceScheduler
+
+    An acquisition holds its lease while it runs, and holds the device of the
+    paired event it currently computes through it (see `hold`).
+
+    While the stream of the acquisition is suspended at a yield within a paired
+    event, the acquisitions started by its consumer may borrow the device (see
+    `suspend` and `resume`), as the stream cannot continue before they are done.
+    """
+
+    scheduler: "DeviceScheduler"
+    priority: int = 0
+    """Higher priorities are scheduled first"""
+    deadline: float | None = None
+    """The time.monotonic() by which the acquisition should be done, if any"""
+    sequence: int = 0
+    usage: float = 0
+    """The time (in seconds) the lease held devices, for fair share scheduling"""
+    consumes: frozenset["Lease"] = frozenset()
+    """The leases of the streams whose consumer started the acquisition"""
+
+    @asynccontextmanager
+    async def hold(self, devices: set[str]) -> AsyncIterator[None]:
+        """Hold the devices for the duration of the block"""
+        await self.scheduler.acquire(self, devices)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.usage += time.perf_counter() - start
+            self.scheduler.release(self, devices)
+
+    def suspend(self, devices: set[str]):
+        """Lend the held devices to the acquisitions started by the consumer"""
+        self.scheduler.suspend(self, devices)
+
+    async def resume(self, devices: set[str]):
+        """Wait until the acquisitions that borrowed the devices are done with them"""
+        await self.scheduler.resume(self, devices)
+
+
+@dataclasses.dataclass(eq=False)
+class _Request:
+    lease: Lease
+    devices: frozenset[str]
+    future: asyncio.Future
+
+
+class DeviceScheduler:
+    """Arbitrates the devices between acquisitions that run concurrently on one engine
+
+    Acquisitions hold the device of a paired event while its manager computes it,
+    so a device never computes events of different acquisitions at once, while
+    acquisitions on different devices still run concurrently. Whenever a device
+    is released, it goes to the waiting acquisition that ranks first, preempting
+    the acquisition that used it before. The policy decides the ranking:
+
+    - "priority": the highest priority, then the earliest submitted acquisition
+    - "deadline": the earliest deadline (acquisitions without one go last), then priority
+    - "fair_share": the acquisition that held devices for the shortest time, then priority
+
+    A waiting acquisition is never overtaken on its devices by a lower ranked one,
+    so urgent acquisitions (e.g. follow ups triggered by an analysis) wait for at
+    most the paired event that is computed on their devices.
+
+    Acquisitions started by the consumer (or a hook) of a stream may borrow the
+    devices of the stream while it is suspended at a yield, instead of waiting for
+    the paired event it is suspended in, which could never finish otherwise.
+
+    Args:
+        policy (SchedulingPolicy, optional): The ranking of waiting acquisitions. Defaults to "priority".
+    """
+
+    def __init__(self, policy: SchedulingPolicy = "priority"):
+        self.policy = policy
+        self.grants = 0
+        self.preemptions = 0
+        """The number of times a device went to another acquisition while its previous user waited for it"""
+        self.missed_deadlines = 0
+        """The number of events that were started after the deadline of their acquisition"""
+        self._sequence = itertools.count()
+        self._held: dict[str, list[Lease]] = {}
+        self._last_user: dict[str, Lease] = {}
+        self._waiting: list[_Request] = []
+        self._resuming: list[_Request] = []
+        self._suspended: dict[str, set[Lease]] = {}
+        self._schedule_pending = False
+
+    def open(
+        self,
+        priority: int = 0,
+        deadline: float | None = None,
+        consumes: frozenset[Lease] = frozenset(),
+    ) -> Lease:
+        """Open a lease for an acquisition
+
+        Args:
+            priority (int, optional): The priority of the acquisition. Defaults to 0.
+            deadline (float, optional): The time.monotonic() by which it should be done.
+            consumes (frozenset[Lease], optional): The leases of the streams whose
+                consumer started the acquisition, see `consumed_leases`.
+        """
+        return Lease(
+            scheduler=self,
+            priority=priority,
+            deadline=deadline,
+            sequence=next(self._sequence),
+            consumes=consumes,
+        )
+
+    def _rank(self, lease: Lease) -> tuple:
+        if self.policy == "deadline":
+            deadline = lease.deadline if lease.deadline is not None else math.inf
+            return (deadline, -lease.priority, lease.sequence)
+        if self.policy == "fair_share":
+            return (lease.usage, -lease.priority, lease.sequence)
+        return (-lease.priority, lease.sequence)
+
+    def _is_free(self, device: str, lease: Lease) -> bool:
+        holders = self._held.get(device)
+        if not holders:
+            return True
+        holder = holders[-1]
+        if holder is lease:
+            return True
+        # The consumer of a suspended stream may borrow its device
+        return holder in lease.consumes and holder in self._suspended.get(device, ())
+
+    def _on_top(self, lease: Lease, devices: frozenset[str]) -> bool:
+        return all(self._held[device][-1] is lease for device in devices)
+
+    def _can_grant(
+        self, lease: Lease, devices: frozenset[str], blocked: set[str]
+    ) -> bool:
+        if not all(self._is_free(device, lease) for device in devices):
+            return False
+        # Devices the lease holds already are not contested
+        contested = {device for device in devices if not self._held.get(device)}
+        return blocked.isdisjoint(contested)
+
+    def _grant(self, lease: Lease, devices: frozenset[str]):
+        self.grants += 1
+        if lease.deadline is not None and time.monotonic() > lease.deadline:
+            self.missed_deadlines += 1
+
+        for device in devices:
+            last_user = self._last_user.get(device)
+            if last_user is not None and last_user is not lease:
+                if any(
+                    request.lease is last_user and device in request.devices
+                    for request in self._waiting
+                ):
+                    self.preemptions += 1
+            self._last_user[device] = lease
+            self._held.setdefault(device, []).append(lease)
+
+    def _request_schedule(self):
+        # Deferred, so an acquisition that moves on to its next event can claim the
+        # devices again, unless a higher ranked acquisition waits for them
+        if not self._schedule_pending:
+            self._schedule_pending = True
+            asyncio.get_running_loop().call_soon(self._schedule)
+
+    def _schedule(self):
+        """Grant the waiting requests whose devices are free, in the order of their rank"""
+        self._schedule_pending = False
+        for request in list(self._resuming):
+            if not request.future.done() and self._on_top(
+                request.lease, request.devices
+            ):
+                self._resuming.remove(request)
+                request.future.set_result(None)
+
+        blocked: set[str] = set()
+        for request in sorted(self._waiting, key=lambda r: self._rank(r.lease)):
+            if request.future.done():
+                continue
+            if self._can_grant(request.lease, request.devices, blocked):
+                self._waiting.remove(request)
+                self._grant(request.lease, request.devices)
+                request.future.set_result(None)
+            else:
+                # Lower ranked requests may not overtake this one on its devices
+                blocked |= request.devices
+
+    async def acquire(self, lease: Lease, devices: set[str]):
+        """Wait until the lease may use the devices, and hold them"""
+        devices = frozenset(devices)
+        rank = self._rank(lease)
+        blocked = set().union(
+            *(
+                request.devices
+                for request in self._waiting
+                if self._rank(request.lease) < rank
+            )
+        )
+        if self._can_grant(lease, devices, blocked):
+            self._grant(lease, devices)
+            return
+
+        request = _Request(lease, devices, asyncio.get_running_loop().create_future())
+        self._waiting.append(request)
+        try:
+            await request.future
+        except asyncio.CancelledError:
+            if request in self._waiting:
+                self._waiting.remove(request)
+            elif request.future.done() and not request.future.cancelled():
+                # Granted, but cancelled before it could be used
+                self.release(lease, devices)
+            self._schedule()
+            raise
+
+    def release(self, lease: Lease, devices: set[str]):
+        """Release the devices the lease held, handing them to the next waiting request"""
+        for device in devices:
+            self._suspended.get(device, set()).discard(lease)
+            holders = self._held.get(device)
+            if holders and lease in holders:
+                # the last entry of the lease, as it may hold the device more than once
+                index = len(holders) - 1 - holders[::-1].index(lease)
+                del holders[index]
+                if not holders:
+                    del self._held[device]
+
+        self._request_schedule()
+
+    def suspend(self, lease: Lease, devices: set[str]):
+        """Let the acquisitions started by the consumer of the lease borrow its devices"""
+        for device in devices:
+            self._suspended.setdefault(device, set()).add(lease)
+        self._request_schedule()
+
+    async def resume(self, lease: Lease, devices: set[str]):
+        """Stop lending the devices, waiting until the borrowers released them"""
+        devices = frozenset(devices)
+        for device in devices:
+            self._suspended.get(device, set()).discard(lease)
+        if self._on_top(lease, devices):
+            return
+
+        request = _Request(lease, devices, asyncio.get_running_loop().create_future())
+        self._resuming.append(request)
+        try:
+            await request.future
+        finally:
+            if request in self._resuming:
+                self._resuming.remove(request)
+
+    @property
+    def waiting(self) -> int:
+        """The number of requests waiting for devices"""
+        return len(self._waiting)
@@ -0,0 +1,232 @@
+import json
+from pathlib import Path
+from typing import BinaryIO, Protocol, runtime_checkable
+
+import numpy as np
+
+from akuire.events.data_event import ImageDataEvent
+
+
+@runtime_checkable
+class FrameStore(Protocol):
+    """A store that the frames of an acquisition are streamed into
+
+    Frames are appended as they arrive, after which the store owns the data of the
+    ImageDataEvent (which may be replaced by a view into the store). Once the
+    acquisition is done, the store is closed and the frames can be retrieved as a
+    single array.
+    """
+
+    def append(self, event: ImageDataEvent) -> None: ...
+
+    def close(self) -> None: ...
+
+    def to_array(self) -> np.ndarray: ...
+
+
+class MemmapFrameStore:
+    """Streams frames into a memory-mapped array on local disk
+
+    The frames are written as they arrive into a raw binary file in the given
+    directory, next to a small JSON file describing the dtype, frame shape and
+    number of frames. Collected ImageDataEvents are re-pointed to memory-mapped
+    views of their frame once the store is closed, so acquisitions can be bigger
+    than the available memory.
+
+    Args:
+        directory (str | Path): The directory to write the store to.
+        name (str, optional): The name of the store files. Defaults to "frames".
+    """
+
+    def __init__(self, directory: str | Path, name: str = "frames"):
+        self.directory = Path(directory)
+        self.name = name
+        self.dtype: np.dtype | None = None
+        self.frame_shape: tuple[int, ...] | None = None
+        self.count = 0
+        self._events: list[ImageDataEvent] = []
+        self._file: BinaryIO | None = None
+        self._array: np.memmap | None = None
+
+    @property
+    def data_path(self) -> Path:
+        return self.directory / f"{self.name}.bin"
+
+    @property
+    def meta_path(self) -> Path:
+        return self.directory / f"{self.name}.json"
+
+    @classmethod
+    def open(cls, directory: str | Path, name: str = "frames") -> "MemmapFrameStore":
+        """Open a previously written store for reading"""
+        store = cls(directory, name=name)
+        meta = json.loads(store.meta_path.read_text())
+        store.dtype = np.dtype(meta["dtype"])
+        store.frame_shape = tuple(meta["frame_shape"])
+        store.count = meta["count"]
+        return store
+
+    def append(self, event: ImageDataEvent) -> None:
+        data = np.ascontiguousarray(event.data)
+
+        if self._file is None:
+            if self.count:
+                raise ValueError("Cannot append to a store that was already closed")
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.dtype = data.dtype
+            self.frame_shape = data.shape
+            self._file = open(self.data_path, "wb")
+
+        if data.shape != self.frame_shape or data.dtype != self.dtype:
+            raise ValueError(
+                f"Frame {self.count} of {event.device} has shape {data.shape} and dtype {data.dtype}, "
+                f"but the store holds frames of shape {self.frame_shape} and dtype {self.dtype}."
+            )
+
+        self._file.write(memoryview(data).cast("B"))
+        self.count += 1
+
+        # The store owns the frame now, the in memory data is dropped and
+        # replaced by a memory-mapped view when the store is closed
+        event.release()
+        event.data = None
+        self._events.append(event)
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+
+        self._file.close()
+        self._file = None
+
+        self.meta_path.write_text(
+            json.dumps(
+                {
+                    "dtype": self.dtype.str,
+                    "frame_shape": list(self.frame_shape),
+                    "count": self.count,
+                }
+            )
+        )
+
+        array = self.to_array()
+        for index, event in enumerate(self._events):
+            event.data = array[index]
+        self._events = []
+
+    def to_array(self) -> np.ndarray:
+        """Get a read-only memory-mapped array of shape (frames, *frame_shape)"""
+        if self._file is not None:
+            raise ValueError("The store needs to be closed before it can be read")
+        if self.count == 0:
+            raise ValueError("The store does not contain any frames")
+
+        if self._array is None or self._array.shape[0] != self.count:
+            self._array = np.memmap(
+                self.data_path,
+                dtype=self.dtype,
+                mode="r",
+                shape=(self.count, *self.frame_shape),
+            )
+        return self._array
+
+
+class PreallocatedFrameStore:
+    """Assembles frames directly into a preallocated stack
+
+    When the number of frames of an acquisition is known up front (e.g. from the
+    z_steps of an AcquireZStackEvent), the stack is allocated when the first frame
+    arrives, and every following frame is copied straight into its place. The data
+    of the collected ImageDataEvents becomes a view into the stack, so no final
+    stacking pass (and no second copy of the dataset) is needed.
+
+    At most `max_preallocated_bytes` are allocated at once, so long acquisitions
+    (e.g. a t-series over hours) do not claim all of their memory up front. Their
+    stack grows in chunks of that size instead, which are assembled into a single
+    stack when the array is first requested.
+
+    If more frames arrive than expected, the stack grows. If a frame does not match
+    the shape or dtype of the first frame, it is kept on its own and `to_array`
+    raises a ValueError naming the offending frame.
+
+    Args:
+        expected_frames (int): The number of frames to preallocate.
+        max_preallocated_bytes (int, optional): The maximum size of an allocation. Defaults to 256 MiB.
+    """
+
+    def __init__(self, expected_frames: int, max_preallocated_bytes: int = 1 << 28):
+        self.expected_frames = expected_frames
+        self.max_preallocated_bytes = max_preallocated_bytes
+        self.count = 0
+        self._chunks: list[np.ndarray] = []
+        self._chunk_frames = 1
+        self._filled = 0
+        self._events: list[ImageDataEvent] = []
+        self._mismatch: str | None = None
+
+    @property
+    def capacity(self) -> int:
+        """The number of frames that were allocated"""
+        return sum(len(chunk) for chunk in self._chunks)
+
+    def _grow(self, frame: np.ndarray):
+        if not self._chunks:
+            self._chunk_frames = max(self.max_preallocated_bytes // max(frame.nbytes, 1), 1)
+        # Beyond the expected frames, grow geometrically
+        frames = min(
+            self._chunk_frames, max(self.expected_frames - self.count, self.count, 1)
+        )
+        self._chunks.append(np.empty((frames, *frame.shape), dtype=frame.dtype))
+        self._filled = 0
+
+    def append(self, event: ImageDataEvent) -> None:
+        data = event.data
+
+        if not self._chunks:
+            self._grow(data)
+
+        chunk = self._chunks[-1]
+        if data.shape != chunk.shape[1:] or data.dtype != chunk.dtype:
+            if self._mismatch is None:
+                self._mismatch = (
+                    f"Frame {self.count} of {event.device} has shape {data.shape} and dtype {data.dtype}, "
+                    f"but the previous frames have shape {chunk.shape[1:]} and dtype {chunk.dtype}."
+                )
+            event.detach()
+            return
+
+        if self._filled == len(chunk):
+            self._grow(data)
+            chunk = self._chunks[-1]
+
+        chunk[self._filled] = data
+        event.release()
+        event.data = chunk[self._filled]
+        self._events.append(event)
+        self._filled += 1
+        self.count += 1
+
+    def close(self) -> None:
+        pass
+
+    def to_array(self) -> np.ndarray:
+        """Get the stack of shape (frames, *frame_shape)"""
+        if self._mismatch is not None:
+            raise ValueError(
+                "Not all collected events are ImageDataEvents of the same shape, cannot stack. "
+                + self._mismatch
+            )
+        if not self._chunks:
+            raise ValueError("No ImageDataEvents were collected, cannot stack.")
+
+        if len(self._chunks) > 1:
+            # Assemble the chunks once, re-pointing the events so the chunks are freed
+            stack = np.concatenate(
+                self._chunks[:-1] + [self._chunks[-1][: self._filled]]
+            )
+            for index, event in enumerate(self._events):
+                event.data = stack[index]
+            self._chunks = [stack]
+            self._filled = len(stack)
+
+        return self._chunks[0][: self.count]
@@ -0,0 +1,125 @@
+import asyncio
+import dataclasses
+from collections import deque
+from typing import AsyncIterator, Literal
+
+from akuire.events import DataEvent
+
+OverflowPolicy = Literal["block", "drop_oldest", "drop_newest"]
+
+
+@dataclasses.dataclass
+class StreamStats:
+    """Counters of the events that passed through (one or more) BoundedEventQueues"""
+
+    produced: int = 0
+    consumed: int = 0
+    dropped: int = 0
+    depth: int = 0
+    """The number of events that are currently queued"""
+    max_depth: int = 0
+
+
+class BoundedEventQueue:
+    """A bounded queue of data events between a producer and a consumer
+
+    Decouples the managers producing the events from the consumer of the stream.
+    When the queue is full, the policy decides what happens: "block" waits until
+    the consumer caught up, "drop_oldest" drops the oldest queued event and
+    "drop_newest" drops the event that was put. Dropped events release their
+    frame (see ImageDataEvent.release), as do other items with a `release` method.
+
+    Closing the queue (optionally with an exception) never drops anything: the
+    consumer receives every queued event before the queue ends (or raises).
+
+    Args:
+        maxsize (int): The number of events the queue holds.
+        policy (OverflowPolicy, optional): What to do when the queue is full. Defaults to "block".
+        stats (StreamStats, optional): The counters to update, e.g. to share them
+            between queues. Defaults to new counters.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        policy: OverflowPolicy = "block",
+        stats: StreamStats | None = None,
+    ):
+        assert maxsize > 0, "The size of the queue must be positive"
+        self.maxsize = maxsize
+        self.policy = policy
+        self.stats = stats if stats is not None else StreamStats()
+        self._events: deque[DataEvent] = deque()
+        self._closed = False
+        self._exception: BaseException | None = None
+        self._changed = asyncio.Condition()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def _drop(self, event: DataEvent):
+        self.stats.dropped += 1
+        release = getattr(event, "release", None)
+        if release is not None:
+            release()
+
+    async def put(self, event: DataEvent):
+        async with self._changed:
+            if self._closed:
+                raise RuntimeError("Cannot put events into a closed queue")
+
+            if len(self._events) >= self.maxsize:
+                if self.policy == "drop_newest":
+                    self._drop(event)
+                    return
+                elif self.policy == "drop_oldest":
+                    self._drop(self._events.popleft())
+                    self.stats.depth -= 1
+                else:
+                    await self._changed.wait_for(
+                        lambda: len(self._events) < self.maxsize
+                    )
+
+            self._events.append(event)
+            self.stats.produced += 1
+            self.stats.depth += 1
+            self.stats.max_depth = max(self.stats.max_depth, len(self._events))
+            self._changed.notify_all()
+
+    async def close(self, exception: BaseException | None = None):
+        """End the queue after the queued events, raising the exception if given"""
+        async with self._changed:
+            self._closed = True
+            self._exception = exception
+            self._changed.notify_all()
+
+    async def get(self) -> DataEvent:
+        """Get the next event
+
+        Raises:
+            StopAsyncIteration: If the queue was closed and every event was consumed.
+        """
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._events or self._closed)
+            if self._events:
+                event = self._events.popleft()
+                self.stats.consumed += 1
+                self.stats.depth -= 1
+                self._changed.notify_all()
+                return event
+
+            if self._exception is not None:
+                raise self._exception
+            raise StopAsyncIteration
+
+    def discard(self):
+        """Drop every queued event, e.g. when the consumer is gone"""
+        while self._events:
+            self._drop(self._events.popleft())
+            self.stats.depth -= 1
+
+    def __aiter__(self) -> AsyncIterator[DataEvent]:
+        return self
+
+    async def __anext__(self) -> DataEvent:
+        return await self.get()
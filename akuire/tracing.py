@@ -0,0 +1,287 @@
+import dataclasses
+import json
+import math
+import random
+import time
+from collections import deque
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from akuire.acquisition import PairedEvent
+from akuire.events import DataEvent, ImageDataEvent
+
+METRICS = (
+    "compile_time",
+    "queue_wait",
+    "first_yield_latency",
+    "manager_time",
+    "bytes",
+    "hook_time",
+)
+"""The metrics that are recorded per PairedEvent (times in seconds)"""
+
+
+@dataclasses.dataclass(eq=False)
+class EventSpan:
+    """The timings of a traced PairedEvent
+
+    All timestamps are time.perf_counter() values.
+    """
+
+    name: str
+    manager: str | None
+    index: int
+    compile_time: float
+    """The time spent compiling (i.e. transpiling and routing) the paired event"""
+    queued_at: float
+    """When the paired event was compiled, and ready to be executed"""
+    started_at: float | None = None
+    """When the manager started computing the event"""
+    first_yield_at: float | None = None
+    finished_at: float | None = None
+    manager_time: float = 0
+    """The time spent in the manager, excluding the time the stream was suspended"""
+    data_events: int = 0
+    bytes: int = 0
+    """The number of bytes of the frames the event produced"""
+    hook_time: float = 0
+    """The time spent in the hooks for the produced events"""
+    error: str | None = None
+
+    @property
+    def queue_wait(self) -> float:
+        return self.started_at - self.queued_at if self.started_at is not None else 0
+
+    @property
+    def first_yield_latency(self) -> float | None:
+        if self.first_yield_at is None or self.started_at is None:
+            return None
+        return self.first_yield_at - self.started_at
+
+    def observe(self, event: DataEvent):
+        """Account for a data event the manager produced"""
+        if self.first_yield_at is None:
+            self.first_yield_at = time.perf_counter()
+        self.data_events += 1
+        if isinstance(event, ImageDataEvent):
+            self.bytes += getattr(event.data, "nbytes", 0)
+
+
+class Histogram:
+    """A log-bucketed histogram, exact in count, sum, min and max
+
+    Values are counted in buckets that grow by a factor of 2 ** (1 / subdivisions),
+    so percentiles are accurate to that factor regardless of the magnitude of the values.
+    """
+
+    def __init__(self, subdivisions: int = 4):
+        self.subdivisions = subdivisions
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zeros = 0
+        self.buckets: dict[int, int] = {}
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0
+
+    def record(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 0:
+            self.zeros += 1
+            return
+        bucket = math.floor(math.log2(value) * self.subdivisions)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, q: float) -> float:
+        """Estimate the q-th percentile (0-100) as the upper bound of its bucket"""
+        if self.count == 0:
+            return 0
+        rank = q / 100 * self.count
+        seen = self.zeros
+        if rank <= seen:
+            return max(self.min, 0) if self.zeros else self.min
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / self.subdivisions), self.max)
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min if self.count else 0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max if self.count else 0,
+        }
+
+
+class Tracer:
+    """Records the timings of the PairedEvents an engine executes
+
+    For every traced PairedEvent an EventSpan records the compile time, the time
+    it waited to be executed, the latency until the manager produced its first
+    data event, the time spent in the manager, the bytes it produced and the time
+    the hooks spent on its events. The spans are kept (up to max_spans) for export
+    as a Chrome trace (which Perfetto opens as well), and every metric is recorded
+    in a histogram, per event type and overall.
+
+    Only a fraction of the events is traced if a sample_rate below 1 is given, so
+    tracing can be left on in production.
+
+    Args:
+        sample_rate (float, optional): The fraction of paired events to trace. Defaults to 1.0.
+        max_spans (int, optional): The number of most recent spans to keep. Defaults to 10000.
+        seed (int, optional): Seed for sampling. Defaults to None.
+    """
+
+    def __init__(
+        self, sample_rate: float = 1.0, max_spans: int = 10000, seed: int | None = None
+    ):
+        self.sample_rate = sample_rate
+        self.spans: deque[EventSpan] = deque(maxlen=max_spans)
+        self.histograms: dict[tuple[str, str | None], Histogram] = {}
+        self._random = random.Random(seed)
+        self._index = 0
+        self._origin = time.perf_counter()
+
+    def sample(self) -> bool:
+        """Decide whether the next paired event is traced"""
+        return self.sample_rate >= 1 or self._random.random() < self.sample_rate
+
+    def trace(self, paired_events: Iterable[PairedEvent]) -> Iterator[PairedEvent]:
+        """Pass through the (lazily compiled) paired events, starting a span for the sampled ones"""
+        iterator = iter(paired_events)
+        while True:
+            sampled = self.sample()
+            start = time.perf_counter() if sampled else 0
+            try:
+                paired_event = next(iterator)
+            except StopIteration:
+                return
+
+            if sampled and not paired_event.is_barrier:
+                now = time.perf_counter()
+                paired_event.span = EventSpan(
+                    name=paired_event.event.__class__.__name__,
+                    manager=paired_event.manager,
+                    index=self._index,
+                    compile_time=now - start,
+                    queued_at=now,
+                )
+                self._index += 1
+            yield paired_event
+
+    def _record(self, metric: str, name: str, value: float):
+        for key in ((metric, None), (metric, name)):
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.record(value)
+
+    def finish(self, span: EventSpan, error: BaseException | None = None):
+        """Record the span once the manager finished the event"""
+        span.finished_at = time.perf_counter()
+        if error is not None:
+            span.error = repr(error)
+
+        self.spans.append(span)
+        self._record("compile_time", span.name, span.compile_time)
+        self._record("queue_wait", span.name, span.queue_wait)
+        if span.first_yield_latency is not None:
+            self._record("first_yield_latency", span.name, span.first_yield_latency)
+        self._record("manager_time", span.name, span.manager_time)
+        self._record("bytes", span.name, span.bytes)
+
+    def record_hook(self, span: EventSpan, latency: float):
+        """Account for the time a hook spent on an event of the span"""
+        span.hook_time += latency
+        self._record("hook_time", span.name, latency)
+
+    def histogram(self, metric: str, event: str | None = None) -> Histogram:
+        """Get the histogram of a metric, for an event type (by class name) or overall"""
+        assert metric in METRICS, f"Unknown metric {metric}, choose from {METRICS}"
+        return self.histograms.get((metric, event)) or Histogram()
+
+    def summary(self, event: str | None = None) -> dict[str, dict[str, float]]:
+        """Summarize every metric, for an event type (by class name) or overall"""
+        return {metric: self.histogram(metric, event).summary() for metric in METRICS}
+
+    def clear(self):
+        self.spans.clear()
+        self.histograms.clear()
+
+    def _us(self, timestamp: float) -> float:
+        return (timestamp - self._origin) * 1e6
+
+    def to_chrome_trace(self) -> dict:
+        """Convert the recorded spans to the Chrome trace event format"""
+        threads: dict[str | None, int] = {}
+        trace_events = [
+            {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "akuire"}}
+        ]
+
+        for span in self.spans:
+            if span.manager not in threads:
+                threads[span.manager] = len(threads) + 1
+                trace_events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": 1,
+                        "tid": threads[span.manager],
+                        "args": {"name": span.manager or "engine"},
+                    }
+                )
+            tid = threads[span.manager]
+            started_at = span.started_at if span.started_at is not None else span.queued_at
+
+            if span.queue_wait > 0:
+                trace_events.append(
+                    {
+                        "name": f"{span.name} (queued)",
+                        "cat": "queue",
+                        "ph": "X",
+                        "ts": self._us(span.queued_at),
+                        "dur": span.queue_wait * 1e6,
+                        "pid": 1,
+                        "tid": tid,
+                    }
+                )
+
+            trace_events.append(
+                {
+                    "name": span.name,
+                    "cat": "event",
+                    "ph": "X",
+                    "ts": self._us(started_at),
+                    "dur": (span.finished_at - started_at) * 1e6,
+                    "pid": 1,
+                    "tid": tid,
+                    "args": {
+                        "index": span.index,
+                        "compile_time": span.compile_time,
+                        "queue_wait": span.queue_wait,
+                        "first_yield_latency": span.first_yield_latency,
+                        "manager_time": span.manager_time,
+                        "data_events": span.data_events,
+                        "bytes": span.bytes,
+                        "hook_time": span.hook_time,
+                        "error": span.error,
+                    },
+                }
+            )
+
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str | Path):
+        """Write the recorded spans as Chrome trace JSON (open in chrome://tracing or Perfetto)"""
+        Path(path).write_text(json.dumps(self.to_chrome_trace()))
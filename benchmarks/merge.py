@@ -0,0 +1,41 @@
+"""Benchmark of the overhead of merging many streams with amerge
+
+Every source yields its values without doing any work, so the measured time is
+the overhead of the merge itself. The time per value should stay flat when the
+number of sources grows, e.g. from two cameras to the positions of a well plate.
+
+Run with `python benchmarks/merge.py`.
+"""
+
+import asyncio
+import time
+
+from akuire.composition.helpers import amerge
+
+
+async def source(n: int):
+    for i in range(n):
+        await asyncio.sleep(0)
+        yield i
+
+
+async def measure(sources: int, total: int) -> float:
+    per_source = total // sources
+    start = time.perf_counter()
+    count = 0
+    async for _ in amerge(*(source(per_source) for _ in range(sources))):
+        count += 1
+    elapsed = time.perf_counter() - start
+    assert count == per_source * sources
+    return elapsed / count
+
+
+async def main(total: int = 64000):
+    print(f"{'sources':>8} {'us/value':>10}")
+    for sources in (2, 8, 32, 128, 512):
+        per_value = await measure(sources, total)
+        print(f"{sources:>8} {per_value * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from akuire.acquisition import Acquisition
+from akuire.buffers import FrameRingBuffer
+from akuire.config import SystemConfig
+from akuire.engine import AcquisitionEngine
+from akuire.events import AcquireFrameEvent, AcquireZStackEvent, ImageDataEvent
+from akuire.managers.testing import SweepableCamera
+
+
+def create_buffered_engine(frame_buffer: FrameRingBuffer):
+    return AcquisitionEngine(
+        system_config=SystemConfig(
+            managers=[
+                SweepableCamera("virtual_camera", frame_buffer=frame_buffer),
+            ]
+        ),
+    )
+
+
+@pytest.mark.asyncio
+async def test_ring_buffer_recycles_slots():
+
+    frame_buffer = FrameRingBuffer((1, 1, 1, 512, 512, 1), capacity=2)
+
+    first = await frame_buffer.claim()
+    second = await frame_buffer.claim()
+    assert frame_buffer.available == 0
+
+    overflow = await frame_buffer.claim()
+    assert overflow.index is None
+    assert frame_buffer.overflows == 1
+
+    first.release()
+    recycled = await frame_buffer.claim()
+    assert recycled.index == first.index
+    assert np.shares_memory(recycled.data, frame_buffer.frames)
+
+    second.retain()
+    second.release()
+    assert frame_buffer.available == 0
+    second.release()
+    assert frame_buffer.available == 1
+
+
+@pytest.mark.asyncio
+async def test_ring_buffer_waits_for_release():
+
+    frame_buffer = FrameRingBuffer((4, 4), capacity=1, overflow="wait")
+    slot = await frame_buffer.claim()
+
+    waiting = asyncio.create_task(frame_buffer.claim())
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+
+    slot.release()
+    assert (await waiting).index == slot.index
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_views_into_the_buffer():
+
+    frame_buffer = FrameRingBuffer((1, 1, 1, 512, 512, 1), capacity=1)
+
+    async with create_buffered_engine(frame_buffer) as e:
+        x = Acquisition(events=[AcquireFrameEvent(exposure_time=0.01)] * 3)
+
+        async for event in e.acquire_stream(x):
+            assert isinstance(event, ImageDataEvent)
+            assert np.shares_memory(event.data, frame_buffer.frames)
+            event.release()
+
+        assert frame_buffer.overflows == 0
+
+        result = await e.acquire(x)
+        assert frame_buffer.available == 1, "Collected frames are detached"
+        assert not any(
+            np.shares_memory(event.data, frame_buffer.frames)
+            for event in result.collected_events
+        )
+
+
+@pytest.mark.asyncio
+async def test_buffer_shape_must_match_the_frames():
+
+    frame_buffer = FrameRingBuffer((1, 1, 1, 512, 512, 1), capacity=1)
+
+    async with create_buffered_engine(frame_buffer) as e:
+        x = Acquisition(
+            events=[AcquireZStackEvent(z_steps=2, item_exposure_time=0.001)]
+        )
+
+        with pytest.raises(ValueError):
+            await e.acquire(x)
+
+        assert frame_buffer.available == 1
@@ -1,9 +1,12 @@
+import asyncio
+
 import pytest
 
 from akuire.acquisition import AcquisitionResult
 from akuire.composition.composer import arun
 from akuire.composition.helpers import achain, amerge, auntil, azip
-from akuire.events.data_event import DataEvent, ZipEvent
+from akuire.errors import SkewError
+from akuire.events.data_event import DataEvent, UncollectedBufferEvent, ZipEvent
 from akuire.helpers.base import acquire_z_stack, one_shot_snap
 from akuire.managers.testing.errors import TestableError
 
@@ -88,3 +91,121 @@ async def test_composition_run_with_amerge_parallelizable(dual_camera_engine):
         assert (
             result.collected_events[1].device == "virtual_camera1"
         ), "The slowest camera should be second"
+
+
+async def counting_source(index: int, n: int, produced: list[int]):
+    for i in range(n):
+        await asyncio.sleep(0)
+        produced[index] += 1
+        yield index, i
+
+
+@pytest.mark.asyncio
+@pytest.mark.composition
+async def test_amerge_many_sources():
+    produced = [0] * 32
+    sources = [counting_source(i, 10, produced) for i in range(32)]
+    merged = [value async for value in amerge(*sources)]
+
+    assert len(merged) == 320
+    for index in range(32):
+        # every source is merged in order
+        assert [i for source, i in merged if source == index] == list(range(10))
+
+
+@pytest.mark.asyncio
+@pytest.mark.composition
+async def test_amerge_bounds_read_ahead():
+    produced = [0, 0]
+    sources = [counting_source(i, 100, produced) for i in range(2)]
+    merged = amerge(*sources, buffer_size=2)
+
+    await anext(merged)
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    # the consumer is stalled, so the sources only read ahead as far as the buffer allows
+    assert max(produced) <= 4
+    await merged.aclose()
+
+
+async def collect_values(generator) -> list:
+    return [value async for value in generator]
+
+
+class Aborted(BaseException):
+    pass
+
+
+async def aborting_source():
+    yield 0
+    raise Aborted()
+
+
+@pytest.mark.asyncio
+@pytest.mark.composition
+async def test_amerge_signals_base_exceptions():
+    sources = [aborting_source(), counting_source(1, 3, [0, 0])]
+
+    with pytest.raises(Aborted):
+        # the pump of the aborted source is done, so the merge does not wait for it forever
+        await asyncio.wait_for(collect_values(amerge(*sources)), timeout=1)
+
+
+async def timed_source(device: str, timestamps: list[float], delay: float = 0):
+    for timestamp in timestamps:
+        await asyncio.sleep(delay)
+        event = DataEvent(device=device)
+        event.timestamp = timestamp
+        yield event
+
+
+@pytest.mark.asyncio
+@pytest.mark.composition
+async def test_azip_reports_leftovers():
+    zipped = [
+        event
+        async for event in azip(
+            timed_source("a", [0, 1, 2]), timed_source("b", [0, 1, 2, 3, 4])
+        )
+    ]
+
+    assert [event.first.timestamp for event in zipped[:3]] == [0, 1, 2]
+    assert isinstance(zipped[3], UncollectedBufferEvent)
+    assert zipped[3].first == []
+    assert [event.timestamp for event in zipped[3].second] == [3, 4]
+
+
+@pytest.mark.asyncio
+@pytest.mark.composition
+async def test_azip_bounds_skew():
+    fast = timed_source("fast", list(range(20)))
+    slow = timed_source("slow", list(range(20)), delay=0.01)
+
+    with pytest.raises(SkewError):
+        async for event in azip(fast, slow, max_skew=4):
+            pass
+
+    fast = timed_source("fast", list(range(20)))
+    slow = timed_source("slow", list(range(3)), delay=0.01)
+    zipped = [
+        event async for event in azip(fast, slow, max_skew=4, on_skew="drop_oldest")
+    ]
+
+    assert len(zipped[-1].first) <= 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.composition
+async def test_azip_matches_timestamps():
+    first = timed_source("first", [0, 1, 2, 3])
+    # the second camera dropped the frame at 1
+    second = timed_source("second", [0.01, 2.02, 3.01], delay=0.001)
+
+    zipped = [event async for event in azip(first, second, tolerance=0.05)]
+
+    assert [(event.first.timestamp, event.second.timestamp) for event in zipped] == [
+        (0, 0.01),
+        (2, 2.02),
+        (3, 3.01),
+    ]
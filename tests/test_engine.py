@@ -1,3 +1,10 @@
+import asyncio
+import dataclasses
+import itertools
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator
+
 import numpy as np
 import pytest
 
@@ -5,7 +12,19 @@ from akuire.acquisition import Acquisition, AcquisitionResult
 from akuire.compilers.default import compile_events
 from akuire.config import SystemConfig
 from akuire.engine import AcquisitionEngine
-from akuire.events import AcquireZStackEvent, ImageDataEvent, MoveEvent
+from akuire.events import (
+    AcquireFrameEvent,
+    AcquireTSeriesEvent,
+    AcquireZStackEvent,
+    BarrierEvent,
+    DataEvent,
+    DelayEvent,
+    HasMovedEvent,
+    ImageDataEvent,
+    MoveEvent,
+)
+from akuire.events.manager_event import ArmEvent, DisarmEvent
+from akuire.managers.base import BaseManager
 from akuire.managers.testing import (
     NonSweepableCamera,
     SweepableCamera,
@@ -55,3 +74,203 @@ async def test_acquistion_engine(engine):
         result = await e.acquire(x)
         assert isinstance(result, AcquisitionResult)
         assert isinstance(result.to_z_stack(), np.ndarray)
+
+
+@pytest.mark.asyncio
+async def test_plan_cache_reuses_routing(default_engine):
+
+    async with default_engine as e:
+        for i in range(3):
+            await e.acquire(
+                Acquisition(
+                    events=[
+                        MoveEvent(x=i, y=i),
+                        AcquireZStackEvent(z_steps=2 + i, item_exposure_time=0.001),
+                    ]
+                )
+            )
+
+        assert e.plan_cache.misses == 1
+        assert e.plan_cache.hits == 2
+
+        e.system_config.managers.append(ZStageManager("another_z_stage"))
+        e.compile(Acquisition(events=[MoveEvent(x=1, y=2)]))
+        assert e.plan_cache.misses == 2
+        assert len(e.plan_cache.tables) == 1
+
+
+def create_pipelined_engine():
+    return AcquisitionEngine(
+        system_config=SystemConfig(
+            managers=[
+                SweepableCamera("virtual_camera1"),
+                SweepableCamera("virtual_camera2"),
+            ]
+        ),
+        compiler=compile_events,
+        pipelined=True,
+    )
+
+
+@pytest.mark.asyncio
+async def test_pipelined_overlaps_devices():
+
+    x = Acquisition(
+        events=[
+            AcquireFrameEvent(device="virtual_camera1", exposure_time=0.5),
+            AcquireFrameEvent(device="virtual_camera2", exposure_time=0.1),
+            AcquireFrameEvent(device="virtual_camera1", exposure_time=0.1),
+        ]
+    )
+
+    async with create_pipelined_engine() as e:
+        start = time.monotonic()
+        result = await e.acquire(x)
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.65, "Frames on different cameras should overlap"
+    assert [event.device for event in result.collected_events] == [
+        "virtual_camera1",
+        "virtual_camera2",
+        "virtual_camera1",
+    ], "Output order should follow the acquisition"
+
+
+@pytest.mark.asyncio
+async def test_pipelined_barrier():
+
+    x = Acquisition(
+        events=[
+            AcquireFrameEvent(device="virtual_camera1", exposure_time=0.3),
+            BarrierEvent(),
+            AcquireFrameEvent(device="virtual_camera2", exposure_time=0.3),
+        ]
+    )
+
+    async with create_pipelined_engine() as e:
+        start = time.monotonic()
+        result = await e.acquire(x)
+        elapsed = time.monotonic() - start
+
+    assert elapsed >= 0.6, "The barrier should order the frames"
+    assert len(result.collected_events) == 2
+
+
+@dataclasses.dataclass
+class CountingCamera(BaseManager):
+    computed: int = 0
+
+    async def compute_event(
+        self, event: AcquireFrameEvent
+    ) -> AsyncGenerator[DataEvent, None]:
+        self.computed += 1
+        yield HasMovedEvent(device=self.device)
+
+
+@pytest.mark.asyncio
+async def test_pipelined_bounds_run_ahead():
+
+    camera = CountingCamera("virtual_camera")
+    engine = AcquisitionEngine(
+        system_config=SystemConfig(managers=[camera]),
+        compiler=compile_events,
+        pipelined=True,
+        pipeline_depth=4,
+    )
+    x = Acquisition(events=[AcquireFrameEvent() for _ in range(100)])
+
+    async with engine as e:
+        async with aclosing(e.acquire_stream(x)) as stream:
+            events = [await anext(stream)]
+            await asyncio.sleep(0.05)
+            assert camera.computed <= 5, "Only depth events should run ahead"
+
+            events += [event async for event in stream]
+
+    assert len(events) == 100
+
+
+@dataclasses.dataclass
+class SequencingCamera(BaseManager):
+    async def compute_event(
+        self, event: ArmEvent | AcquireFrameEvent | DelayEvent | DisarmEvent
+    ) -> AsyncGenerator[DataEvent, None]:
+        yield HasMovedEvent(device=self.device)
+
+
+def test_compilation_is_lazy():
+
+    config = SystemConfig(managers=[SequencingCamera("virtual_camera")])
+    x = Acquisition(events=[AcquireTSeriesEvent(t_steps=10**12)])
+
+    (series,) = compile_events(x, config)
+    first = list(itertools.islice(series, 3))
+
+    assert [type(paired.event) for paired in first] == [
+        ArmEvent,
+        AcquireFrameEvent,
+        DelayEvent,
+    ]
+
+
+@dataclasses.dataclass(kw_only=True)
+class CountedTSeriesEvent(AcquireTSeriesEvent):
+    transpiled: int = 0
+
+    def transpile(self):
+        for event in super().transpile():
+            self.transpiled += 1
+            yield event
+
+
+@pytest.mark.asyncio
+async def test_engine_executes_lazily():
+
+    engine = AcquisitionEngine(
+        system_config=SystemConfig(managers=[SequencingCamera("virtual_camera")]),
+        compiler=compile_events,
+    )
+    series = CountedTSeriesEvent(t_steps=10**5)
+
+    async with engine as e:
+        assert e.scheduler is not None
+        async with aclosing(e.acquire_stream(Acquisition(events=[series]))) as stream:
+            for _ in range(3):
+                await anext(stream)
+
+    assert series.transpiled < 10
+
+
+def test_system_config_routing():
+
+    config = SystemConfig(
+        managers=[
+            SequencingCamera("sequencing_camera"),
+            VirtualStageManager("virtual_stage"),
+        ]
+    )
+
+    assert config.route(AcquireFrameEvent()) == ["sequencing_camera"]
+    assert config.route(MoveEvent(x=1, y=2)) == ["virtual_stage"]
+    assert config.route(AcquireZStackEvent(z_steps=2, item_exposure_time=1)) == []
+
+    config.managers[0] = SweepableCamera("sweepable_camera")
+    config.ensure_index()
+    assert config.get_manager("sweepable_camera") is config.managers[0]
+    assert not config.has_manager("sequencing_camera")
+
+
+def test_challenge_accepts_event_subclasses():
+
+    @dataclasses.dataclass(kw_only=True)
+    class TriggeredFrameEvent(AcquireFrameEvent):
+        pass
+
+    assert SequencingCamera.typed_challengers == frozenset(
+        [ArmEvent, AcquireFrameEvent, DelayEvent, DisarmEvent]
+    )
+    assert SequencingCamera("camera").challenge(TriggeredFrameEvent())
+    assert not SequencingCamera("camera").challenge(MoveEvent(x=1, y=2))
+
+    config = SystemConfig(managers=[SequencingCamera("sequencing_camera")])
+    assert config.route(TriggeredFrameEvent()) == ["sequencing_camera"]
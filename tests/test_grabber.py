@@ -0,0 +1,240 @@
+import asyncio
+import importlib
+import sys
+import time
+import types
+
+import numpy as np
+import pytest
+
+from akuire.acquisition import Acquisition
+from akuire.compilers.cache import PlanCache
+from akuire.events import ImageDataEvent
+from akuire.config import SystemConfig
+from akuire.managers.delay import DelayManager
+from akuire.events.manager_event import AcquireTSeriesEvent, AcquireZStackEvent
+
+
+class FakeRawImage:
+    def __init__(self, data: np.ndarray, stream: "FakeDataStream"):
+        self.data = data
+        self.stream = stream
+
+    def convert(self, mode: str) -> "FakeRawImage":
+        self.stream.conversions += 1
+        return FakeRawImage(np.stack([self.data] * 3, axis=-1), self.stream)
+
+    def get_numpy_array(self) -> np.ndarray:
+        return self.data
+
+
+class FakeDataStream:
+    """Delivers numbered frames at a fixed frame rate, with a timeout every few frames"""
+
+    def __init__(self, frame_period: float = 0.002):
+        self.frame_period = frame_period
+        self.calls = 0
+        self.frame = 0
+        self.conversions = 0
+
+    def get_image(self, timeout: int = 1000):
+        time.sleep(self.frame_period)
+        self.calls += 1
+        if self.calls % 5 == 0:
+            return None
+
+        self.frame += 1
+        return FakeRawImage(np.full((4, 6), self.frame, dtype=np.uint8), self)
+
+
+class FakeColorFilter:
+    def __init__(self, color: bool):
+        self.color = color
+
+    def is_implemented(self) -> bool:
+        return self.color
+
+
+class FakeFeature:
+    def __init__(self, value=None):
+        self.value = value
+
+    def set(self, value):
+        self.value = value
+
+
+class FakeDevice:
+    def __init__(self, color: bool):
+        self.data_stream = [FakeDataStream()]
+        self.PixelColorFilter = FakeColorFilter(color)
+        self.TriggerMode = FakeFeature("off")
+        self.TriggerSource = FakeFeature()
+        self.AcquisitionFrameRateMode = FakeFeature("off")
+        self.AcquisitionFrameRate = FakeFeature()
+        self.ExposureTime = FakeFeature()
+        self.streaming = False
+
+    def stream_on(self):
+        self.streaming = True
+
+    def stream_off(self):
+        self.streaming = False
+
+
+def create_fake_gxipy(color: bool) -> types.ModuleType:
+    gx = types.ModuleType("gxipy")
+    device = FakeDevice(color)
+
+    class DeviceManager:
+        def open_device_by_index(self, index: int) -> FakeDevice:
+            return device
+
+    gx.DeviceManager = DeviceManager
+    gx.GxSwitchEntry = types.SimpleNamespace(OFF="off", ON="on")
+    gx.GxTriggerSourceEntry = types.SimpleNamespace(SOFTWARE="software", LINE0="line0")
+    gx.device = device
+    return gx
+
+
+@pytest.fixture
+def fake_gxipy(monkeypatch, request):
+    gx = create_fake_gxipy(color=getattr(request, "param", False))
+    monkeypatch.setitem(sys.modules, "gxipy", gx)
+    monkeypatch.delitem(sys.modules, "akuire.managers.uc2.cam", raising=False)
+    return gx
+
+
+@pytest.mark.asyncio
+async def test_daheng_sequence_mode(fake_gxipy):
+    cam = importlib.import_module("akuire.managers.uc2.cam")
+    manager = cam.DahengImagingManager("daheng", queue_size=4)
+    await manager.__aenter__()
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    ticking = asyncio.create_task(ticker())
+    events = [
+        event
+        async for event in manager.compute_event(
+            AcquireTSeriesEvent(t_steps=20, interval=0.002, item_exposure_time=0.001)
+        )
+    ]
+    ticking.cancel()
+
+    assert all(isinstance(event, ImageDataEvent) for event in events)
+    # every frame is delivered in order, the timeouts of the camera are skipped
+    assert [int(event.data[0, 0]) for event in events] == list(range(1, 21))
+    # mono frames are not converted to RGB
+    assert events[0].data.shape == (4, 6)
+    assert fake_gxipy.device.data_stream[0].conversions == 0
+    # the loop kept running while the frames were grabbed
+    assert ticks > 20
+    # the camera was armed for the duration of the sequence only
+    assert not fake_gxipy.device.streaming
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fake_gxipy", [True], indirect=True)
+async def test_daheng_sequence_mode_color(fake_gxipy):
+    cam = importlib.import_module("akuire.managers.uc2.cam")
+    manager = cam.DahengImagingManager(
+        "daheng", sequence_mode=True, trigger_source="LINE0"
+    )
+    await manager.__aenter__()
+
+    events = [
+        event
+        async for event in manager.compute_event(
+            AcquireZStackEvent(z_steps=3, item_exposure_time=0.001)
+        )
+    ]
+
+    assert [event.data.shape for event in events] == [(4, 6, 3)] * 3
+    assert fake_gxipy.device.data_stream[0].conversions == 3
+
+
+@pytest.mark.asyncio
+async def test_daheng_live_stops_grabbing_when_closed(fake_gxipy):
+    cam = importlib.import_module("akuire.managers.uc2.cam")
+    manager = cam.DahengImagingManager("daheng", queue_size=2)
+    await manager.__aenter__()
+    manager._is_armed = True
+
+    stream = manager.compute_event(cam.LiveCameraEvent())
+    for _ in range(5):
+        await anext(stream)
+    await stream.aclose()
+
+    grabbed = fake_gxipy.device.data_stream[0].calls
+    await asyncio.sleep(0.05)
+    assert fake_gxipy.device.data_stream[0].calls == grabbed
+
+
+@pytest.mark.asyncio
+async def test_daheng_sequence_mode_is_opt_in(fake_gxipy):
+    cam = importlib.import_module("akuire.managers.uc2.cam")
+    series = AcquireTSeriesEvent(t_steps=2, interval=0.5, item_exposure_time=0.01)
+    z_stack = AcquireZStackEvent(z_steps=2, item_exposure_time=0.02)
+
+    config = SystemConfig(managers=[cam.DahengImagingManager("daheng")])
+    assert config.route(series) == []
+    assert config.route(z_stack) == []
+
+    manager = cam.DahengImagingManager("daheng", sequence_mode=True)
+    config = SystemConfig(managers=[manager])
+    assert config.route(series) == ["daheng"]
+    assert config.route(z_stack) == [], "z-stacks need a trigger from the stage"
+
+    await manager.__aenter__()
+    device = fake_gxipy.device
+    stream = manager.compute_event(series)
+    await anext(stream)
+    assert device.TriggerMode.value == "off"
+    assert device.AcquisitionFrameRateMode.value == "on"
+    assert device.AcquisitionFrameRate.value == pytest.approx(2)
+    assert device.ExposureTime.value == pytest.approx(10000)
+    await stream.aclose()
+    assert device.AcquisitionFrameRateMode.value == "off"
+
+    manager = cam.DahengImagingManager(
+        "daheng", sequence_mode=True, trigger_source="Line0"
+    )
+    assert SystemConfig(managers=[manager]).route(z_stack) == ["daheng"]
+
+    await manager.__aenter__()
+    events = [event async for event in manager.compute_event(z_stack)]
+    assert len(events) == 2
+    assert device.TriggerSource.value == "line0"
+    assert device.ExposureTime.value == pytest.approx(20000)
+    assert device.TriggerMode.value == "off"
+
+
+def test_daheng_routes_follow_the_sequence_mode(fake_gxipy):
+    cam = importlib.import_module("akuire.managers.uc2.cam")
+    manager = cam.DahengImagingManager("daheng")
+    config = SystemConfig(managers=[manager, DelayManager("delay")])
+    cache = PlanCache()
+    series = Acquisition(
+        events=[AcquireTSeriesEvent(t_steps=2, interval=0.5, item_exposure_time=0.01)]
+    )
+
+    def managers() -> list:
+        return [
+            paired_event.manager
+            for stream in cache.compile(series, config)
+            for paired_event in stream
+            if paired_event.manager == "daheng"
+        ]
+
+    assert config.has_dynamic_routes()
+    assert managers() == ["daheng"] * 4, "transpiled into arm, frames and disarm"
+
+    manager.sequence_mode = True
+    assert managers() == ["daheng"], "computed as one sequence"
+    assert cache.hits == cache.misses == 0
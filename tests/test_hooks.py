@@ -0,0 +1,149 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from akuire.acquisition import Acquisition
+from akuire.buffers import FrameRingBuffer
+from akuire.events import AcquireZStackEvent, ImageDataEvent
+from akuire.hooks import HookDispatcher
+
+
+def frame(i: int) -> ImageDataEvent:
+    return ImageDataEvent(data=np.full((2, 2), i), device="camera")
+
+
+def cpu_bound_hook(event: ImageDataEvent):
+    return float(np.sum(event.data))
+
+
+@pytest.mark.asyncio
+async def test_hooks_run_concurrently():
+    running = 0
+    max_running = 0
+
+    async def display(event):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def writer(event):
+        await display(event)
+
+    dispatcher = HookDispatcher([display, writer])
+    async with dispatcher:
+        for i in range(5):
+            await dispatcher.dispatch(frame(i))
+
+    assert max_running == 2
+    assert dispatcher.stats[display].calls == 5
+    assert dispatcher.stats[writer].mean >= 0.01
+    assert dispatcher.stats[writer].name == writer.__qualname__
+
+
+@pytest.mark.asyncio
+async def test_hook_stats_are_kept_per_hook():
+    seen = []
+    hooks = [lambda event: seen.append(1), lambda event: seen.append(2)]
+
+    dispatcher = HookDispatcher(hooks)
+    async with dispatcher:
+        await dispatcher.dispatch(frame(0))
+
+    # lambdas share their name, but not their stats
+    assert [dispatcher.stats[hook].calls for hook in hooks] == [1, 1]
+    assert len({stats.name for stats in dispatcher.stats.values()}) == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_hook_does_not_stall_others():
+    seen = []
+
+    async def slow(event):
+        await asyncio.sleep(0.05)
+
+    async def metric(event):
+        seen.append(event)
+
+    dispatcher = HookDispatcher([slow, metric], maxsize=2, policy="drop_newest")
+    async with dispatcher:
+        for i in range(10):
+            await dispatcher.dispatch(frame(i))
+            await asyncio.sleep(0)
+
+    assert len(seen) == 10
+    assert dispatcher.stats[slow].calls < 10
+    assert dispatcher.queue_stats.dropped == 10 - dispatcher.stats[slow].calls
+
+
+@pytest.mark.asyncio
+async def test_sync_hooks_run_in_pool():
+    threads = set()
+
+    def analysis(event):
+        threads.add(threading.current_thread().name)
+
+    dispatcher = HookDispatcher([analysis])
+    async with dispatcher:
+        for i in range(3):
+            await dispatcher.dispatch(frame(i))
+
+    assert len(threads) == 1
+    assert threads.pop().startswith("akuire-hook")
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        dispatcher = HookDispatcher([cpu_bound_hook], executor=executor)
+        async with dispatcher:
+            await dispatcher.dispatch(frame(1))
+
+    assert dispatcher.stats[cpu_bound_hook].calls == 1
+
+
+@pytest.mark.asyncio
+async def test_hooks_retain_frames():
+    buffer = FrameRingBuffer((2, 2), capacity=2)
+    started = asyncio.Event()
+    proceed = asyncio.Event()
+    seen = []
+
+    async def display(event):
+        started.set()
+        await proceed.wait()
+        seen.append(event.data.copy())
+
+    dispatcher = HookDispatcher([display])
+    async with dispatcher:
+        slot = await buffer.claim()
+        slot.data[:] = 7
+        event = ImageDataEvent(data=slot.data, slot=slot, device="camera")
+        await dispatcher.dispatch(event)
+
+        # the consumer is done with the frame, but the hook still holds it
+        event.release()
+        await started.wait()
+        assert buffer.available == 1
+        proceed.set()
+
+    assert buffer.available == 2
+    np.testing.assert_array_equal(seen[0], 7)
+
+
+@pytest.mark.asyncio
+async def test_hook_failure_is_raised(default_engine):
+    async def oh_i_failed(event):
+        raise Exception("Oh i failed")
+
+    x = Acquisition(events=[AcquireZStackEvent(z_steps=5, item_exposure_time=0.001)])
+
+    async with default_engine as e:
+        with pytest.raises(Exception, match="Oh i failed"):
+            await e.acquire(x, [oh_i_failed])
+
+        result = await e.acquire(x)
+
+    assert len(result.collected_events) == 5
+    assert e.hook_stats[oh_i_failed].errors == 1
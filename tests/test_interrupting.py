@@ -1,3 +1,6 @@
+import asyncio
+import inspect
+
 import pytest
 
 from akuire.acquisition import AcquisitionResult
@@ -8,6 +11,10 @@ from akuire.helpers.base import acquire_z_stack, one_shot_snap
 from akuire.managers.testing.errors import TestableError
 
 
+async def collect(generator) -> list:
+    return [value async for value in generator]
+
+
 @pytest.mark.asyncio
 @pytest.mark.composition
 async def test_composition_run_until_condition(dual_camera_engine):
@@ -56,3 +63,54 @@ async def test_interrupting(dual_camera_engine):
 
         assert isinstance(result, AcquisitionResult)
         assert len(result.collected_events) == 11
+
+
+@pytest.mark.asyncio
+@pytest.mark.composition
+async def test_interrupting_pulls_values_lazily():
+    pulled = []
+
+    async def acquisition():
+        for i in range(3):
+            pulled.append(i)
+            yield i
+
+    async def follow_up():
+        yield "follow_up"
+
+    async def condition(value):
+        return value == 0
+
+    values = await collect(ainterupting(acquisition(), follow_up(), condition))
+
+    assert values == ["follow_up"]
+    # no frame was acquired after the one the condition tripped on
+    assert pulled == [0]
+
+
+@pytest.mark.asyncio
+@pytest.mark.composition
+async def test_interrupting_restarts_without_recursion():
+    depths = []
+
+    async def acquisition():
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield i
+
+    async def follow_up():
+        depths.append(len(inspect.stack()))
+        yield "follow_up"
+
+    async def condition(value):
+        return value == 2
+
+    values = await collect(
+        ainterupting(acquisition, follow_up, condition, restarts=50)
+    )
+
+    assert values == [0, 1, "follow_up"] * 51
+    assert len(set(depths)) == 1
+
+    with pytest.raises(ValueError):
+        await collect(ainterupting(acquisition(), follow_up(), condition, restarts=1))
@@ -0,0 +1,116 @@
+import dataclasses
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from akuire.acquisition import Acquisition
+from akuire.buffers import SharedFrameRingBuffer
+from akuire.compilers.default import compile_events
+from akuire.config import SystemConfig
+from akuire.engine import AcquisitionEngine
+from akuire.events import AcquireTSeriesEvent, AcquireZStackEvent
+from akuire.managers.base import BaseManager
+from akuire.managers.offload import ProcessOffloadMixin
+
+
+@dataclasses.dataclass
+class PidRenderer(ProcessOffloadMixin, BaseManager):
+    def frame_spec(self):
+        return (2,), np.dtype(np.int64)
+
+    def render(self, value: int) -> np.ndarray:
+        return np.array([value, os.getpid()])
+
+
+@pytest.mark.asyncio
+async def test_frames_are_rendered_into_shared_memory():
+    renderer = PidRenderer("renderer", offload_workers=2, offload_buffer_size=4)
+    renderer.start_offload()
+    try:
+        calls = ({"value": i} for i in range(6))
+        slots = [slot async for slot in renderer.offload_frames("render", calls)]
+
+        # the ring only holds four frames, the others were pickled
+        assert [int(slot.data[0]) for slot in slots] == list(range(6))
+        shared = [isinstance(slot.buffer, SharedFrameRingBuffer) for slot in slots]
+        assert shared == [True] * 4 + [False] * 2
+        assert renderer._offload_buffer.overflows == 2
+        assert os.getpid() not in {int(slot.data[1]) for slot in slots}
+
+        for slot in slots:
+            slot.release()
+        assert renderer._offload_buffer.available == 4
+    finally:
+        await renderer.stop_offload()
+
+
+@pytest.mark.asyncio
+async def test_frames_are_rendered_in_thread_without_workers():
+    renderer = PidRenderer("renderer")
+    slot = await renderer.offload_frame("render", value=3)
+    assert slot.buffer is None
+    assert list(slot.data) == [3, os.getpid()]
+
+
+@pytest.mark.asyncio
+async def test_smlm_microscope_offloads_frames():
+    from akuire.managers.virtual.smlm_microscope import SMLMMicroscope
+
+    engine = AcquisitionEngine(
+        system_config=SystemConfig(
+            managers=[
+                SMLMMicroscope(
+                    "smlm", offload_workers=2, sensor_height=64, sensor_width=64
+                )
+            ]
+        ),
+        compiler=compile_events,
+    )
+    x = Acquisition(events=[AcquireTSeriesEvent(t_steps=4)])
+
+    async with engine as e:
+        result = await e.acquire(x)
+
+    frames = [event.data for event in result.collected_events]
+    assert len(frames) == 4
+    assert frames[0].shape == (64, 64)
+    # every worker draws its own noise
+    assert not np.array_equal(frames[0], frames[1])
+
+
+@pytest.mark.asyncio
+async def test_virtual_microscope_yields_a_frame_per_plane():
+    from akuire.managers.virtual.virtual_microscope import VirtualMicroscopeManager
+
+    engine = AcquisitionEngine(
+        system_config=SystemConfig(managers=[VirtualMicroscopeManager()]),
+        compiler=compile_events,
+    )
+    x = Acquisition(
+        events=[AcquireZStackEvent(z_steps=3, z_step=0, item_exposure_time=0.001)]
+    )
+
+    async with engine as e:
+        result = await e.acquire(x)
+
+    assert len(result.collected_events) == x.expected_frames() == 3
+    assert [event.data.shape for event in result.collected_events] == [
+        (1, 1, 1, 512, 512)
+    ] * 3
+
+
+@pytest.mark.asyncio
+async def test_virtual_microscope_offload_settings():
+    from akuire.managers.virtual.virtual_microscope import VirtualMicroscopeManager
+
+    manager = VirtualMicroscopeManager(offload_workers=1, offload_buffer_size=4)
+    async with manager:
+        assert manager._offload_buffer.capacity == 4
+
+    # the PSF bank is shared with the rendering threads under a lock, which the
+    # copies of the workers get their own of
+    bank = pickle.loads(pickle.dumps(manager.positioner.psf_bank))
+    assert bank._lock is not manager.positioner.psf_bank._lock
+    assert bank.get(0) is None
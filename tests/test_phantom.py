@@ -0,0 +1,32 @@
+import numpy as np
+
+from akuire.managers.virtual import phantom
+from akuire.managers.virtual.phantom import get_phantom
+
+
+def test_phantom_honors_size_and_is_cached():
+    image = get_phantom(width=64, height=32)
+    assert image.shape == (32, 64)
+    assert not image.flags.writeable
+    assert get_phantom(width=64, height=32) is image
+
+
+def test_phantom_is_persisted(tmp_path, monkeypatch):
+    monkeypatch.setattr(phantom, "_phantoms", {})
+    image = get_phantom(width=48, height=48, normalized=True, cache_dir=tmp_path)
+    assert (tmp_path / "branching_tree_48x48_3_normalized.npy").exists()
+    assert np.max(image) == 1
+
+    # A fresh process memory-maps the persisted phantom instead of drawing it
+    monkeypatch.setattr(phantom, "_phantoms", {})
+    monkeypatch.setattr(phantom, "createBranchingTree", None)
+    loaded = get_phantom(width=48, height=48, normalized=True, cache_dir=tmp_path)
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, image)
+
+
+def test_smlm_microscope_crops_the_default_tree():
+    from akuire.managers.virtual.smlm_microscope import SMLMMicroscope
+
+    microscope = SMLMMicroscope("smlm")
+    assert microscope.image is get_phantom(width=5000, height=5000)
@@ -0,0 +1,58 @@
+import math
+
+import numpy as np
+import pytest
+
+from akuire.managers.virtual.rendering import (
+    render_emitters,
+    render_emitters_numba,
+    render_emitters_numpy,
+)
+
+
+def render_every_pixel(xc_array, yc_array, photon_array, sigma_array, image_size, pixel_size):
+    """The reference O(H*W*N) renderer"""
+    image = np.zeros((image_size, image_size))
+    for j in range(image_size):
+        for i in range(image_size):
+            for xc, yc, photon, sigma in zip(xc_array, yc_array, photon_array, sigma_array):
+                if (photon > 0) and (sigma > 0):
+                    S = sigma * math.sqrt(2)
+                    x = i * pixel_size - xc
+                    y = j * pixel_size - yc
+                    if (x + pixel_size / 2) ** 2 + (y + pixel_size / 2) ** 2 < 16 * sigma**2:
+                        ErfX = math.erf((x + pixel_size) / S) - math.erf(x / S)
+                        ErfY = math.erf((y + pixel_size) / S) - math.erf(y / S)
+                        image[j][i] += 0.25 * photon * ErfX * ErfY
+    return image
+
+
+@pytest.mark.parametrize(
+    "renderer", [render_emitters, render_emitters_numpy, render_emitters_numba]
+)
+def test_renderers_match_reference(renderer):
+
+    rng = np.random.default_rng(0)
+    n = 40
+    image_size = 24
+    pixel_size = 0.5
+
+    xc = rng.uniform(-1, image_size * pixel_size + 1, n)
+    yc = rng.uniform(-1, image_size * pixel_size + 1, n)
+    photons = rng.normal(5000, 50, n)
+    photons[0] = -1
+    sigmas = rng.normal(0.6, 0.2, n)
+    sigmas[1] = -0.1
+
+    expected = render_every_pixel(xc, yc, photons, sigmas, image_size, pixel_size)
+    rendered = renderer(xc, yc, photons, sigmas, image_size, pixel_size)
+
+    np.testing.assert_allclose(rendered, expected, rtol=1e-4, atol=1e-3)
+
+
+def test_render_without_emitters():
+
+    empty = np.array([])
+    rendered = render_emitters_numpy(empty, empty, empty, empty, 8, 0.1)
+    assert rendered.shape == (8, 8)
+    assert not rendered.any()
@@ -0,0 +1,231 @@
+import asyncio
+import io
+
+import numpy as np
+import PIL.Image
+import pytest
+from aiohttp import web
+
+from akuire.acquisition import Acquisition
+from akuire.buffers import FrameRingBuffer
+from akuire.compilers.default import compile_events
+from akuire.config import SystemConfig
+from akuire.engine import AcquisitionEngine
+from akuire.events import AcquireFrameEvent, HasMovedEvent, ImageDataEvent, MoveEvent
+from akuire.events.manager_event import SetLightIntensityEvent
+from akuire.managers.rest.rest_manager import OpenUC2RestManager
+
+
+def create_uc2_app(frame: np.ndarray, raw: bool = False) -> web.Application:
+    """A local stand-in for the OpenUC2 REST server (optionally supporting raw frames)"""
+    app = web.Application()
+    app["requests"] = []
+    app["peers"] = set()
+    app["stage"] = {"in_flight": 0, "max_in_flight": 0}
+
+    def record(request: web.Request):
+        app["requests"].append((request.path, dict(request.query)))
+        app["peers"].add(request.transport.get_extra_info("peername"))
+
+    async def snap(request: web.Request):
+        record(request)
+        if raw and "application/octet-stream" in request.headers.get("Accept", ""):
+            data = np.ascontiguousarray(frame).tobytes()
+            response = web.StreamResponse(
+                headers={
+                    "Content-Type": "application/octet-stream",
+                    "X-Frame-Dtype": frame.dtype.str,
+                    "X-Frame-Shape": ",".join(str(size) for size in frame.shape),
+                }
+            )
+            await response.prepare(request)
+            for start in range(0, len(data), 100):
+                await response.write(data[start : start + 100])
+            await response.write_eof()
+            return response
+
+        buffer = io.BytesIO()
+        PIL.Image.fromarray(frame).save(buffer, format="PNG")
+        return web.Response(body=buffer.getvalue(), content_type="image/png")
+
+    async def ok(request: web.Request):
+        record(request)
+        return web.json_response("ok")
+
+    async def move(request: web.Request):
+        record(request)
+        stage = app["stage"]
+        stage["in_flight"] += 1
+        stage["max_in_flight"] = max(stage["max_in_flight"], stage["in_flight"])
+        await asyncio.sleep(0.05)  # the stage settles
+        stage["in_flight"] -= 1
+        return web.json_response("ok")
+
+    app.router.add_get("/RecordingController/snapNumpyToFastAPI/", snap)
+    app.router.add_get("/LEDMatrixController/setIntensity/", ok)
+    app.router.add_get("/PositionerController/movePositioner", move)
+    return app
+
+
+@pytest.fixture
+def frame():
+    return np.arange(64, dtype=np.uint8).reshape(8, 8)
+
+
+@pytest.mark.asyncio
+async def test_rest_manager_reuses_pooled_connection(aiohttp_server, frame):
+    server = await aiohttp_server(create_uc2_app(frame))
+    manager = OpenUC2RestManager(endpoint=str(server.make_url("/")))
+
+    async with manager:
+        for i in range(3):
+            events = [
+                x async for x in manager.compute_event(AcquireFrameEvent())
+            ]
+            assert isinstance(events[0], ImageDataEvent)
+            np.testing.assert_array_equal(events[0].data[0, 0, 0], frame)
+
+        async for _ in manager.compute_event(SetLightIntensityEvent(intensity=0.5)):
+            pass
+        async for _ in manager.compute_event(MoveEvent(x=1, y=2)):
+            pass
+
+    assert manager._session is None
+    assert len(server.app["requests"]) == 6
+    # every request went over the same keep-alive connection
+    assert len(server.app["peers"]) == 1
+
+    stats = manager.stats[manager.png_snap_endpoint]
+    assert stats.count == 3
+    assert 0 < stats.min <= stats.mean <= stats.max
+    assert manager.stats[manager.set_positioner_endpoint].count == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("concurrent_axes", [False, True])
+async def test_rest_manager_concurrent_axes(aiohttp_server, frame, concurrent_axes):
+    server = await aiohttp_server(create_uc2_app(frame))
+    manager = OpenUC2RestManager(
+        endpoint=str(server.make_url("/")), concurrent_axes=concurrent_axes
+    )
+
+    async with manager:
+        async for _ in manager.compute_event(MoveEvent(x=1, y=2)):
+            pass
+
+    axes = sorted(query["axis"] for _, query in server.app["requests"])
+    assert axes == ["X", "Y"]
+    assert server.app["stage"]["max_in_flight"] == (2 if concurrent_axes else 1)
+
+
+@pytest.mark.asyncio
+async def test_rest_manager_batches_commands(aiohttp_server, frame):
+    server = await aiohttp_server(create_uc2_app(frame))
+    manager = OpenUC2RestManager(
+        endpoint=str(server.make_url("/")), batch_commands=True
+    )
+
+    async with AcquisitionEngine(
+        system_config=SystemConfig(managers=[manager]),
+        compiler=compile_events,
+    ) as engine:
+        events = [
+            event
+            async for event in engine.acquire_stream(
+                Acquisition(
+                    events=[
+                        MoveEvent(x=1, y=2),
+                        SetLightIntensityEvent(intensity=0.2),
+                        MoveEvent(x=3),
+                        SetLightIntensityEvent(intensity=0.5),
+                        AcquireFrameEvent(),
+                        MoveEvent(x=4, y=5),
+                    ]
+                )
+            )
+        ]
+
+    requests = server.app["requests"]
+    # the moves and intensities before the snap are coalesced into three requests
+    assert len(requests) == 6
+    assert sorted(
+        (query.get("axis", ""), query.get("dist", ""), query.get("intensity", ""))
+        for _, query in requests[:3]
+    ) == [("", "", "127"), ("X", "3", ""), ("Y", "2", "")]
+    assert requests[3][0] == "/RecordingController/snapNumpyToFastAPI/"
+
+    assert [type(event) for event in events] == [
+        HasMovedEvent,
+        HasMovedEvent,
+        ImageDataEvent,
+        HasMovedEvent,
+    ]
+    assert [(event.x, event.y) for event in events[:2]] == [(1, 2), (3, None)]
+
+
+@pytest.mark.asyncio
+async def test_rest_manager_batches_moves_per_speed(aiohttp_server, frame):
+    server = await aiohttp_server(create_uc2_app(frame))
+    manager = OpenUC2RestManager(
+        endpoint=str(server.make_url("/")), batch_commands=True
+    )
+    moves = [
+        MoveEvent(x=1, speed=100),
+        MoveEvent(x=2, y=3, speed=100),
+        MoveEvent(x=4, speed=200),
+    ]
+
+    async with manager:
+        events = [item async for item in manager.compute_batch(moves)]
+
+    requests = [
+        (query["axis"], query["dist"], query["speed"])
+        for _, query in server.app["requests"]
+    ]
+    assert requests == [("X", "2", "100"), ("Y", "3", "100"), ("X", "4", "200")]
+    assert [event for event, _ in events] == moves
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "pipelined,targets", [(False, ["2", "4", "5"]), (True, ["1", "2", "3", "4", "5"])]
+)
+async def test_rest_manager_batch_size(aiohttp_server, frame, pipelined, targets):
+    server = await aiohttp_server(create_uc2_app(frame))
+    manager = OpenUC2RestManager(
+        endpoint=str(server.make_url("/")), batch_commands=True
+    )
+
+    async with AcquisitionEngine(
+        system_config=SystemConfig(managers=[manager]),
+        compiler=compile_events,
+        max_batch_size=2,
+        pipelined=pipelined,
+    ) as engine:
+        result = await engine.acquire(
+            Acquisition(events=[MoveEvent(x=x) for x in range(1, 6)])
+        )
+
+    # serial execution batches at most two moves, pipelined execution does not batch
+    assert [query["dist"] for _, query in server.app["requests"]] == targets
+    assert len(result.collected_events) == 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("raw", [False, True])
+async def test_rest_manager_raw_transfer(aiohttp_server, raw):
+    frame = np.arange(48 * 64, dtype=np.uint16).reshape(48, 64)
+    server = await aiohttp_server(create_uc2_app(frame, raw=raw))
+    frame_buffer = FrameRingBuffer((1, 1, 1, 48, 64), dtype=np.uint16, capacity=2)
+    manager = OpenUC2RestManager(
+        endpoint=str(server.make_url("/")), chunk_size=256, frame_buffer=frame_buffer
+    )
+
+    async with manager:
+        event = await manager.snap()
+
+    assert event.data.shape == (1, 1, 1, 48, 64)
+    np.testing.assert_array_equal(event.data[0, 0, 0], frame)
+    # raw frames are streamed into the frame buffer, encoded ones are decoded
+    assert (event.slot is not None) == raw
+    assert frame_buffer.available == (1 if raw else 2)
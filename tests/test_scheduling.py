@@ -0,0 +1,251 @@
+import asyncio
+import dataclasses
+import time
+from typing import AsyncGenerator
+
+import pytest
+
+from akuire.acquisition import Acquisition
+from akuire.composition.helpers import ainterupting, amerge
+from akuire.config import SystemConfig
+from akuire.engine import AcquisitionEngine
+from akuire.events import (
+    AcquireFrameEvent,
+    AcquireZStackEvent,
+    DataEvent,
+    HasMovedEvent,
+)
+from akuire.managers.base import BaseManager
+from akuire.scheduling import DeviceScheduler
+
+
+def frames(
+    n: int, exposure_time: float = 0.01, device: str | None = None
+) -> Acquisition:
+    return Acquisition(
+        events=[
+            AcquireFrameEvent(exposure_time=exposure_time, device=device)
+            for _ in range(n)
+        ]
+    )
+
+
+async def collect(generator) -> list:
+    return [value async for value in generator]
+
+
+@pytest.mark.asyncio
+async def test_urgent_acquisition_preempts_background(default_engine):
+    async with default_engine as e:
+        background = asyncio.create_task(e.acquire(frames(30)))
+        await asyncio.sleep(0.05)
+
+        start = time.perf_counter()
+        await e.acquire(frames(1), priority=10)
+        latency = time.perf_counter() - start
+
+        assert not background.done()
+        result = await background
+
+    assert len(result.collected_events) == 30
+    # the urgent frame only waited for the frame that was being taken
+    assert latency < 0.1
+    assert e.scheduler.preemptions >= 1
+
+
+@dataclasses.dataclass
+class ExclusiveCamera(BaseManager):
+    active: int = 0
+    max_active: int = 0
+
+    async def compute_event(
+        self, event: AcquireFrameEvent
+    ) -> AsyncGenerator[DataEvent, None]:
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(event.exposure_time)
+        self.active -= 1
+        yield HasMovedEvent(device=self.device)
+
+
+@pytest.mark.asyncio
+async def test_device_computes_one_acquisition_at_a_time():
+    camera = ExclusiveCamera("virtual_camera")
+    engine = AcquisitionEngine(system_config=SystemConfig(managers=[camera]))
+
+    async with engine as e:
+        results = await asyncio.gather(*(e.acquire(frames(5, 0.005)) for _ in range(3)))
+
+    assert [len(result.collected_events) for result in results] == [5] * 3
+    assert camera.max_active == 1
+
+
+@dataclasses.dataclass
+class StackCamera(BaseManager):
+    log: list = dataclasses.field(default_factory=list)
+
+    async def compute_event(
+        self, event: AcquireFrameEvent | AcquireZStackEvent
+    ) -> AsyncGenerator[DataEvent, None]:
+        if isinstance(event, AcquireFrameEvent):
+            await asyncio.sleep(event.exposure_time)
+            self.log.append("frame")
+            yield HasMovedEvent(device=self.device)
+
+        if isinstance(event, AcquireZStackEvent):
+            for i in range(event.z_steps):
+                await asyncio.sleep(event.item_exposure_time)
+                self.log.append(f"plane{i}")
+                yield HasMovedEvent(device=self.device)
+
+
+def z_stack(planes: int) -> Acquisition:
+    return Acquisition(
+        events=[AcquireZStackEvent(z_steps=planes, item_exposure_time=0.005)]
+    )
+
+
+@pytest.mark.asyncio
+async def test_paired_event_holds_its_device_between_yields():
+    camera = StackCamera("virtual_camera")
+    engine = AcquisitionEngine(system_config=SystemConfig(managers=[camera]))
+
+    async with engine as e:
+        stack = asyncio.create_task(e.acquire(z_stack(5)))
+        await asyncio.sleep(0.008)
+        await e.acquire(frames(1, 0.001), priority=10)
+        await stack
+
+    # the urgent frame waited for the whole stack instead of interleaving
+    assert camera.log == [f"plane{i}" for i in range(5)] + ["frame"]
+
+
+@pytest.mark.asyncio
+async def test_hook_acquires_on_the_device_of_a_paired_event():
+    camera = StackCamera("virtual_camera")
+    engine = AcquisitionEngine(system_config=SystemConfig(managers=[camera]))
+
+    async def snap(event):
+        await e.acquire(frames(1, 0.001))
+
+    async with engine as e:
+        result = await asyncio.wait_for(e.acquire(z_stack(3), hooks=[snap]), timeout=2)
+
+    assert len(result.collected_events) == 3
+    assert camera.log.count("frame") == 3
+
+
+@pytest.mark.asyncio
+async def test_consumer_acquires_on_the_devices_of_its_stream(default_engine):
+    async def snap_on_every_frame():
+        nested = []
+        async for event in e.acquire_stream(frames(3, 0.001)):
+            nested.append(await e.acquire(frames(1, 0.001)))
+        return nested
+
+    async with default_engine as e:
+        nested = await asyncio.wait_for(snap_on_every_frame(), timeout=2)
+
+    assert len(nested) == 3
+
+
+@pytest.mark.asyncio
+async def test_interrupting_condition_acquires_on_the_devices_of_its_stream(
+    default_engine,
+):
+    snaps = []
+
+    async def condition(event):
+        snaps.append(await e.acquire(frames(1, 0.001)))
+        return False
+
+    async with default_engine as e:
+        events = await asyncio.wait_for(
+            collect(
+                ainterupting(
+                    e.acquire_stream(frames(3, 0.001)),
+                    e.acquire_stream(frames(1, 0.001)),
+                    condition,
+                )
+            ),
+            timeout=2,
+        )
+
+    assert len(events) == 3
+    assert len(snaps) == 3
+
+
+@pytest.mark.asyncio
+async def test_interrupter_preempts_background(default_engine):
+    async def trigger():
+        yield "trigger"
+
+    async def condition(value):
+        return True
+
+    async with default_engine as e:
+        background = asyncio.create_task(e.acquire(frames(30)))
+        await asyncio.sleep(0.05)
+
+        start = time.perf_counter()
+        events = await collect(
+            ainterupting(trigger(), e.acquire_stream(frames(1)), condition)
+        )
+        latency = time.perf_counter() - start
+
+        assert not background.done()
+        await background
+
+    assert len(events) == 1
+    # the interrupter ran in a priority lane instead of queueing behind the background
+    assert latency < 0.1
+    assert e.scheduler.preemptions >= 1
+
+
+@pytest.mark.asyncio
+async def test_merged_consumer_acquires_on_the_devices_of_its_streams(
+    dual_camera_engine,
+):
+    async def snap_on_every_frame():
+        nested = []
+        async for event in amerge(
+            e.acquire_stream(frames(3, 0.001, device="virtual_camera1")),
+            e.acquire_stream(frames(3, 0.001, device="virtual_camera2")),
+        ):
+            nested.append(await e.acquire(frames(1, 0.001, device=event.device)))
+        return nested
+
+    async with dual_camera_engine as e:
+        nested = await asyncio.wait_for(snap_on_every_frame(), timeout=2)
+
+    assert len(nested) == 6
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "policy,expected", [("priority", [2, 1, 0]), ("deadline", [0, 2, 1])]
+)
+async def test_scheduler_policies(policy, expected):
+    scheduler = DeviceScheduler(policy)
+    holder = scheduler.open()
+    await scheduler.acquire(holder, {"camera"})
+
+    leases = [
+        scheduler.open(priority=0, deadline=1),
+        scheduler.open(priority=1, deadline=3),
+        scheduler.open(priority=2, deadline=2),
+    ]
+    granted = []
+
+    async def run(index):
+        await scheduler.acquire(leases[index], {"camera"})
+        granted.append(index)
+        scheduler.release(leases[index], {"camera"})
+
+    tasks = [asyncio.create_task(run(index)) for index in range(3)]
+    await asyncio.sleep(0)
+    assert scheduler.waiting == 3
+
+    scheduler.release(holder, {"camera"})
+    await asyncio.gather(*tasks)
+    assert granted == expected
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import os
+import pty
+import threading
+import tty
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+
+from akuire.events.manager_event import MoveXEvent, MoveYEvent, SetLightIntensityEvent
+from akuire.managers.uc2.serial import SerialUC2Manager
+from akuire.managers.uc2.worker import SerialWorker
+
+
+class FakeDevice:
+    """A fake UC2 board on the master side of a pty, answering blocking commands"""
+
+    def __init__(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.commands = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        buffer = b""
+        while True:
+            try:
+                chunk = os.read(self.master, 1024)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                command = json.loads(line)
+                self.commands.append(command)
+                if command["is_blocking"]:
+                    os.write(self.master, b"done\n")
+
+    def close(self):
+        os.close(self.slave)
+        os.close(self.master)
+
+
+class FakeUC2Client:
+    """Speaks a line based protocol to the serial port, recording the calling threads"""
+
+    def __init__(self, serialport: str):
+        self.fd = os.open(serialport, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.fd)
+        self.threads = {threading.current_thread().name}
+        self.motor = SimpleNamespace(
+            move_x=partial(self.command, "move_x"),
+            move_y=partial(self.command, "move_y"),
+        )
+        self.laser = SimpleNamespace(set_laser=partial(self.command, "set_laser"))
+
+    def command(self, name: str, is_blocking: bool = True, **kwargs):
+        self.threads.add(threading.current_thread().name)
+        payload = {"cmd": name, "is_blocking": is_blocking, **kwargs}
+        os.write(self.fd, (json.dumps(payload) + "\n").encode())
+        if is_blocking:
+            response = b""
+            while not response.endswith(b"\n"):
+                response += os.read(self.fd, 1)
+            return response.strip().decode()
+
+    def close(self):
+        self.threads.add(threading.current_thread().name)
+        os.close(self.fd)
+
+
+class PtySerialUC2Manager(SerialUC2Manager):
+    def setup_client(self):
+        self._client = FakeUC2Client(self.serialport)
+
+
+@pytest.fixture
+def fake_device():
+    device = FakeDevice()
+    yield device
+    device.close()
+
+
+@pytest.mark.asyncio
+async def test_serial_commands_run_on_dedicated_thread(fake_device):
+    manager = PtySerialUC2Manager("uc2")
+    manager.serialport = fake_device.port
+    manager.pipeline_commands = True
+
+    events = [
+        MoveXEvent(step=100),
+        SetLightIntensityEvent(intensity=0.1),
+        SetLightIntensityEvent(intensity=0.2),
+        SetLightIntensityEvent(intensity=0.3),
+        MoveYEvent(step=5),
+    ]
+
+    async with manager:
+        client = manager._client
+        worker = manager.worker
+        for event in events:
+            async for _ in manager.compute_event(event):
+                pass
+
+    assert [command["cmd"] for command in fake_device.commands] == [
+        "move_x",
+        "set_laser",
+        "set_laser",
+        "set_laser",
+        "move_y",
+    ]
+    assert [command.get("value") for command in fake_device.commands[1:4]] == [
+        0.1,
+        0.2,
+        0.3,
+    ]
+    # every command (including opening and closing the client) ran on the I/O thread
+    assert client.threads == {f"serial-io {fake_device.port}"}
+    # the pipelined intensities were queued up behind each other
+    assert worker.max_depth >= 3
+    assert worker.depth == 0
+    assert not worker.running
+
+
+class FailingSerialUC2Manager(SerialUC2Manager):
+    def setup_client(self):
+        raise OSError("Could not open the port")
+
+
+@pytest.mark.asyncio
+async def test_serial_worker_is_stopped_if_setup_fails(fake_device):
+    manager = FailingSerialUC2Manager("uc2")
+    manager.serialport = fake_device.port
+
+    with pytest.raises(OSError):
+        await manager.__aenter__()
+
+    assert manager._worker is None
+    assert f"serial-io {fake_device.port}" not in {
+        thread.name for thread in threading.enumerate()
+    }
+
+
+@pytest.mark.asyncio
+async def test_serial_worker_is_shared_per_port(fake_device):
+    stage = PtySerialUC2Manager("stage")
+    light = PtySerialUC2Manager("light")
+    stage.serialport = light.serialport = fake_device.port
+
+    async with stage:
+        async with light:
+            assert stage.worker is light.worker
+            worker = stage.worker
+            async for _ in light.compute_event(SetLightIntensityEvent(intensity=0.1)):
+                pass
+
+        assert worker.running, "the stage still uses the worker"
+        async for _ in stage.compute_event(MoveXEvent(step=100)):
+            pass
+
+    assert not worker.running
+    assert [command["cmd"] for command in fake_device.commands] == [
+        "set_laser",
+        "move_x",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_serial_worker_raises_pipelined_failure():
+    worker = SerialWorker()
+    worker.start()
+
+    def fail():
+        raise ValueError("Motor stalled")
+
+    worker.send(fail)
+    with pytest.raises(ValueError, match="Motor stalled"):
+        await worker.drain()
+
+    worker.send(fail)
+    await asyncio.sleep(0.05)
+    with pytest.raises(ValueError, match="Motor stalled"):
+        await worker.call(lambda: None)
+
+    assert await worker.call(lambda: 42) == 42
+    await worker.stop()
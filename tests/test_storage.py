@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from akuire.acquisition import Acquisition, AcquisitionResult
+from akuire.events import AcquireZStackEvent, ImageDataEvent, MoveEvent
+from akuire.storage import MemmapFrameStore, PreallocatedFrameStore
+
+
+@pytest.mark.asyncio
+async def test_acquire_into_memmap_store(default_engine, tmp_path):
+
+    x = Acquisition(
+        events=[
+            MoveEvent(x=1, y=2),
+            AcquireZStackEvent(z_steps=5, item_exposure_time=0.001),
+        ]
+    )
+
+    async with default_engine as e:
+        result = await e.acquire(x, store=MemmapFrameStore(tmp_path / "stack"))
+
+    assert isinstance(result, AcquisitionResult)
+    stack = result.to_z_stack()
+    assert isinstance(stack, np.memmap)
+    assert stack.shape == (5, 1, 1, 1, 512, 512)
+
+    frames = [i for i in result.collected_events if isinstance(i, ImageDataEvent)]
+    assert np.shares_memory(frames[2].data, stack)
+
+    reopened = MemmapFrameStore.open(tmp_path / "stack")
+    np.testing.assert_array_equal(reopened.to_array(), stack)
+
+
+def test_memmap_store_rejects_mismatching_frames(tmp_path):
+
+    store = MemmapFrameStore(tmp_path)
+    store.append(ImageDataEvent(data=np.zeros((1, 1, 1, 4, 4)), device="camera"))
+
+    with pytest.raises(ValueError):
+        store.append(ImageDataEvent(data=np.zeros((1, 1, 1, 8, 8)), device="camera"))
+
+
+@pytest.mark.asyncio
+async def test_acquire_preallocates_known_stacks(default_engine):
+
+    x = Acquisition(
+        events=[
+            MoveEvent(x=1, y=2),
+            AcquireZStackEvent(z_steps=4, item_exposure_time=0.001),
+        ]
+    )
+    assert x.expected_frames() == 4
+
+    async with default_engine as e:
+        result = await e.acquire(x)
+
+    assert isinstance(result.store, PreallocatedFrameStore)
+    stack = result.to_z_stack()
+    assert stack.shape == (4, 1, 1, 1, 512, 512)
+
+    frames = [i for i in result.collected_events if isinstance(i, ImageDataEvent)]
+    assert all(np.shares_memory(frame.data, stack) for frame in frames)
+
+
+def test_preallocated_store_reports_mismatching_frames():
+
+    store = PreallocatedFrameStore(2)
+    store.append(ImageDataEvent(data=np.zeros((1, 1, 1, 4, 4)), device="camera"))
+    store.append(ImageDataEvent(data=np.zeros((1, 1, 1, 8, 8)), device="camera"))
+
+    with pytest.raises(ValueError):
+        store.to_array()
+
+
+def test_preallocated_store_grows_in_chunks():
+
+    store = PreallocatedFrameStore(1000, max_preallocated_bytes=8 * 8 * 8 * 8)
+    frames = [
+        ImageDataEvent(data=np.full((8, 8), i, dtype=np.float64), device="camera")
+        for i in range(20)
+    ]
+
+    store.append(frames[0])
+    assert store.capacity == 8, "only the first chunk is allocated up front"
+
+    for frame in frames[1:]:
+        store.append(frame)
+    assert store.capacity == 24
+
+    stack = store.to_array()
+    assert stack.shape == (20, 8, 8)
+    assert (stack[:, 0, 0] == np.arange(20)).all()
+    assert all(np.shares_memory(frame.data, stack) for frame in frames)
@@ -0,0 +1,104 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from akuire.acquisition import Acquisition
+from akuire.buffers import FrameRingBuffer
+from akuire.compilers.default import compile_events
+from akuire.config import SystemConfig
+from akuire.engine import AcquisitionEngine
+from akuire.events import AcquireZStackEvent, ImageDataEvent
+from akuire.managers.testing import SweepableCamera, ZStageManager
+from akuire.streaming import BoundedEventQueue
+
+
+def frame(i: int) -> ImageDataEvent:
+    return ImageDataEvent(data=np.full((2, 2), i), device="camera")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "policy,expected", [("drop_oldest", [2, 3, 4]), ("drop_newest", [0, 1, 2])]
+)
+async def test_bounded_event_queue_drops(policy, expected):
+    queue = BoundedEventQueue(3, policy)
+    for i in range(5):
+        await queue.put(frame(i))
+    await queue.close()
+
+    assert [int(event.data[0, 0]) async for event in queue] == expected
+    assert queue.stats.dropped == 2
+    assert queue.stats.max_depth == 3
+    assert queue.stats.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_bounded_event_queue_releases_dropped_frames():
+    buffer = FrameRingBuffer((2, 2), capacity=4)
+    queue = BoundedEventQueue(1, "drop_oldest")
+
+    for i in range(3):
+        slot = await buffer.claim()
+        await queue.put(ImageDataEvent(data=slot.data, slot=slot, device="camera"))
+
+    assert buffer.available == 3
+    await queue.close(ValueError("Camera failed"))
+
+    event = await queue.get()
+    event.release()
+    assert buffer.available == 4
+    with pytest.raises(ValueError, match="Camera failed"):
+        await queue.get()
+
+
+def buffered_engine(policy: str) -> AcquisitionEngine:
+    return AcquisitionEngine(
+        system_config=SystemConfig(
+            managers=[
+                SweepableCamera("virtual_camera"),
+                ZStageManager("z_stage"),
+            ]
+        ),
+        compiler=compile_events,
+        buffer_size=4,
+        buffer_policy=policy,
+    )
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_does_not_stall_stream():
+    engine = buffered_engine("drop_newest")
+    notified = []
+
+    async def slow_uploader(event):
+        await asyncio.sleep(0.02)
+        notified.append(event)
+
+    engine.add_subscriber(slow_uploader)
+    x = Acquisition(events=[AcquireZStackEvent(z_steps=30, item_exposure_time=0.001)])
+
+    async with engine as e:
+        result = await e.acquire(x)
+
+    assert len(result.collected_events) == 30
+    assert engine.stream_stats.dropped == 0
+    # the uploader only saw what it could keep up with
+    assert engine.subscriber_stats.dropped > 0
+    assert len(notified) + engine.subscriber_stats.dropped == 30
+    assert engine.subscriber_stats.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_buffered_subscriber_failure_is_raised():
+    engine = buffered_engine("block")
+
+    async def oh_i_failed(event):
+        raise Exception("Oh i failed")
+
+    engine.add_subscriber(oh_i_failed)
+    x = Acquisition(events=[AcquireZStackEvent(z_steps=10, item_exposure_time=0.001)])
+
+    async with engine as e:
+        with pytest.raises(Exception, match="Oh i failed"):
+            await e.acquire(x)
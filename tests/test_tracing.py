@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from akuire.acquisition import Acquisition
+from akuire.events import AcquireFrameEvent, MoveEvent
+from akuire.tracing import Histogram, Tracer
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.record(value / 1000)
+
+    assert histogram.count == 100
+    assert histogram.mean == pytest.approx(0.0505)
+    assert histogram.max == 0.1
+    # the buckets grow by 2 ** (1 / 4), i.e. ~19%
+    assert 0.05 <= histogram.percentile(50) <= 0.05 * 2 ** 0.25
+    assert histogram.percentile(100) == 0.1
+
+
+@pytest.mark.asyncio
+async def test_engine_traces_events(default_engine, tmp_path):
+    tracer = Tracer()
+    default_engine.tracer = tracer
+
+    async def hook(event):
+        pass
+
+    x = Acquisition(
+        events=[
+            MoveEvent(x=1, y=2),
+            AcquireFrameEvent(exposure_time=0.01),
+        ]
+    )
+
+    async with default_engine as e:
+        await e.acquire(x, [hook])
+
+    assert [span.name for span in tracer.spans] == [
+        "MoveEvent",
+        "AcquireFrameEvent",
+    ]
+    frame_span = tracer.spans[1]
+    assert frame_span.manager == "virtual_camera"
+    assert frame_span.data_events == 1
+    assert frame_span.bytes > 0
+    assert frame_span.manager_time >= 0.01
+    assert frame_span.first_yield_latency >= 0.01
+    assert frame_span.hook_time > 0
+
+    assert tracer.histogram("manager_time", "AcquireFrameEvent").count == 1
+    assert tracer.histogram("manager_time").count == 2
+    assert tracer.summary()["hook_time"]["count"] == 2
+
+    path = tmp_path / "trace.json"
+    tracer.export_chrome_trace(path)
+    trace = json.loads(path.read_text())
+    slices = [event for event in trace["traceEvents"] if event.get("cat") == "event"]
+    assert [event["name"] for event in slices] == ["MoveEvent", "AcquireFrameEvent"]
+    assert slices[1]["dur"] >= 10000
+    assert slices[1]["args"]["bytes"] == frame_span.bytes
+
+
+@pytest.mark.asyncio
+async def test_engine_samples_events(default_engine):
+    tracer = Tracer(sample_rate=0.5, seed=0)
+    default_engine.tracer = tracer
+    default_engine.pipelined = True
+
+    x = Acquisition(
+        events=[AcquireFrameEvent(exposure_time=0.001) for _ in range(40)]
+    )
+
+    async with default_engine as e:
+        result = await e.acquire(x)
+
+    assert len(result.collected_events) == 40
+    assert 5 < len(tracer.spans) < 35
+    assert all(span.finished_at is not None for span in tracer.spans)